@@ -4,10 +4,12 @@ Uses yt-dlp and ffmpeg for video processing
 """
 
 import os
-import tempfile
+import json
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, HttpUrl
 from typing import Optional, List
 import uvicorn
@@ -15,8 +17,17 @@ import uvicorn
 from services.youtube_service import YouTubeService
 from services.video_service import VideoService
 from services.transcription_service import TranscriptionService
-from services.clip_service import ClipService
-from services.supabase_client import get_supabase_client
+from services.supabase_client import close_supabase_client
+from services.db_writer import get_batch_writer
+from services.job_queue import get_job_queue
+from services.executor import run_io, shutdown_executors
+from services.metrics import metrics, read_snapshots
+from services.resource_governor import get_governor
+from services.source_cache import get_source_cache
+from services.storage_io import get_storage_uploader
+from services.upload_stream import receive_video_upload, UploadTooLargeError
+from services.resumable_upload import get_resumable_uploads, UploadNotFoundError
+from services.workspace import get_workspace_manager, InsufficientDiskError, INCOMING_DIR
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,10 +46,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+JOB_EVENTS_POLL_INTERVAL = float(os.getenv("JOB_EVENTS_POLL_INTERVAL", 1.0))
+
 youtube_service = YouTubeService()
 video_service = VideoService()
 transcription_service = TranscriptionService()
-clip_service = ClipService()
 
 
 class YouTubeImportRequest(BaseModel):
@@ -66,6 +78,27 @@ class ClipGenerationRequest(BaseModel):
     max_duration: Optional[int] = 60
 
 
+class PipelineRequest(BaseModel):
+    user_id: str
+    url: Optional[HttpUrl] = None
+    video_id: Optional[str] = None
+    language: Optional[str] = "en"
+    clip_count: Optional[int] = 10
+    min_duration: Optional[int] = 15
+    max_duration: Optional[int] = 60
+    export_clips: Optional[bool] = True
+    output_format: Optional[str] = "mp4"
+    resolution: Optional[str] = "1080p"
+
+
+class ResumableUploadRequest(BaseModel):
+    user_id: str
+    filename: str
+    size: int
+    content_type: Optional[str] = "video/mp4"
+    sha256: Optional[str] = None
+
+
 class ClipExportRequest(BaseModel):
     clip_id: str
     user_id: str
@@ -73,6 +106,21 @@ class ClipExportRequest(BaseModel):
     resolution: Optional[str] = "1080p"
 
 
+@app.on_event("startup")
+def startup():
+    # Removes workspaces left behind by crashed processes
+    get_workspace_manager()
+    get_storage_uploader().open()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await get_batch_writer().close()
+    await get_storage_uploader().close()
+    await close_supabase_client()
+    shutdown_executors()
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -90,17 +138,37 @@ async def health_check():
         "status": "healthy",
         "services": {
             "yt-dlp": youtube_service.check_availability(),
-            "ffmpeg": video_service.check_ffmpeg(),
+            "ffmpeg": await run_io(video_service.check_ffmpeg),
             "whisper": transcription_service.check_availability(),
         }
     }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Process metrics
+
+    - Slot utilization and queue wait per resource pool
+    - Source cache usage
+    - Workspace disk usage and headroom
+    - Throughput, speed and error rate per transcription engine
+    - Snapshots published by worker processes
+    """
+    return {
+        "api": {
+            "governor": get_governor().stats(),
+            "source_cache": await run_io(get_source_cache().stats),
+            "workspaces": await run_io(get_workspace_manager().stats),
+            "transcription_engines": transcription_service.engines.stats(),
+            **metrics.snapshot(),
+        },
+        "workers": read_snapshots(),
+    }
+
+
 @app.post("/api/youtube/import")
-async def import_from_youtube(
-    request: YouTubeImportRequest,
-    background_tasks: BackgroundTasks
-):
+async def import_from_youtube(request: YouTubeImportRequest):
     """
     Import video from YouTube URL
 
@@ -112,17 +180,18 @@ async def import_from_youtube(
     try:
         logger.info(f"Starting YouTube import: {request.url}")
 
-        # Start background job
-        background_tasks.add_task(
-            youtube_service.import_video,
-            str(request.url),
-            request.user_id
+        job_id = await get_job_queue().enqueue(
+            'youtube_import',
+            request.user_id,
+            {'url': str(request.url)},
+            max_attempts=1
         )
 
         return {
             "success": True,
-            "message": "YouTube import started",
-            "status": "processing"
+            "message": "YouTube import queued",
+            "job_id": job_id,
+            "status": "queued"
         }
 
     except Exception as e:
@@ -151,51 +220,171 @@ async def get_youtube_info(url: HttpUrl):
 
 
 @app.post("/api/video/upload")
-async def upload_video(
-    file: UploadFile = File(...),
-    user_id: str = "",
-    background_tasks: BackgroundTasks = None
-):
+async def upload_video(request: Request, user_id: Optional[str] = None):
     """
-    Upload video file directly
+    Upload video file directly (multipart/form-data: file, user_id)
 
-    - Validates video file
-    - Extracts metadata
-    - Uploads to Supabase storage
-    - Creates video record
+    - Streams the file to disk in chunks, hashing as it goes
+    - Rejects uploads over the user's remaining storage_limit early
+    - Queues metadata extraction, storage upload and the video record
     """
     try:
-        if not file.content_type or not file.content_type.startswith('video/'):
-            raise HTTPException(
-                status_code=400,
-                detail="File must be a video"
-            )
-
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
+        # Save to the incoming dir so worker processes can read it
+        upload = await receive_video_upload(
+            request,
+            INCOMING_DIR,
+            user_id=user_id
+        )
 
-        # Process in background
-        background_tasks.add_task(
-            video_service.process_uploaded_video,
-            tmp_path,
-            user_id,
-            file.filename
+        job_id = await get_job_queue().enqueue(
+            'video_upload',
+            upload['user_id'],
+            {
+                'file_path': upload['file_path'],
+                'filename': upload['filename'],
+                'size': upload['size'],
+                'sha256': upload['sha256'],
+            },
+            max_attempts=1
         )
 
         return {
             "success": True,
-            "message": "Video upload started",
-            "status": "processing"
+            "message": "Video upload queued",
+            "job_id": job_id,
+            "size": upload['size'],
+            "sha256": upload['sha256'],
+            "status": "queued"
         }
 
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InsufficientDiskError as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Video upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/uploads")
+async def create_resumable_upload(request: ResumableUploadRequest):
+    """
+    Start a resumable upload
+
+    Send the file with PATCH /api/uploads/{upload_id} in chunks (in any
+    order, several at a time), then POST .../finalize.
+    """
+    try:
+        upload = await get_resumable_uploads().create(
+            request.user_id,
+            request.filename,
+            request.size,
+            request.content_type,
+            request.sha256
+        )
+        return {"success": True, "data": upload}
+
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InsufficientDiskError as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.patch("/api/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, user_id: str, request: Request):
+    """
+    Write one chunk of a resumable upload
+
+    The chunk's byte offset goes in the `Upload-Offset` header and the raw
+    bytes in the body. Returns the bytes received so far and the ranges
+    still missing.
+    """
+    offset = request.headers.get('upload-offset', '')
+    if not offset.isdigit():
+        raise HTTPException(status_code=400, detail="Upload-Offset header required")
+
+    content_length = request.headers.get('content-length')
+
+    try:
+        upload = await get_resumable_uploads().write_chunk(
+            upload_id,
+            user_id,
+            int(offset),
+            request.stream(),
+            int(content_length) if content_length and content_length.isdigit() else None
+        )
+        return {"success": True, "data": upload}
+
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/uploads/{upload_id}")
+async def get_resumable_upload(upload_id: str, user_id: str):
+    """Bytes received and missing ranges, to resume after a failure"""
+    try:
+        upload = await get_resumable_uploads().status(upload_id, user_id)
+        return {"success": True, "data": upload}
+
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/api/uploads/{upload_id}/finalize")
+async def finalize_resumable_upload(upload_id: str, user_id: str):
+    """Verify the upload is complete and queue it for processing"""
+    try:
+        # Move into the incoming dir so worker processes can read it
+        upload = await get_resumable_uploads().finalize(
+            upload_id,
+            user_id,
+            INCOMING_DIR
+        )
+
+        job_id = await get_job_queue().enqueue(
+            'video_upload',
+            user_id,
+            {
+                'file_path': upload['file_path'],
+                'filename': upload['filename'],
+                'size': upload['size'],
+                'sha256': upload['sha256'],
+            },
+            max_attempts=1
+        )
+
+        return {
+            "success": True,
+            "message": "Video upload queued",
+            "job_id": job_id,
+            "size": upload['size'],
+            "sha256": upload['sha256'],
+            "status": "queued"
+        }
+
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_resumable_upload(upload_id: str, user_id: str):
+    """Abort a resumable upload and delete its chunks"""
+    try:
+        await get_resumable_uploads().abort(upload_id, user_id)
+        return {"success": True}
+
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 @app.post("/api/video/transcode")
 async def transcode_video(
     video_id: str,
@@ -226,10 +415,7 @@ async def transcode_video(
 
 
 @app.post("/api/transcription/start")
-async def start_transcription(
-    request: TranscriptionRequest,
-    background_tasks: BackgroundTasks
-):
+async def start_transcription(request: TranscriptionRequest):
     """
     Start video transcription using Whisper
 
@@ -240,17 +426,18 @@ async def start_transcription(
     try:
         logger.info(f"Starting transcription for video: {request.video_id}")
 
-        background_tasks.add_task(
-            transcription_service.transcribe_video,
-            request.video_id,
+        job_id = await get_job_queue().enqueue(
+            'transcription',
             request.user_id,
-            request.language
+            {'language': request.language},
+            video_id=request.video_id
         )
 
         return {
             "success": True,
-            "message": "Transcription started",
-            "video_id": request.video_id
+            "message": "Transcription queued",
+            "video_id": request.video_id,
+            "job_id": job_id
         }
 
     except Exception as e:
@@ -259,10 +446,7 @@ async def start_transcription(
 
 
 @app.post("/api/clips/generate")
-async def generate_clips(
-    request: ClipGenerationRequest,
-    background_tasks: BackgroundTasks
-):
+async def generate_clips(request: ClipGenerationRequest):
     """
     Generate clip suggestions using AI
 
@@ -274,19 +458,23 @@ async def generate_clips(
     try:
         logger.info(f"Generating clips for video: {request.video_id}")
 
-        background_tasks.add_task(
-            clip_service.generate_clips,
-            request.video_id,
+        job_id = await get_job_queue().enqueue(
+            'clip_generation',
             request.user_id,
-            request.clip_count,
-            request.min_duration,
-            request.max_duration
+            {
+                'clip_count': request.clip_count,
+                'min_duration': request.min_duration,
+                'max_duration': request.max_duration,
+            },
+            video_id=request.video_id,
+            max_attempts=1
         )
 
         return {
             "success": True,
-            "message": "Clip generation started",
-            "video_id": request.video_id
+            "message": "Clip generation queued",
+            "video_id": request.video_id,
+            "job_id": job_id
         }
 
     except Exception as e:
@@ -295,10 +483,7 @@ async def generate_clips(
 
 
 @app.post("/api/clips/export")
-async def export_clip(
-    request: ClipExportRequest,
-    background_tasks: BackgroundTasks
-):
+async def export_clip(request: ClipExportRequest):
     """
     Export/render a specific clip
 
@@ -309,18 +494,21 @@ async def export_clip(
     try:
         logger.info(f"Exporting clip: {request.clip_id}")
 
-        background_tasks.add_task(
-            clip_service.export_clip,
-            request.clip_id,
+        job_id = await get_job_queue().enqueue(
+            'export',
             request.user_id,
-            request.output_format,
-            request.resolution
+            {
+                'output_format': request.output_format,
+                'resolution': request.resolution,
+            },
+            clip_id=request.clip_id
         )
 
         return {
             "success": True,
-            "message": "Clip export started",
-            "clip_id": request.clip_id
+            "message": "Clip export queued",
+            "clip_id": request.clip_id,
+            "job_id": job_id
         }
 
     except Exception as e:
@@ -328,11 +516,158 @@ async def export_clip(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/pipeline")
+async def run_pipeline(request: PipelineRequest):
+    """
+    Run the full pipeline as one job
+
+    - Imports from YouTube (url) or uses an existing video (video_id)
+    - Transcribes, generates clip suggestions and exports every clip
+    - Source video is fetched once and shared by all stages
+    - Exports start as soon as each clip suggestion is stored
+    """
+    if bool(request.url) == bool(request.video_id):
+        raise HTTPException(
+            status_code=400,
+            detail="Provide exactly one of url or video_id"
+        )
+
+    try:
+        logger.info(f"Starting pipeline: {request.url or request.video_id}")
+
+        payload = {
+            'language': request.language,
+            'clip_count': request.clip_count,
+            'min_duration': request.min_duration,
+            'max_duration': request.max_duration,
+            'export_clips': request.export_clips,
+            'output_format': request.output_format,
+            'resolution': request.resolution,
+        }
+        if request.url:
+            payload['url'] = str(request.url)
+
+        job_id = await get_job_queue().enqueue(
+            'pipeline',
+            request.user_id,
+            payload,
+            video_id=request.video_id,
+            max_attempts=1
+        )
+
+        return {
+            "success": True,
+            "message": "Pipeline queued",
+            "job_id": job_id,
+            "status": "queued"
+        }
+
+    except Exception as e:
+        logger.error(f"Pipeline error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str, user_id: str):
+    """Get processing job status"""
+    job = await get_job_queue().get(job_id)
+
+    if not job or job['user_id'] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "success": True,
+        "data": {
+            "id": job['id'],
+            "job_type": job['job_type'],
+            "status": job['status'],
+            "progress": job['progress'],
+            "progress_details": job.get('progress_details') or {},
+            "error_message": job.get('error_message'),
+            "metadata": job.get('metadata') or {},
+            "attempts": job.get('attempts'),
+            "created_at": job.get('created_at'),
+            "started_at": job.get('started_at'),
+            "completed_at": job.get('completed_at'),
+        }
+    }
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, user_id: str):
+    """
+    Stream job progress as Server-Sent Events
+
+    - One `progress` event whenever status or progress changes
+    - Ends with a `done` event once the job completes or fails
+    """
+    queue = get_job_queue()
+    job = await queue.get(job_id)
+
+    if not job or job['user_id'] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last_state = None
+        idle = 0.0
+
+        while True:
+            job = await queue.get(job_id)
+            if job is None:
+                break
+
+            state = {
+                "id": job['id'],
+                "status": job['status'],
+                "progress": job['progress'],
+                "progress_details": job.get('progress_details') or {},
+                "error_message": job.get('error_message'),
+            }
+
+            if state != last_state:
+                yield f"event: progress\ndata: {json.dumps(state)}\n\n"
+                last_state = state
+                idle = 0.0
+            elif idle >= 15:
+                # Keep proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                idle = 0.0
+
+            if job['status'] in ('completed', 'failed'):
+                yield f"event: done\ndata: {json.dumps(state)}\n\n"
+                break
+
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+            idle += JOB_EVENTS_POLL_INTERVAL
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/api/video/{video_id}/info")
-async def get_video_info(video_id: str, user_id: str):
-    """Get video information and processing status"""
+async def get_video_info(
+    video_id: str,
+    user_id: str,
+    include_transcription: bool = False
+):
+    """
+    Get video information and processing status
+
+    The transcription (with word timestamps) is only included when
+    include_transcription=true.
+    """
     try:
         info = await video_service.get_video_info(video_id, user_id)
+
+        if include_transcription:
+            info['transcription'] = await video_service.get_transcription(
+                video_id,
+                user_id
+            )
+
         return {
             "success": True,
             "data": info
@@ -342,6 +677,34 @@ async def get_video_info(video_id: str, user_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/video/{video_id}/transcript")
+async def get_video_transcript(
+    video_id: str,
+    user_id: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None
+):
+    """
+    Get a video's transcript, optionally only the part between start and end
+
+    - Segments overlapping the window are returned with their word timings
+    - During transcription, the segments written so far are returned with
+      status 'partial' and transcribed_until
+    """
+    try:
+        transcript = await video_service.get_transcription(video_id, user_id, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    if transcript is None:
+        raise HTTPException(status_code=404, detail="Transcript not found")
+
+    return {
+        "success": True,
+        "data": transcript
+    }
+
+
 @app.get("/api/video/{video_id}/thumbnail")
 async def generate_thumbnail(
     video_id: str,
@@ -0,0 +1,287 @@
+"""16 kHz PCM audio: silence detection, chunking and stitching transcriptions"""
+
+import os
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Target length of one transcription chunk, in seconds
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", 180))
+
+# How far from the target a chunk boundary may move to land in a silence
+TRANSCRIBE_CHUNK_SEARCH = float(os.getenv("TRANSCRIBE_CHUNK_SEARCH", 30))
+
+# Audio shared by neighbouring chunks, so a word cut at a boundary is
+# heard whole by one of them
+TRANSCRIBE_CHUNK_OVERLAP = float(os.getenv("TRANSCRIBE_CHUNK_OVERLAP", 1.0))
+
+# Below this level for at least SILENCE_MIN_SECONDS counts as silence
+SILENCE_NOISE_DB = float(os.getenv("SILENCE_NOISE_DB", -35))
+SILENCE_MIN_SECONDS = float(os.getenv("SILENCE_MIN_SECONDS", 0.4))
+
+# Energy is measured over frames of this length
+_SILENCE_FRAME_SECONDS = 0.02
+_SILENCE_BLOCK_FRAMES = 50_000
+
+# Whisper's input format, which local transcription extracts directly
+PCM_SAMPLE_RATE = 16000
+PCM_BYTES_PER_SAMPLE = 2
+
+
+@dataclass
+class AudioChunk:
+    """
+    A slice of audio to transcribe on its own
+
+    The chunk decodes [start, end); only words and segments centred in
+    [keep_start, keep_end) are kept, the rest belong to a neighbour.
+    """
+    index: int
+    start: float
+    end: float
+    keep_start: float
+    keep_end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def pcm_duration(pcm_path: str) -> float:
+    """Length in seconds of a 16 kHz mono s16le file"""
+    return os.path.getsize(pcm_path) / PCM_BYTES_PER_SAMPLE / PCM_SAMPLE_RATE
+
+
+def read_pcm(
+    pcm_path: str,
+    start: Optional[float] = None,
+    duration: Optional[float] = None
+) -> np.ndarray:
+    """
+    Samples of a 16 kHz mono s16le file as float32 in [-1, 1)
+
+    The file is memory-mapped, so only the requested range is read.
+    """
+    samples = np.memmap(pcm_path, dtype=np.int16, mode='r')
+
+    first = 0 if start is None else int(start * PCM_SAMPLE_RATE)
+    last = len(samples) if duration is None else first + int(duration * PCM_SAMPLE_RATE)
+
+    return samples[first:last].astype(np.float32) / 32768.0
+
+
+def detect_silences(
+    pcm_path: str,
+    noise_db: float = SILENCE_NOISE_DB,
+    min_seconds: float = SILENCE_MIN_SECONDS
+) -> List[Tuple[float, float]]:
+    """
+    Find silent stretches by frame energy in a 16 kHz mono s16le file
+
+    Returns:
+        (start, end) pairs in seconds, in order
+    """
+    samples = np.memmap(pcm_path, dtype=np.int16, mode='r')
+    frame = int(PCM_SAMPLE_RATE * _SILENCE_FRAME_SECONDS)
+    frames = len(samples) // frame
+
+    # Mean square of a full-scale signal at noise_db
+    threshold = (10 ** (noise_db / 20) * 32768) ** 2
+    silent = np.empty(frames, dtype=np.int8)
+
+    # A block at a time, so hours of audio are never converted at once
+    for first in range(0, frames, _SILENCE_BLOCK_FRAMES):
+        count = min(_SILENCE_BLOCK_FRAMES, frames - first)
+        block = samples[first * frame:(first + count) * frame]\
+            .astype(np.float32)\
+            .reshape(count, frame)
+        silent[first:first + count] = np.mean(block * block, axis=1) < threshold
+
+    edges = np.diff(np.concatenate(([0], silent, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    min_frames = min_seconds / _SILENCE_FRAME_SECONDS
+
+    return [
+        (start * _SILENCE_FRAME_SECONDS, end * _SILENCE_FRAME_SECONDS)
+        for start, end in zip(starts.tolist(), ends.tolist())
+        if end - start >= min_frames
+    ]
+
+
+def plan_chunks(
+    duration: float,
+    silences: List[Tuple[float, float]],
+    chunk_seconds: float = TRANSCRIBE_CHUNK_SECONDS,
+    search_seconds: float = TRANSCRIBE_CHUNK_SEARCH,
+    overlap: float = TRANSCRIBE_CHUNK_OVERLAP
+) -> List[AudioChunk]:
+    """
+    Choose chunk boundaries, preferring the longest silence near each target
+
+    Where no silence lies within `search_seconds` of a target, the chunk
+    is cut at the target and the overlap has to catch the split word.
+    """
+    cuts = [0.0]
+
+    while duration - cuts[-1] > chunk_seconds + search_seconds:
+        target = cuts[-1] + chunk_seconds
+        candidates = [
+            (start, end) for start, end in silences
+            if abs((start + end) / 2 - target) <= search_seconds
+        ]
+
+        if candidates:
+            start, end = max(
+                candidates,
+                key=lambda silence: (
+                    silence[1] - silence[0],
+                    -abs((silence[0] + silence[1]) / 2 - target)
+                )
+            )
+            cuts.append((start + end) / 2)
+        else:
+            cuts.append(target)
+
+    cuts.append(duration)
+
+    return [
+        AudioChunk(
+            index=index,
+            start=max(0.0, keep_start - overlap),
+            end=min(duration, keep_end + overlap),
+            keep_start=keep_start,
+            keep_end=keep_end,
+        )
+        for index, (keep_start, keep_end) in enumerate(zip(cuts, cuts[1:]))
+    ]
+
+
+def split_chunk(chunk: AudioChunk, overlap: float = TRANSCRIBE_CHUNK_OVERLAP) -> List[AudioChunk]:
+    """Halve a chunk that turned out too large, keeping the overlap"""
+    middle = (chunk.keep_start + chunk.keep_end) / 2
+    return [
+        AudioChunk(chunk.index, chunk.start, min(chunk.end, middle + overlap), chunk.keep_start, middle),
+        AudioChunk(chunk.index, max(chunk.start, middle - overlap), chunk.end, middle, chunk.keep_end),
+    ]
+
+
+def _kept(chunk: AudioChunk, start: float, end: float, last: bool) -> bool:
+    middle = (start + end) / 2
+    if middle < chunk.keep_start and chunk.keep_start > 0:
+        return False
+    return last or middle < chunk.keep_end
+
+
+class ChunkStitcher:
+    """
+    Merge per-chunk transcriptions as the chunks finish, in any order
+
+    Chunks are stitched in audio order: a finished chunk waits for every
+    chunk before it, then it and any waiting successors are merged and
+    returned by add(). Times in results are relative to their chunk's
+    start. Words and segments outside a chunk's keep range are dropped,
+    and a word that both neighbours kept (same text, overlapping in time)
+    is taken once.
+    """
+
+    def __init__(self, duration: float, language: Optional[str] = None):
+        self.duration = duration
+        self.language = language
+        self.segments: List[Dict] = []
+        self.words: List[Dict] = []
+        # Audio before this point has been stitched
+        self.stitched_until = 0.0
+        self._waiting: Dict[float, Tuple[AudioChunk, Dict]] = {}
+
+    def add(self, chunk: AudioChunk, result: Dict) -> Optional[Dict]:
+        """
+        Add a chunk's transcription
+
+        Returns:
+            {'start', 'end', 'segments', 'words'} newly stitched, covering
+            [start, end) of the audio, or None while an earlier chunk is
+            still missing
+        """
+        self._waiting[chunk.keep_start] = (chunk, result)
+        start = self.stitched_until
+        first_segment = len(self.segments)
+        first_word = len(self.words)
+
+        while self.stitched_until in self._waiting:
+            chunk, result = self._waiting.pop(self.stitched_until)
+            self._stitch(chunk, result)
+            self.stitched_until = chunk.keep_end
+
+        if self.stitched_until == start:
+            return None
+
+        return {
+            'start': start,
+            'end': self.stitched_until,
+            'segments': self.segments[first_segment:],
+            'words': self.words[first_word:],
+        }
+
+    def _stitch(self, chunk: AudioChunk, result: Dict) -> None:
+        last = chunk.keep_end >= self.duration
+        self.language = self.language or result.get('language')
+
+        for segment in result.get('segments') or []:
+            start = segment['start'] + chunk.start
+            end = segment['end'] + chunk.start
+            if not _kept(chunk, start, end, last):
+                continue
+            self.segments.append({
+                'id': len(self.segments),
+                'start': start,
+                'end': end,
+                'text': segment['text'],
+            })
+
+        for word in result.get('words') or []:
+            start = word['start'] + chunk.start
+            end = word['end'] + chunk.start
+            if not _kept(chunk, start, end, last):
+                continue
+            if (
+                self.words
+                and self.words[-1]['word'].strip().lower() == word['word'].strip().lower()
+                and start < self.words[-1]['end']
+            ):
+                continue
+            self.words.append({'word': word['word'], 'start': start, 'end': end})
+
+    def result(self) -> Dict:
+        """
+        The whole transcription
+
+        Returns:
+            Transcription dict with text, language, segments and words
+        """
+        return {
+            'text': ''.join(segment['text'] for segment in self.segments).strip(),
+            'language': self.language,
+            'segments': self.segments,
+            'words': self.words,
+        }
+
+
+def stitch_chunks(
+    chunks: List[AudioChunk],
+    results: List[Dict],
+    language: Optional[str] = None
+) -> Dict:
+    """
+    Merge per-chunk transcriptions into one (see ChunkStitcher)
+
+    Returns:
+        Transcription dict with text, language, segments and words
+    """
+    stitcher = ChunkStitcher(max(chunk.keep_end for chunk in chunks), language)
+    for chunk, result in zip(chunks, results):
+        stitcher.add(chunk, result)
+    return stitcher.result()
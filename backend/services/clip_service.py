@@ -2,20 +2,30 @@
 
 import os
 import logging
-from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from groq import Groq
 from .video_service import VideoService
 from .supabase_client import get_supabase_client
+from .db_writer import get_batch_writer
+from .executor import run_io
+from .resource_governor import get_governor
+from .transcript_stream import TranscriptStream
+from .progress import ProgressCallback, scale_progress
 
 logger = logging.getLogger(__name__)
 
+# Clips covering less than this fraction of their video are cut from a
+# signed URL with range reads instead of downloading the whole source
+RANGE_READ_MAX_FRACTION = float(os.getenv("RANGE_READ_MAX_FRACTION", 0.25))
+
+# With a live transcript, clips are suggested for each window of this many
+# seconds as soon as it has been transcribed
+CLIP_ANALYSIS_WINDOW_SECONDS = float(os.getenv("CLIP_ANALYSIS_WINDOW_SECONDS", 900))
+
 
 class ClipService:
     def __init__(self):
         self.video_service = VideoService()
-        self.temp_dir = Path("/tmp/clipforge")
-        self.temp_dir.mkdir(exist_ok=True)
         self.groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
     async def generate_clips(
@@ -24,7 +34,9 @@ class ClipService:
         user_id: str,
         clip_count: int = 10,
         min_duration: int = 15,
-        max_duration: int = 60
+        max_duration: int = 60,
+        on_clip: Optional[Callable[[Dict], Awaitable[None]]] = None,
+        stream: Optional[TranscriptStream] = None
     ) -> Dict:
         """
         Generate clip suggestions using AI
@@ -35,26 +47,39 @@ class ClipService:
             clip_count: Number of clips to generate
             min_duration: Minimum clip duration in seconds
             max_duration: Maximum clip duration in seconds
+            on_clip: Awaited with each clip record as soon as it is created
+            stream: Transcript still being transcribed; clips are then
+                suggested window by window as the transcript reaches them
+                instead of reading the finished transcription
 
         Returns:
             Dictionary with generated clips
         """
-        supabase = get_supabase_client()
+        if stream is not None:
+            return await self._generate_from_stream(
+                video_id,
+                user_id,
+                stream,
+                clip_count,
+                min_duration,
+                max_duration,
+                on_clip
+            )
 
         try:
             logger.info(f"Generating {clip_count} clips for video: {video_id}")
 
-            # Get video with transcription
-            video_info = await self.video_service.get_video_info(
+            video_info = await self.video_service.get_video_info(video_id, user_id, 'duration')
+
+            # Only the transcript text is needed, not the word timings
+            transcription_text = await self.video_service.get_transcription_text(
                 video_id,
                 user_id
             )
 
-            if not video_info.get('transcription'):
+            if not transcription_text:
                 raise ValueError("Video must be transcribed first")
 
-            transcription = video_info['transcription']
-            transcription_text = transcription.get('text', '')
             duration = video_info.get('duration', 0)
 
             # Analyze with AI
@@ -68,44 +93,82 @@ class ClipService:
 
             logger.info(f"AI suggested {len(clip_suggestions)} clips")
 
-            # Create clip records in database
-            created_clips = []
-
-            for suggestion in clip_suggestions:
-                clip_data = {
-                    'video_id': video_id,
-                    'user_id': user_id,
-                    'title': suggestion['title'],
-                    'start_time': suggestion['start_time'],
-                    'end_time': suggestion['end_time'],
-                    'duration': suggestion['end_time'] - suggestion['start_time'],
-                    'ai_score': suggestion['viral_score'],
-                    'aspect_ratio': '16:9',
-                    'status': 'draft',
-                    'settings': {
-                        'hook_type': suggestion['hook_type'],
-                        'target_platform': suggestion['target_platform'],
-                        'description': suggestion['description'],
-                        'reasoning': suggestion['reasoning'],
-                        'tags': suggestion.get('tags', []),
-                    }
-                }
+            created_clips = await self._create_clips(
+                video_id,
+                user_id,
+                clip_suggestions,
+                on_clip
+            )
 
-                result = supabase.table('clips').insert(clip_data).execute()
-                created_clips.append(result.data[0])
+            logger.info(f"Created {len(created_clips)} clip records")
 
-            # Update processing job
-            supabase.table('processing_jobs').insert({
-                'user_id': user_id,
+            return {
                 'video_id': video_id,
-                'job_type': 'clip_generation',
-                'status': 'completed',
-                'progress': 100,
-                'completed_at': 'now()',
-                'metadata': {
-                    'clips_generated': len(created_clips)
-                }
-            }).execute()
+                'clips': created_clips,
+                'count': len(created_clips),
+                'status': 'completed'
+            }
+
+        except Exception as e:
+            logger.error(f"Clip generation error: {str(e)}")
+            raise
+
+    async def _generate_from_stream(
+        self,
+        video_id: str,
+        user_id: str,
+        stream: TranscriptStream,
+        clip_count: int,
+        min_duration: int,
+        max_duration: int,
+        on_clip: Optional[Callable[[Dict], Awaitable[None]]]
+    ) -> Dict:
+        """
+        Suggest clips for each CLIP_ANALYSIS_WINDOW_SECONDS of a live
+        transcript as soon as it is transcribed
+
+        Clips are shared out between windows by length; each window's
+        clips are stored (and handed to on_clip) before the next window
+        is analysed.
+        """
+        try:
+            logger.info(f"Generating {clip_count} clips for video {video_id} as it is transcribed")
+
+            video_info = await self.video_service.get_video_info(video_id, user_id, 'duration')
+            duration = video_info.get('duration') or await stream.wait_until(float('inf'))
+
+            created_clips: List[Dict] = []
+
+            async for start, end, text in stream.windows(CLIP_ANALYSIS_WINDOW_SECONDS, min_duration):
+                remaining = clip_count - len(created_clips)
+                if remaining <= 0:
+                    break
+                if not text:
+                    continue
+
+                last = stream.done and end >= stream.transcribed_until
+                count = remaining if last else min(
+                    remaining,
+                    max(1, round(clip_count * (end - start) / duration))
+                )
+
+                suggestions = await self._analyze_with_ai(
+                    text,
+                    duration,
+                    count,
+                    min_duration,
+                    max_duration,
+                    window=(start, end)
+                )
+
+                logger.info(f"AI suggested {len(suggestions)} clips for {start:.0f}-{end:.0f}s")
+
+                created_clips.extend(
+                    await self._create_clips(video_id, user_id, suggestions, on_clip)
+                )
+
+            if not stream.segments:
+                raise ValueError("Video has no transcribed speech")
 
             logger.info(f"Created {len(created_clips)} clip records")
 
@@ -120,15 +183,71 @@ class ClipService:
             logger.error(f"Clip generation error: {str(e)}")
             raise
 
+    async def _create_clips(
+        self,
+        video_id: str,
+        user_id: str,
+        suggestions: List[Dict],
+        on_clip: Optional[Callable[[Dict], Awaitable[None]]]
+    ) -> List[Dict]:
+        """Store clip suggestions as draft clips and hand each to on_clip"""
+        if not suggestions:
+            return []
+
+        # Create clip records in database, in one request
+        clip_rows = [
+            {
+                'video_id': video_id,
+                'user_id': user_id,
+                'title': suggestion['title'],
+                'start_time': suggestion['start_time'],
+                'end_time': suggestion['end_time'],
+                'duration': suggestion['end_time'] - suggestion['start_time'],
+                'ai_score': suggestion['viral_score'],
+                'aspect_ratio': '16:9',
+                'status': 'draft',
+                'settings': {
+                    'hook_type': suggestion['hook_type'],
+                    'target_platform': suggestion['target_platform'],
+                    'description': suggestion['description'],
+                    'reasoning': suggestion['reasoning'],
+                    'tags': suggestion.get('tags', []),
+                }
+            }
+            for suggestion in suggestions
+        ]
+
+        clips = await get_batch_writer().insert_many('clips', clip_rows)
+
+        if on_clip:
+            for clip in clips:
+                await on_clip(clip)
+
+        return clips
+
     async def _analyze_with_ai(
         self,
         transcription: str,
         video_duration: int,
         clip_count: int,
         min_duration: int,
-        max_duration: int
+        max_duration: int,
+        window: Optional[Tuple[float, float]] = None
     ) -> List[Dict]:
-        """Analyze transcription with Groq AI to identify viral clips"""
+        """
+        Analyze transcription with Groq AI to identify viral clips
+
+        With `window`, the transcription is the excerpt covering
+        (start, end) seconds of the video and clips must start inside it.
+        """
+
+        excerpt = ""
+        if window:
+            excerpt = (
+                f"Transcription excerpt: {window[0]:.0f} to {window[1]:.0f} seconds "
+                f"of the video. Clips must start within this range; times are "
+                f"seconds from the start of the video.\n"
+            )
 
         prompt = f"""You are an expert video editor analyzing video transcriptions to identify viral-worthy clip segments.
 
@@ -136,7 +255,7 @@ Video Duration: {video_duration} seconds
 Requested Clips: {clip_count}
 Min Duration: {min_duration} seconds
 Max Duration: {max_duration} seconds
-
+{excerpt}
 Transcription:
 {transcription[:8000]}  # Limit to avoid token limits
 
@@ -172,12 +291,14 @@ Example format:
 """
 
         try:
-            response = self.groq_client.chat.completions.create(
-                model="mixtral-8x7b-32768",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=3000
-            )
+            async with get_governor().slot('llm'):
+                response = await run_io(
+                    self.groq_client.chat.completions.create,
+                    model="mixtral-8x7b-32768",
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.7,
+                    max_tokens=3000
+                )
 
             content = response.choices[0].message.content
 
@@ -194,6 +315,8 @@ Example format:
             # Validate and filter clips
             valid_clips = []
             for clip in clips:
+                if window and not window[0] <= clip.get('start_time', 0) < window[1]:
+                    continue
                 if (
                     clip.get('start_time', 0) >= 0 and
                     clip.get('end_time', 0) <= video_duration and
@@ -214,7 +337,9 @@ Example format:
         clip_id: str,
         user_id: str,
         output_format: str = "mp4",
-        resolution: str = "1080p"
+        resolution: str = "1080p",
+        source_path: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None
     ) -> Dict:
         """
         Export/render a clip
@@ -224,24 +349,27 @@ Example format:
             user_id: User ID
             output_format: Output format (mp4, mov, etc)
             resolution: Output resolution (1080p, 720p, etc)
+            source_path: Local copy of the source video; skips the storage
+                download and is left in place for the caller
+            progress: Progress callback
 
         Returns:
             Dictionary with exported clip info
         """
         supabase = get_supabase_client()
-        video_path = None
-        output_path = None
+        source = None
 
         try:
             logger.info(f"Exporting clip: {clip_id}")
 
             # Get clip info
-            clip_result = supabase.table('clips')\
-                .select('*, videos(*)')\
+            clip_query = supabase.table('clips')\
+                .select('id, start_time, end_time, videos(file_path, duration)')\
                 .eq('id', clip_id)\
                 .eq('user_id', user_id)\
-                .single()\
-                .execute()
+                .single()
+
+            clip_result = await clip_query.execute()
 
             if not clip_result.data:
                 raise ValueError("Clip not found")
@@ -250,75 +378,62 @@ Example format:
             video = clip['videos']
 
             # Update clip status
-            supabase.table('clips').update({
+            await get_batch_writer().update('clips', clip_id, {
                 'status': 'processing'
-            }).eq('id', clip_id).execute()
-
-            # Download video
-            video_path = self.video_service._download_from_storage(
-                video['file_path'],
-                'videos'
-            )
-
-            # Cut clip
-            output_path = self.temp_dir / f"{clip_id}.{output_format}"
+            }, wait=False)
+
+            if source_path is None:
+                clip_length = clip['end_time'] - clip['start_time']
+                video_duration = video.get('duration') or 0
+
+                if clip_length < RANGE_READ_MAX_FRACTION * video_duration:
+                    # Short clip: the cached copy, or a signed URL to seek in
+                    source = await self.video_service.source_cache.checkout_range(
+                        'videos',
+                        video['file_path']
+                    )
+                else:
+                    # Check out the cached source, downloading on a miss
+                    source = await self.video_service.source_cache.checkout(
+                        'videos',
+                        video['file_path']
+                    )
+                source_path = str(source.path)
+
+            # Cut clip and upload it as it is encoded
+            storage_path = f"{user_id}/clips/{clip_id}.{output_format}"
 
-            self.video_service.cut_video(
-                str(video_path),
-                str(output_path),
+            await self.video_service.cut_to_storage(
+                source_path,
+                storage_path,
                 clip['start_time'],
-                clip['end_time']
+                clip['end_time'],
+                output_format,
+                progress=scale_progress(progress, 0, 90)
             )
 
-            logger.info(f"Clip cut: {output_path}")
-
-            # Upload to storage
-            storage_path = f"{user_id}/clips/{clip_id}.{output_format}"
-
-            with open(output_path, 'rb') as f:
-                supabase.storage.from_('videos').upload(
-                    storage_path,
-                    f,
-                    file_options={"content-type": f"video/{output_format}"}
-                )
-
-            # Generate thumbnail
-            thumbnail_path = self.temp_dir / f"{clip_id}_thumb.jpg"
-            import ffmpeg
-
-            (
-                ffmpeg
-                .input(str(output_path), ss=1)
-                .filter('scale', 1280, -1)
-                .output(str(thumbnail_path), vframes=1, format='image2')
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
-            )
+            logger.info(f"Clip cut: {storage_path}")
 
-            # Upload thumbnail
+            # Thumbnail 1s into the clip, taken from the source so the
+            # clip itself is never read back
             thumb_storage_path = f"{user_id}/clips/thumbnails/{clip_id}.jpg"
 
-            with open(thumbnail_path, 'rb') as f:
-                supabase.storage.from_('videos').upload(
-                    thumb_storage_path,
-                    f,
-                    file_options={"content-type": "image/jpeg"}
-                )
+            await self.video_service.render_frame(
+                source_path,
+                thumb_storage_path,
+                clip['start_time'] + min(1, (clip['end_time'] - clip['start_time']) / 2)
+            )
 
             # Update clip
-            supabase.table('clips').update({
+            await get_batch_writer().update('clips', clip_id, {
                 'file_path': storage_path,
                 'thumbnail_path': thumb_storage_path,
                 'status': 'ready'
-            }).eq('id', clip_id).execute()
+            })
 
             # Cleanup
-            if video_path and video_path.exists():
-                video_path.unlink()
-            if output_path and output_path.exists():
-                output_path.unlink()
-            if thumbnail_path.exists():
-                thumbnail_path.unlink()
+            if source:
+                source.release()
 
             logger.info(f"Clip exported successfully: {clip_id}")
 
@@ -333,14 +448,12 @@ Example format:
             logger.error(f"Clip export error: {str(e)}")
 
             # Update status to failed
-            supabase.table('clips').update({
+            await get_batch_writer().update('clips', clip_id, {
                 'status': 'failed'
-            }).eq('id', clip_id).execute()
+            })
 
             # Cleanup
-            if video_path and video_path.exists():
-                video_path.unlink()
-            if output_path and output_path.exists():
-                output_path.unlink()
+            if source:
+                source.release()
 
             raise
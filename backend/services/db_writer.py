@@ -0,0 +1,189 @@
+"""Batched database writes: multi-row inserts and coalesced row updates"""
+
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from .supabase_client import get_supabase_client
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# How long updates wait for others to the same row before being written
+DB_WRITE_WINDOW = float(os.getenv("DB_WRITE_WINDOW", 0.2))
+
+# Rows per INSERT request
+DB_BATCH_MAX_ROWS = int(os.getenv("DB_BATCH_MAX_ROWS", 500))
+
+
+class _PendingUpdate:
+    def __init__(self):
+        self.values: Dict = {}
+        self.waiters: List[asyncio.Future] = []
+
+
+class BatchWriter:
+    """
+    Cut database round trips for status and progress writes
+
+    Updates to the same row within DB_WRITE_WINDOW are merged into one
+    (later values win), and rows of a table that end up with identical
+    values, e.g. several clips moving to 'processing', share one
+    `id=in.(...)` PATCH. Callers that await update() get the write's
+    error, if any; wait=False is for progress writes nobody waits on.
+    """
+
+    def __init__(self, window: float = DB_WRITE_WINDOW, max_rows: int = DB_BATCH_MAX_ROWS):
+        self.window = window
+        self.max_rows = max_rows
+        self._pending: Dict[Tuple[str, str], _PendingUpdate] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # Keeps flushes in order, so a later write never lands first
+        self._flush_lock = asyncio.Lock()
+
+    async def insert_many(
+        self,
+        table: str,
+        rows: List[Dict],
+        returning: bool = True
+    ) -> List[Dict]:
+        """
+        Insert rows with as few requests as possible
+
+        Args:
+            table: Table name
+            rows: Rows to insert
+            returning: Return the inserted rows; False saves sending them back
+
+        Returns:
+            The inserted rows, in order (empty without returning)
+        """
+        supabase = get_supabase_client()
+        inserted = []
+
+        for start in range(0, len(rows), self.max_rows):
+            batch = rows[start:start + self.max_rows]
+            result = await supabase.table(table).insert(
+                batch,
+                returning='representation' if returning else 'minimal'
+            ).execute()
+            inserted.extend(result.data or [])
+            metrics.inc('db_rows_inserted', len(batch), table=table)
+
+        return inserted
+
+    async def update(
+        self,
+        table: str,
+        row_id: str,
+        values: Dict,
+        wait: bool = True
+    ) -> None:
+        """
+        Queue an update of one row by id
+
+        Args:
+            table: Table name
+            row_id: Value of the row's id column
+            values: Columns to set
+            wait: Wait until the write has been made
+        """
+        key = (table, row_id)
+        pending = self._pending.get(key)
+
+        if pending is None:
+            pending = self._pending[key] = _PendingUpdate()
+        else:
+            metrics.inc('db_updates_coalesced', table=table)
+
+        pending.values.update(values)
+
+        waiter = None
+        if wait:
+            waiter = asyncio.get_running_loop().create_future()
+            pending.waiters.append(waiter)
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+        if waiter is not None:
+            await waiter
+
+    async def _flush_later(self) -> None:
+        # Callers woken by a flush may queue updates before this task is
+        # done, when update() would not start another one
+        while True:
+            await asyncio.sleep(self.window)
+            await self.flush()
+            if not self._pending:
+                return
+
+    async def flush(self) -> None:
+        """Write everything pending now"""
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if pending:
+                await self._write(pending)
+
+    async def close(self) -> None:
+        """Write what is pending, e.g. on shutdown"""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+
+    async def _write(self, pending: Dict[Tuple[str, str], _PendingUpdate]) -> None:
+        groups: Dict[Tuple[str, str], List[Tuple[str, _PendingUpdate]]] = {}
+        for (table, row_id), update in pending.items():
+            values_key = json.dumps(update.values, sort_keys=True, default=str)
+            groups.setdefault((table, values_key), []).append((row_id, update))
+
+        await asyncio.gather(*(
+            self._write_group(table, members)
+            for (table, _), members in groups.items()
+        ))
+
+    async def _write_group(
+        self,
+        table: str,
+        members: List[Tuple[str, _PendingUpdate]]
+    ) -> None:
+        supabase = get_supabase_client()
+        values = members[0][1].values
+        ids = [row_id for row_id, _ in members]
+
+        error = None
+        try:
+            query = supabase.table(table).update(values)
+            if len(ids) == 1:
+                query = query.eq('id', ids[0])
+            else:
+                query = query.in_('id', ids)
+            await query.execute()
+            metrics.inc('db_update_requests', table=table)
+
+        except Exception as e:
+            error = e
+            logger.error(f"Batched update of {table} {ids} failed: {str(e)}")
+
+        for _, update in members:
+            for waiter in update.waiters:
+                if waiter.done():
+                    continue
+                if error is not None:
+                    waiter.set_exception(error)
+                else:
+                    waiter.set_result(None)
+
+
+_batch_writer: BatchWriter | None = None
+
+
+def get_batch_writer() -> BatchWriter:
+    """Get or create BatchWriter singleton"""
+    global _batch_writer
+
+    if _batch_writer is None:
+        _batch_writer = BatchWriter()
+
+    return _batch_writer
@@ -0,0 +1,126 @@
+"""Bounded executors for blocking calls made from async service code"""
+
+import os
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+_io_executor: ThreadPoolExecutor | None = None
+_cpu_executor: ProcessPoolExecutor | None = None
+_transcribe_executor: ProcessPoolExecutor | None = None
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool for I/O-bound blocking calls
+
+    Used for the sync Groq client, yt-dlp, file I/O and for waiting on
+    ffmpeg subprocesses, which do their CPU work outside the GIL.
+    """
+    global _io_executor
+
+    if _io_executor is None:
+        workers = int(os.getenv(
+            "IO_EXECUTOR_THREADS",
+            min(32, (os.cpu_count() or 1) + 4)
+        ))
+        _io_executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="clipforge-io"
+        )
+
+    return _io_executor
+
+
+def get_cpu_executor() -> ProcessPoolExecutor:
+    """Process pool for CPU-bound Python work"""
+    global _cpu_executor
+
+    if _cpu_executor is None:
+        workers = int(os.getenv(
+            "CPU_EXECUTOR_PROCESSES",
+            max(1, (os.cpu_count() or 1) // 2)
+        ))
+        _cpu_executor = ProcessPoolExecutor(max_workers=workers)
+
+    return _cpu_executor
+
+
+def get_transcribe_executor() -> ProcessPoolExecutor:
+    """
+    Dedicated process pool for local Whisper
+
+    Its processes live as long as the pool and keep models loaded between
+    jobs (see whisper_models), so it is sized like the governor's
+    'transcribe' pool rather than by CPU count.
+    """
+    global _transcribe_executor
+
+    if _transcribe_executor is None:
+        from .resource_governor import default_slot_counts
+        from .whisper_models import init_transcription_process
+
+        workers = int(os.getenv(
+            "TRANSCRIBE_PROCESSES",
+            default_slot_counts()['transcribe']
+        ))
+        _transcribe_executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_transcription_process,
+            initargs=(workers,)
+        )
+
+    return _transcribe_executor
+
+
+async def run_io(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking I/O call in the thread pool and await the result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_io_executor(),
+        functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_cpu(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a CPU-bound call in the process pool and await the result
+
+    `func` and its arguments must be picklable, so pass module-level
+    functions and plain data rather than bound methods.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_cpu_executor(),
+        functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_transcribe(func: Callable, *args, **kwargs) -> Any:
+    """Run a call in the transcription process pool and await the result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_transcribe_executor(),
+        functools.partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_executors() -> None:
+    """Shut down the pools, waiting for running calls to finish"""
+    global _io_executor, _cpu_executor, _transcribe_executor
+
+    if _io_executor is not None:
+        _io_executor.shutdown(wait=True)
+        _io_executor = None
+
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=True)
+        _cpu_executor = None
+
+    if _transcribe_executor is not None:
+        _transcribe_executor.shutdown(wait=True)
+        _transcribe_executor = None
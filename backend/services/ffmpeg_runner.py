@@ -0,0 +1,143 @@
+"""Run ffmpeg asynchronously with machine-readable progress"""
+
+import re
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+import ffmpeg
+from .progress import ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+_PROGRESS_LINE = re.compile(r'^([a-z0-9_]+)=(.*)$')
+
+
+def _parse_progress(block: Dict[str, str], duration: Optional[float]) -> Dict:
+    """Turn one `-progress` block into seconds, speed, fps, percent and eta"""
+    out_time_us = block.get('out_time_us') or block.get('out_time_ms')
+    try:
+        out_time = max(0.0, int(out_time_us) / 1_000_000)
+    except (TypeError, ValueError):
+        out_time = 0.0
+
+    try:
+        speed = float(block.get('speed', '0').rstrip('x'))
+    except ValueError:
+        speed = 0.0
+
+    try:
+        fps = float(block.get('fps', 0))
+    except ValueError:
+        fps = 0.0
+
+    details = {
+        'out_time': round(out_time, 2),
+        'speed': speed,
+        'fps': fps,
+    }
+
+    if duration:
+        details['percent'] = min(100.0, out_time / duration * 100)
+        if speed > 0:
+            details['eta'] = round(max(0.0, duration - out_time) / speed, 1)
+
+    return details
+
+
+async def run_ffmpeg(
+    stream,
+    duration: Optional[float] = None,
+    progress: Optional[ProgressCallback] = None,
+    stdout_consumer: Optional[Callable[[asyncio.StreamReader], Awaitable[Any]]] = None
+) -> Any:
+    """
+    Run an ffmpeg-python stream as an async subprocess
+
+    ffmpeg writes `-progress` key=value blocks to stderr; each completed
+    block is parsed and passed to `progress` as a percentage of
+    `duration` (seconds of output expected). Other stderr lines are kept
+    for the error message.
+
+    Outputs written to `pipe:` can be handed to `stdout_consumer` (e.g.
+    an upload) while ffmpeg is still running; if the consumer fails,
+    ffmpeg is killed.
+
+    Args:
+        stream: ffmpeg-python output stream
+        duration: Expected output duration in seconds, for percentages
+        progress: Awaited with (percent, details) for each progress block
+        stdout_consumer: Awaited with ffmpeg's stdout stream
+
+    Returns:
+        Captured stdout, or the consumer's result
+
+    Raises:
+        ffmpeg.Error: ffmpeg exited with a non-zero status
+    """
+    args = ffmpeg.compile(stream)
+    args = [
+        args[0],
+        '-nostats',
+        '-loglevel', 'error',
+        '-progress', 'pipe:2',
+        *args[1:],
+    ]
+
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    if stdout_consumer is None:
+        stdout_task = asyncio.create_task(process.stdout.read())
+    else:
+        stdout_task = asyncio.create_task(stdout_consumer(process.stdout))
+
+        def stop_on_failure(task: asyncio.Task) -> None:
+            # Otherwise ffmpeg blocks forever on a full pipe
+            if not task.cancelled() and task.exception() and process.returncode is None:
+                process.kill()
+
+        stdout_task.add_done_callback(stop_on_failure)
+
+    error_lines = []
+    block: Dict[str, str] = {}
+
+    try:
+        async for raw_line in process.stderr:
+            line = raw_line.decode(errors='replace').strip()
+            match = _PROGRESS_LINE.match(line)
+
+            if not match:
+                if line:
+                    error_lines.append(line)
+                continue
+
+            key, value = match.groups()
+            block[key] = value
+
+            # Blocks end with progress=continue|end; keys carry over so a
+            # short final block still reports the last position
+            if key == 'progress' and progress is not None:
+                details = _parse_progress(block, duration)
+                await progress(details.get('percent', 0.0), details)
+
+        stdout = await stdout_task
+        returncode = await process.wait()
+
+    except asyncio.CancelledError:
+        stdout_task.cancel()
+        if process.returncode is None:
+            process.kill()
+        raise
+
+    if returncode != 0:
+        raise ffmpeg.Error(
+            'ffmpeg',
+            stdout if isinstance(stdout, bytes) else b'',
+            '\n'.join(error_lines).encode()
+        )
+
+    return stdout
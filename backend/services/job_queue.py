@@ -0,0 +1,573 @@
+"""Durable job queue backed by the processing_jobs table"""
+
+import os
+import json
+import inspect
+import sqlite3
+import threading
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from uuid import uuid4
+from .supabase_client import get_supabase_client
+from .db_writer import get_batch_writer
+from .executor import run_io
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS_QUEUED = 'queued'
+JOB_STATUS_PROCESSING = 'processing'
+JOB_STATUS_COMPLETED = 'completed'
+JOB_STATUS_FAILED = 'failed'
+
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 30
+
+
+@dataclass
+class Job:
+    """A leased job handed to a worker"""
+    id: str
+    job_type: str
+    user_id: str
+    payload: Dict = field(default_factory=dict)
+    video_id: Optional[str] = None
+    clip_id: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "Job":
+        return cls(
+            id=row['id'],
+            job_type=row['job_type'],
+            user_id=row['user_id'],
+            payload=row.get('payload') or {},
+            video_id=row.get('video_id'),
+            clip_id=row.get('clip_id'),
+            attempts=row.get('attempts') or 0,
+            max_attempts=row.get('max_attempts') or DEFAULT_MAX_ATTEMPTS,
+        )
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class SupabaseJobBackend:
+    """
+    Job storage on the Postgres processing_jobs table
+
+    Leasing goes through the lease_processing_job() RPC, which claims
+    rows with FOR UPDATE SKIP LOCKED so concurrent workers never pick
+    the same job, and fails jobs whose lease expired on their last
+    attempt. Calls go through the async Supabase client; the
+    SQLite backend below is synchronous and runs in the I/O executor.
+    """
+
+    async def enqueue(
+        self,
+        job_type: str,
+        user_id: str,
+        payload: Dict,
+        video_id: Optional[str] = None,
+        clip_id: Optional[str] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ) -> str:
+        supabase = get_supabase_client()
+
+        result = await supabase.table('processing_jobs').insert({
+            'user_id': user_id,
+            'video_id': video_id,
+            'clip_id': clip_id,
+            'job_type': job_type,
+            'status': JOB_STATUS_QUEUED,
+            'progress': 0,
+            'payload': payload,
+            'max_attempts': max_attempts,
+        }).execute()
+
+        return result.data[0]['id']
+
+    async def lease(
+        self,
+        worker_id: str,
+        job_types: List[str],
+        lease_seconds: int
+    ) -> Optional[Job]:
+        supabase = get_supabase_client()
+
+        result = await supabase.rpc('lease_processing_job', {
+            'p_worker_id': worker_id,
+            'p_job_types': job_types,
+            'p_lease_seconds': lease_seconds,
+        }).execute()
+
+        if not result.data:
+            return None
+
+        return Job.from_row(result.data[0])
+
+    async def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        supabase = get_supabase_client()
+
+        result = await supabase.table('processing_jobs').update({
+            'lease_expires_at': (
+                _utcnow() + timedelta(seconds=lease_seconds)
+            ).isoformat(),
+        }).eq('id', job_id).eq('worker_id', worker_id).execute()
+
+        return bool(result.data)
+
+    async def update_progress(self, job_id: str, progress: int, details: Dict) -> None:
+        # Merged with the job's next write; nothing waits on progress
+        await get_batch_writer().update('processing_jobs', job_id, {
+            'progress': progress,
+            'progress_details': details,
+        }, wait=False)
+
+    async def _finish(self, job_id: str, worker_id: str, update: Dict) -> bool:
+        # Pending progress writes land first, so none can follow the
+        # final status
+        await get_batch_writer().flush()
+
+        supabase = get_supabase_client()
+
+        result = await supabase.table('processing_jobs')\
+            .update(update)\
+            .eq('id', job_id)\
+            .eq('worker_id', worker_id)\
+            .execute()
+
+        return bool(result.data)
+
+    async def complete(self, job_id: str, worker_id: str, metadata: Dict) -> bool:
+        return await self._finish(job_id, worker_id, {
+            'status': JOB_STATUS_COMPLETED,
+            'progress': 100,
+            'metadata': metadata,
+            'completed_at': _utcnow().isoformat(),
+            'lease_expires_at': None,
+        })
+
+    async def fail(self, job_id: str, worker_id: str, error: str, retry: bool) -> bool:
+        if retry:
+            update = {
+                'status': JOB_STATUS_QUEUED,
+                'progress': 0,
+                'error_message': error,
+                'worker_id': None,
+                'lease_expires_at': None,
+                'available_at': (
+                    _utcnow() + timedelta(seconds=RETRY_BACKOFF_SECONDS)
+                ).isoformat(),
+            }
+        else:
+            update = {
+                'status': JOB_STATUS_FAILED,
+                'error_message': error,
+                'completed_at': _utcnow().isoformat(),
+                'lease_expires_at': None,
+            }
+
+        return await self._finish(job_id, worker_id, update)
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        supabase = get_supabase_client()
+
+        result = await supabase.table('processing_jobs')\
+            .select('*')\
+            .eq('id', job_id)\
+            .maybe_single()\
+            .execute()
+
+        return result.data if result else None
+
+
+class SQLiteJobBackend:
+    """
+    Job storage on a local SQLite database
+
+    Stands in for Postgres in tests and single-host development. A file
+    path is safe to share between worker processes; ':memory:' keeps the
+    queue inside the current process.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS processing_jobs (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            video_id TEXT,
+            clip_id TEXT,
+            job_type TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress INTEGER NOT NULL DEFAULT 0,
+            error_message TEXT,
+            metadata TEXT NOT NULL DEFAULT '{}',
+            progress_details TEXT NOT NULL DEFAULT '{}',
+            payload TEXT NOT NULL DEFAULT '{}',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            worker_id TEXT,
+            lease_expires_at TEXT,
+            available_at TEXT NOT NULL,
+            started_at TEXT,
+            completed_at TEXT,
+            created_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_processing_jobs_lease
+            ON processing_jobs(status, available_at);
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self._SCHEMA)
+
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict:
+        data = dict(row)
+        data['payload'] = json.loads(data['payload'] or '{}')
+        data['metadata'] = json.loads(data['metadata'] or '{}')
+        data['progress_details'] = json.loads(data['progress_details'] or '{}')
+        return data
+
+    def enqueue(
+        self,
+        job_type: str,
+        user_id: str,
+        payload: Dict,
+        video_id: Optional[str] = None,
+        clip_id: Optional[str] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ) -> str:
+        job_id = str(uuid4())
+        now = _utcnow().isoformat()
+
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO processing_jobs (
+                    id, user_id, video_id, clip_id, job_type, status,
+                    payload, max_attempts, available_at, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    job_id, user_id, video_id, clip_id, job_type,
+                    JOB_STATUS_QUEUED, json.dumps(payload), max_attempts,
+                    now, now,
+                )
+            )
+
+        return job_id
+
+    def lease(
+        self,
+        worker_id: str,
+        job_types: List[str],
+        lease_seconds: int
+    ) -> Optional[Job]:
+        now = _utcnow()
+        placeholders = ','.join('?' for _ in job_types)
+
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so two
+            # processes can't select the same row before updating it
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases with no attempts left would otherwise
+                # stay 'processing' forever
+                self._conn.execute(
+                    """
+                    UPDATE processing_jobs
+                    SET status = ?,
+                        error_message = 'lease expired after ' || attempts || ' attempts',
+                        completed_at = ?, lease_expires_at = NULL
+                    WHERE status = ? AND lease_expires_at < ?
+                      AND attempts >= max_attempts
+                    """,
+                    (
+                        JOB_STATUS_FAILED, now.isoformat(),
+                        JOB_STATUS_PROCESSING, now.isoformat(),
+                    )
+                )
+
+                row = self._conn.execute(
+                    f"""
+                    SELECT * FROM processing_jobs
+                    WHERE job_type IN ({placeholders})
+                      AND (
+                        (status = ? AND available_at <= ?)
+                        OR (
+                          status = ? AND lease_expires_at < ?
+                          AND attempts < max_attempts
+                        )
+                      )
+                    ORDER BY created_at
+                    LIMIT 1
+                    """,
+                    (
+                        *job_types,
+                        JOB_STATUS_QUEUED, now.isoformat(),
+                        JOB_STATUS_PROCESSING, now.isoformat(),
+                    )
+                ).fetchone()
+
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                self._conn.execute(
+                    """
+                    UPDATE processing_jobs
+                    SET status = ?, worker_id = ?, attempts = attempts + 1,
+                        lease_expires_at = ?,
+                        started_at = COALESCE(started_at, ?)
+                    WHERE id = ?
+                    """,
+                    (
+                        JOB_STATUS_PROCESSING, worker_id,
+                        (now + timedelta(seconds=lease_seconds)).isoformat(),
+                        now.isoformat(), row['id'],
+                    )
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        data = self._row_to_dict(row)
+        data['attempts'] += 1
+        return Job.from_row(data)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        expires = (_utcnow() + timedelta(seconds=lease_seconds)).isoformat()
+
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE processing_jobs SET lease_expires_at = ?
+                WHERE id = ? AND worker_id = ?
+                """,
+                (expires, job_id, worker_id)
+            )
+
+        return cursor.rowcount > 0
+
+    def update_progress(self, job_id: str, progress: int, details: Dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE processing_jobs SET progress = ?, progress_details = ?
+                WHERE id = ?
+                """,
+                (progress, json.dumps(details), job_id)
+            )
+
+    def complete(self, job_id: str, worker_id: str, metadata: Dict) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE processing_jobs
+                SET status = ?, progress = 100, metadata = ?,
+                    completed_at = ?, lease_expires_at = NULL
+                WHERE id = ? AND worker_id = ?
+                """,
+                (
+                    JOB_STATUS_COMPLETED, json.dumps(metadata),
+                    _utcnow().isoformat(), job_id, worker_id,
+                )
+            )
+
+        return cursor.rowcount > 0
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool) -> bool:
+        now = _utcnow()
+
+        with self._lock:
+            if retry:
+                cursor = self._conn.execute(
+                    """
+                    UPDATE processing_jobs
+                    SET status = ?, progress = 0, error_message = ?, worker_id = NULL,
+                        lease_expires_at = NULL, available_at = ?
+                    WHERE id = ? AND worker_id = ?
+                    """,
+                    (
+                        JOB_STATUS_QUEUED, error,
+                        (now + timedelta(seconds=RETRY_BACKOFF_SECONDS)).isoformat(),
+                        job_id, worker_id,
+                    )
+                )
+            else:
+                cursor = self._conn.execute(
+                    """
+                    UPDATE processing_jobs
+                    SET status = ?, error_message = ?, completed_at = ?,
+                        lease_expires_at = NULL
+                    WHERE id = ? AND worker_id = ?
+                    """,
+                    (JOB_STATUS_FAILED, error, now.isoformat(), job_id, worker_id)
+                )
+
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM processing_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+
+        return self._row_to_dict(row) if row else None
+
+
+class JobQueue:
+    """
+    Enqueue and lease jobs
+
+    The API process only enqueues; worker processes (see worker.py)
+    lease jobs, run them and report the outcome back.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or SupabaseJobBackend()
+
+    async def _call(self, method: str, *args, **kwargs):
+        """Await an async backend method or run a blocking one in the I/O executor"""
+        func = getattr(self.backend, method)
+        if inspect.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        return await run_io(func, *args, **kwargs)
+
+    async def enqueue(
+        self,
+        job_type: str,
+        user_id: str,
+        payload: Dict,
+        video_id: Optional[str] = None,
+        clip_id: Optional[str] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ) -> str:
+        """
+        Add a job with status 'queued'
+
+        Returns:
+            ID of the processing_jobs row
+        """
+        job_id = await self._call(
+            'enqueue',
+            job_type,
+            user_id,
+            payload,
+            video_id=video_id,
+            clip_id=clip_id,
+            max_attempts=max_attempts
+        )
+        logger.info(f"Enqueued {job_type} job: {job_id}")
+        return job_id
+
+    async def lease(
+        self,
+        worker_id: str,
+        job_types: List[str],
+        lease_seconds: int = DEFAULT_LEASE_SECONDS
+    ) -> Optional[Job]:
+        """Claim the oldest runnable job, or None if the queue is empty"""
+        return await self._call(
+            'lease',
+            worker_id,
+            job_types,
+            lease_seconds
+        )
+
+    async def heartbeat(
+        self,
+        job_id: str,
+        worker_id: str,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS
+    ) -> bool:
+        """Extend a lease; False means the job was taken over"""
+        return await self._call(
+            'heartbeat',
+            job_id,
+            worker_id,
+            lease_seconds
+        )
+
+    async def update_progress(
+        self,
+        job_id: str,
+        progress: int,
+        details: Optional[Dict] = None
+    ) -> None:
+        await self._call(
+            'update_progress',
+            job_id,
+            progress,
+            details or {}
+        )
+
+    async def complete(
+        self,
+        job_id: str,
+        worker_id: str,
+        metadata: Optional[Dict] = None
+    ) -> bool:
+        """
+        Mark a job completed
+
+        Returns:
+            False if `worker_id` no longer holds the job's lease; the job
+            is left to the worker that does
+        """
+        return await self._call('complete', job_id, worker_id, metadata or {})
+
+    async def fail(self, job: Job, worker_id: str, error: str) -> bool:
+        """
+        Mark a job failed, re-queueing it while attempts remain
+
+        Returns:
+            False if `worker_id` no longer holds the job's lease
+        """
+        retry = job.attempts < job.max_attempts
+        return await self._call('fail', job.id, worker_id, error, retry)
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await self._call('get', job_id)
+
+
+_job_queue: JobQueue | None = None
+
+
+def get_job_queue() -> JobQueue:
+    """Get or create JobQueue singleton"""
+    global _job_queue
+
+    if _job_queue is None:
+        backend_name = os.getenv("JOB_QUEUE_BACKEND", "supabase")
+
+        if backend_name == "sqlite":
+            backend = SQLiteJobBackend(
+                os.getenv("JOB_QUEUE_SQLITE_PATH", "/tmp/clipforge/jobs.db")
+            )
+        elif backend_name == "memory":
+            backend = SQLiteJobBackend(":memory:")
+        elif backend_name == "supabase":
+            backend = SupabaseJobBackend()
+        else:
+            raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {backend_name}")
+
+        _job_queue = JobQueue(backend)
+
+    return _job_queue
@@ -0,0 +1,255 @@
+"""Worker loop that leases jobs from the queue and runs them"""
+
+import os
+import asyncio
+import logging
+import socket
+from typing import Awaitable, Callable, Dict, Optional
+from .job_queue import Job, JobQueue, DEFAULT_LEASE_SECONDS
+from .metrics import metrics, publish_snapshots
+from .progress import JobProgressReporter, ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Job, ProgressCallback], Awaitable[Optional[Dict]]]
+
+
+def build_job_handlers() -> Dict[str, JobHandler]:
+    """
+    Map job types to service calls
+
+    Services are created here rather than at import time so each worker
+    process gets its own instances.
+    """
+    from .youtube_service import YouTubeService
+    from .video_service import VideoService
+    from .transcription_service import TranscriptionService
+    from .clip_service import ClipService
+    from .pipeline_service import PipelineService
+
+    youtube_service = YouTubeService()
+    video_service = VideoService()
+    transcription_service = TranscriptionService()
+    clip_service = ClipService()
+    pipeline_service = PipelineService(
+        youtube_service,
+        video_service,
+        transcription_service,
+        clip_service
+    )
+
+    async def youtube_import(job: Job, progress: ProgressCallback) -> Dict:
+        result = await youtube_service.import_video(
+            job.payload['url'],
+            job.user_id,
+            progress=progress
+        )
+        return {'video_id': result['video_id']}
+
+    async def video_upload(job: Job, progress: ProgressCallback) -> Dict:
+        result = await video_service.process_uploaded_video(
+            job.payload['file_path'],
+            job.user_id,
+            job.payload['filename'],
+            sha256=job.payload.get('sha256')
+        )
+        return {'video_id': result['video_id']}
+
+    async def transcription(job: Job, progress: ProgressCallback) -> Dict:
+        result = await transcription_service.transcribe_video(
+            job.video_id,
+            job.user_id,
+            job.payload.get('language', 'en'),
+            progress=progress
+        )
+        return {
+            'word_count': result['transcription'].word_count,
+            'language': job.payload.get('language', 'en'),
+            'method': result['method'],
+            'cached': result['cached'],
+        }
+
+    async def clip_generation(job: Job, progress: ProgressCallback) -> Dict:
+        result = await clip_service.generate_clips(
+            job.video_id,
+            job.user_id,
+            job.payload.get('clip_count', 10),
+            job.payload.get('min_duration', 15),
+            job.payload.get('max_duration', 60)
+        )
+        return {'clips_generated': result['count']}
+
+    async def export(job: Job, progress: ProgressCallback) -> Dict:
+        result = await clip_service.export_clip(
+            job.clip_id,
+            job.user_id,
+            job.payload.get('output_format', 'mp4'),
+            job.payload.get('resolution', '1080p'),
+            progress=progress
+        )
+        return {
+            'file_path': result['file_path'],
+            'thumbnail_path': result['thumbnail_path'],
+        }
+
+    async def pipeline(job: Job, progress: ProgressCallback) -> Dict:
+        result = await pipeline_service.run_pipeline(
+            job.user_id,
+            url=job.payload.get('url'),
+            video_id=job.video_id,
+            language=job.payload.get('language', 'en'),
+            clip_count=job.payload.get('clip_count', 10),
+            min_duration=job.payload.get('min_duration', 15),
+            max_duration=job.payload.get('max_duration', 60),
+            export_clips=job.payload.get('export_clips', True),
+            output_format=job.payload.get('output_format', 'mp4'),
+            resolution=job.payload.get('resolution', '1080p'),
+            progress=progress
+        )
+        return {
+            'video_id': result['video_id'],
+            'clip_ids': result['clip_ids'],
+            'stages': result['stages'],
+            'exports_failed': result['exports_failed'],
+        }
+
+    return {
+        'youtube_import': youtube_import,
+        'video_upload': video_upload,
+        'transcription': transcription,
+        'clip_generation': clip_generation,
+        'export': export,
+        'pipeline': pipeline,
+    }
+
+
+class JobWorker:
+    """
+    Run up to `concurrency` jobs at a time from the queue
+
+    Each running job keeps its lease alive with a heartbeat. If the
+    process dies the lease expires and another worker picks the job up.
+    A job whose lease is lost anyway (e.g. the worker was stalled past
+    it) is cancelled, since another worker may be running it by then.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        concurrency: int = 1,
+        poll_interval: float = 1.0,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        worker_id: Optional[str] = None
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        """Stop leasing new jobs; running jobs are allowed to finish"""
+        self._stopping.set()
+
+    async def run(self) -> None:
+        """Run worker slots until stop() is called"""
+        logger.info(
+            f"Worker {self.worker_id} started "
+            f"(concurrency={self.concurrency}, types={list(self.handlers)})"
+        )
+
+        publisher = asyncio.create_task(
+            publish_snapshots(self.worker_id.replace(':', '-'))
+        )
+
+        try:
+            await asyncio.gather(*(
+                self._slot_loop() for _ in range(self.concurrency)
+            ))
+        finally:
+            publisher.cancel()
+
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    async def _slot_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = await self.queue.lease(
+                    self.worker_id,
+                    list(self.handlers),
+                    self.lease_seconds
+                )
+            except Exception as e:
+                logger.error(f"Error leasing job: {str(e)}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(
+                        self._stopping.wait(),
+                        timeout=self.poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.run_job(job)
+
+    async def run_job(self, job: Job) -> None:
+        """Run a single leased job and record its outcome"""
+        logger.info(f"Running {job.job_type} job {job.id} (attempt {job.attempts})")
+
+        progress = JobProgressReporter(self.queue, job.id)
+        handler = asyncio.create_task(self.handlers[job.job_type](job, progress))
+        heartbeat = asyncio.create_task(self._heartbeat(job, handler))
+
+        try:
+            with metrics.timer('job_run_seconds', job_type=job.job_type):
+                metadata = await handler
+            if await self.queue.complete(job.id, self.worker_id, metadata):
+                metrics.inc('jobs_completed', job_type=job.job_type)
+                logger.info(f"Job completed: {job.id}")
+            else:
+                logger.warning(f"Job {job.id} finished after its lease was lost; result dropped")
+
+        except asyncio.CancelledError:
+            # The heartbeat only returns after cancelling a job whose lease
+            # was lost; the new owner records the outcome
+            if not heartbeat.done() or heartbeat.cancelled():
+                raise
+            logger.warning(f"Job {job.id} cancelled: lease lost")
+
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            metrics.inc('jobs_failed', job_type=job.job_type)
+            try:
+                await self.queue.fail(job, self.worker_id, str(e))
+            except Exception as report_error:
+                logger.error(f"Error recording job failure: {str(report_error)}")
+
+        finally:
+            heartbeat.cancel()
+            handler.cancel()
+
+    async def _heartbeat(self, job: Job, handler: asyncio.Task) -> None:
+        """Extend the job's lease until cancelled; cancel `handler` if it is lost"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                held = await self.queue.heartbeat(
+                    job.id,
+                    self.worker_id,
+                    self.lease_seconds
+                )
+            except Exception as e:
+                logger.error(f"Heartbeat error for job {job.id}: {str(e)}")
+                continue
+
+            if not held:
+                logger.warning(f"Lost lease on job {job.id}, cancelling it")
+                metrics.inc('jobs_lease_lost', job_type=job.job_type)
+                handler.cancel()
+                return
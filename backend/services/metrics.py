@@ -0,0 +1,132 @@
+"""In-process metrics: counters, gauges and timing summaries"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = Path(os.getenv("METRICS_DIR", "/tmp/clipforge/metrics"))
+
+
+def _key(name: str, labels: Dict[str, str]) -> str:
+    if not labels:
+        return name
+    label_str = ','.join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe metrics store
+
+    Metric names may carry labels, e.g. observe('slot_wait_seconds', 0.2,
+    pool='encode') is reported as slot_wait_seconds{pool="encode"}.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            stats = self._timings.setdefault(
+                key,
+                {'count': 0, 'sum': 0.0, 'max': 0.0}
+            )
+            stats['count'] += 1
+            stats['sum'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observe the wall time of a block"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timings': {
+                    key: {
+                        **stats,
+                        'avg': stats['sum'] / stats['count'] if stats['count'] else 0.0,
+                    }
+                    for key, stats in self._timings.items()
+                },
+            }
+
+
+metrics = MetricsRegistry()
+
+
+def write_snapshot(process_name: str) -> None:
+    """Write this process's metrics to METRICS_DIR for the API to collect"""
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    path = METRICS_DIR / f"{process_name}.json"
+    tmp_path = path.with_suffix('.tmp')
+
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'process': process_name,
+            'pid': os.getpid(),
+            'updated_at': time.time(),
+            **metrics.snapshot(),
+        }, f)
+
+    os.replace(tmp_path, path)
+
+
+def read_snapshots(max_age: float = 120.0) -> List[Dict]:
+    """Read recent snapshots written by worker processes"""
+    if not METRICS_DIR.exists():
+        return []
+
+    snapshots = []
+    now = time.time()
+
+    for path in METRICS_DIR.glob('*.json'):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        if now - data.get('updated_at', 0) <= max_age:
+            snapshots.append(data)
+
+    return snapshots
+
+
+async def publish_snapshots(process_name: str, interval: float = 10.0) -> None:
+    """Periodically write snapshots until cancelled"""
+    while True:
+        try:
+            write_snapshot(process_name)
+        except OSError as e:
+            logger.error(f"Error writing metrics snapshot: {str(e)}")
+        await asyncio.sleep(interval)
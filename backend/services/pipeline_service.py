@@ -0,0 +1,264 @@
+"""End-to-end pipeline: import -> transcribe -> generate clips -> export"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+from .youtube_service import YouTubeService
+from .video_service import VideoService
+from .transcription_service import TranscriptionService
+from .clip_service import ClipService
+from .transcript_stream import TranscriptStream
+from .progress import ProgressCallback, scale_progress
+
+logger = logging.getLogger(__name__)
+
+StageFunc = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class StageGraph:
+    """
+    Run async stages as soon as their dependencies have completed
+
+    Each stage function receives a dict of its dependencies' results.
+    Stages can be added while the graph is running, which is how clip
+    exports are started as suggestions arrive. A failed stage fails
+    every stage that depends on it.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add(
+        self,
+        name: str,
+        func: StageFunc,
+        deps: Iterable[str] = ()
+    ) -> asyncio.Task:
+        if name in self._tasks:
+            raise ValueError(f"Duplicate stage: {name}")
+
+        deps = list(deps)
+        missing = [dep for dep in deps if dep not in self._tasks]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+
+        async def run_stage():
+            results = {dep: await self._tasks[dep] for dep in deps}
+            logger.info(f"Pipeline stage started: {name}")
+            result = await func(results)
+            logger.info(f"Pipeline stage completed: {name}")
+            return result
+
+        self._tasks[name] = asyncio.create_task(run_stage(), name=name)
+        return self._tasks[name]
+
+    async def wait(self) -> Dict[str, Dict]:
+        """
+        Wait for every stage, including ones added while waiting
+
+        Returns:
+            Stage name -> {'status': 'completed'|'failed', 'error'?}
+        """
+        while True:
+            pending = [task for task in self._tasks.values() if not task.done()]
+            if not pending:
+                break
+            await asyncio.wait(pending)
+
+        outcome = {}
+        for name, task in self._tasks.items():
+            error = task.exception()
+            outcome[name] = (
+                {'status': 'failed', 'error': str(error)}
+                if error else {'status': 'completed'}
+            )
+
+        return outcome
+
+    def result(self, name: str) -> Any:
+        return self._tasks[name].result()
+
+
+class PipelineService:
+    def __init__(
+        self,
+        youtube_service: Optional[YouTubeService] = None,
+        video_service: Optional[VideoService] = None,
+        transcription_service: Optional[TranscriptionService] = None,
+        clip_service: Optional[ClipService] = None
+    ):
+        self.youtube_service = youtube_service or YouTubeService()
+        self.video_service = video_service or VideoService()
+        self.transcription_service = (
+            transcription_service or TranscriptionService()
+        )
+        self.clip_service = clip_service or ClipService()
+
+    async def run_pipeline(
+        self,
+        user_id: str,
+        url: Optional[str] = None,
+        video_id: Optional[str] = None,
+        language: str = "en",
+        clip_count: int = 10,
+        min_duration: int = 15,
+        max_duration: int = 60,
+        export_clips: bool = True,
+        output_format: str = "mp4",
+        resolution: str = "1080p",
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict:
+        """
+        Run import, transcription, clip generation and exports as one graph
+
+        The source video is checked out of the source cache once and the
+        local file is shared by every stage. Clip generation follows the
+        transcript as it is written, analysing each window once it has
+        been transcribed, and each clip export starts as soon as its
+        suggestion has been stored, without waiting for the rest.
+
+        Args:
+            user_id: User ID
+            url: YouTube URL to import; mutually exclusive with video_id
+            video_id: Existing video to process
+            language: Transcription language
+            clip_count: Number of clips to generate
+            min_duration: Minimum clip duration in seconds
+            max_duration: Maximum clip duration in seconds
+            export_clips: Render every suggested clip
+            output_format: Export format
+            resolution: Export resolution
+            progress: Progress callback; import, transcription, generation
+                and exports are weighted 20/40/5/35
+
+        Returns:
+            Dictionary with video_id, clip ids and per-stage outcome
+        """
+        if bool(url) == bool(video_id):
+            raise ValueError("Provide exactly one of url or video_id")
+
+        graph = StageGraph()
+        source: Dict[str, Any] = {}
+        transcript = TranscriptStream()
+        export_progress: Dict[str, float] = {}
+
+        async def report_exports(clip_id: str, percent: float, details: Dict) -> None:
+            export_progress[clip_id] = percent
+            # Exports that start during transcription would run the
+            # overall percentage ahead of it
+            if progress and transcript.done:
+                overall = sum(export_progress.values()) / len(export_progress)
+                await progress(65 + overall * 0.35, {'stage': 'exporting'})
+
+        async def acquire_source(_: Dict) -> Dict:
+            if url:
+                result = await self.youtube_service.import_video(
+                    url,
+                    user_id,
+                    progress=scale_progress(progress, 0, 20)
+                )
+                source['video_id'] = result['video_id']
+                file_path = result['file_path']
+            else:
+                video_info = await self.video_service.get_video_info(
+                    video_id,
+                    user_id,
+                    'file_path'
+                )
+                source['video_id'] = video_id
+                file_path = video_info['file_path']
+
+            # Imports are adopted into the cache, so this is normally a hit
+            cached = await self.video_service.source_cache.checkout(
+                'videos',
+                file_path
+            )
+            source.update(cached=cached, local_path=str(cached.path))
+
+            return source
+
+        async def transcribe(deps: Dict) -> Dict:
+            try:
+                result = await self.transcription_service.transcribe_video(
+                    deps['source']['video_id'],
+                    user_id,
+                    language,
+                    source_path=deps['source']['local_path'],
+                    progress=scale_progress(progress, 20, 60),
+                    stream=transcript
+                )
+            except Exception as e:
+                # Generation waits on the stream, not on this stage
+                await transcript.finish(e)
+                raise
+
+            if progress:
+                await progress(60, {'stage': 'generating'})
+            return {'method': result['method']}
+
+        async def export(clip: Dict, deps: Dict) -> Dict:
+            async def clip_progress(percent: float, details: Dict) -> None:
+                await report_exports(clip['id'], percent, details)
+
+            result = await self.clip_service.export_clip(
+                clip['id'],
+                user_id,
+                output_format,
+                resolution,
+                source_path=deps['source']['local_path'],
+                progress=clip_progress
+            )
+            await clip_progress(100, {})
+            return result
+
+        async def start_export(clip: Dict) -> None:
+            export_progress[clip['id']] = 0.0
+            graph.add(
+                f"export:{clip['id']}",
+                lambda deps: export(clip, deps),
+                deps=['source']
+            )
+
+        async def generate(deps: Dict) -> Dict:
+            return await self.clip_service.generate_clips(
+                deps['source']['video_id'],
+                user_id,
+                clip_count,
+                min_duration,
+                max_duration,
+                on_clip=start_export if export_clips else None,
+                stream=transcript
+            )
+
+        graph.add('source', acquire_source)
+        graph.add('transcribe', transcribe, deps=['source'])
+        # Runs alongside transcription, following the transcript stream
+        graph.add('generate', generate, deps=['source'])
+
+        try:
+            stages = await graph.wait()
+        finally:
+            if source.get('cached'):
+                source['cached'].release()
+
+        # Import, transcription and generation are required; a failed
+        # export only marks that clip as failed
+        for name in ('source', 'transcribe', 'generate'):
+            if stages[name]['status'] == 'failed':
+                raise RuntimeError(
+                    f"Pipeline stage {name} failed: {stages[name]['error']}"
+                )
+
+        clip_ids = [clip['id'] for clip in graph.result('generate')['clips']]
+        failed_exports = [
+            name for name, stage in stages.items()
+            if name.startswith('export:') and stage['status'] == 'failed'
+        ]
+
+        return {
+            'video_id': source.get('video_id'),
+            'clip_ids': clip_ids,
+            'stages': stages,
+            'exports_failed': len(failed_exports),
+            'status': 'completed',
+        }
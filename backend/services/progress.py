@@ -0,0 +1,70 @@
+"""Progress callbacks and throttled progress writes to processing_jobs"""
+
+import os
+import time
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Called with a percentage (0-100) of the current operation plus details
+# such as speed, fps or eta
+ProgressCallback = Callable[[float, Dict], Awaitable[None]]
+
+PROGRESS_WRITE_INTERVAL = float(os.getenv("PROGRESS_WRITE_INTERVAL", 2.0))
+
+
+def scale_progress(
+    progress: Optional[ProgressCallback],
+    start: float,
+    end: float
+) -> Optional[ProgressCallback]:
+    """
+    Map a sub-operation's 0-100% onto the start-end range of its parent
+
+    e.g. audio extraction reported as 0-30% of a transcription job.
+    """
+    if progress is None:
+        return None
+
+    async def scaled(percent: float, details: Dict) -> None:
+        await progress(start + (end - start) * percent / 100, details)
+
+    return scaled
+
+
+class JobProgressReporter:
+    """
+    Write job progress at a throttled rate
+
+    ffmpeg reports progress several times per second; an update is written
+    when the whole-percent progress or its details (speed, eta, ...)
+    differ from the last write, and at most once per
+    PROGRESS_WRITE_INTERVAL seconds. The percentage never goes backwards.
+    """
+
+    def __init__(self, queue, job_id: str, interval: float = PROGRESS_WRITE_INTERVAL):
+        self.queue = queue
+        self.job_id = job_id
+        self.interval = interval
+        self._last_write = 0.0
+        self._last_progress = -1
+        self._last_details: Optional[Dict] = None
+
+    async def __call__(self, percent: float, details: Dict) -> None:
+        progress = max(self._last_progress, 0, min(99, int(percent)))
+        now = time.monotonic()
+
+        if progress == self._last_progress and details == self._last_details:
+            return
+        if now - self._last_write < self.interval:
+            return
+
+        self._last_write = now
+        self._last_progress = progress
+        self._last_details = dict(details)
+
+        try:
+            await self.queue.update_progress(self.job_id, progress, details)
+        except Exception as e:
+            logger.error(f"Error writing progress for job {self.job_id}: {str(e)}")
@@ -0,0 +1,71 @@
+"""Token buckets for calls to rate-limited APIs"""
+
+import time
+import asyncio
+import logging
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second up to `capacity`
+
+    Callers are served in arrival order, so a large request (e.g. ten
+    minutes of audio) is not starved by a stream of small ones. hold()
+    empties the bucket and blocks it, for when the API answers 429 anyway.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Wait until `tokens` are available and take them
+
+        Requests larger than the capacity wait for a full bucket.
+
+        Returns:
+            Seconds spent waiting
+        """
+        tokens = min(tokens, self.capacity)
+        started = time.monotonic()
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    break
+
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+        waited = time.monotonic() - started
+        metrics.observe('rate_limit_wait_seconds', waited, bucket=self.name)
+        return waited
+
+    def hold(self, seconds: float) -> None:
+        """Empty the bucket and block it for `seconds`"""
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens = 0.0
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        metrics.inc('rate_limit_holds', bucket=self.name)
+        logger.warning(f"Rate limit bucket {self.name} held for {seconds:.1f}s")
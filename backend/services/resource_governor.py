@@ -0,0 +1,150 @@
+"""Per-resource concurrency limits for ffmpeg, Whisper, transfers and LLM calls"""
+
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_NAMES = ('encode', 'decode', 'transcribe', 'download', 'upload', 'llm')
+
+
+def _total_memory_bytes() -> int:
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return 4 * 1024 ** 3
+
+
+def default_slot_counts() -> Dict[str, int]:
+    """
+    Slot counts derived from CPU count and memory
+
+    CPU/memory-bound pools are divided by RESOURCE_SHARE_PROCESSES so a
+    host running several worker processes doesn't oversubscribe. Any
+    pool can be overridden with GOVERNOR_SLOTS_<NAME>, e.g.
+    GOVERNOR_SLOTS_ENCODE=2.
+    """
+    cpus = os.cpu_count() or 1
+    mem_gb = _total_memory_bytes() / 1024 ** 3
+    share = max(1, int(os.getenv("RESOURCE_SHARE_PROCESSES", 1)))
+
+    counts = {
+        # libx264 already uses several threads per encode
+        'encode': max(1, cpus // 4 // share),
+        'decode': max(1, cpus // 2 // share),
+        # ~1-2 GB resident per Whisper model, ~4 cores each
+        'transcribe': max(1, int(min(cpus // 4, mem_gb // 2)) // share),
+        'download': 8,
+        'upload': 8,
+        'llm': 4,
+    }
+
+    for name in POOL_NAMES:
+        override = os.getenv(f"GOVERNOR_SLOTS_{name.upper()}")
+        if override:
+            counts[name] = max(1, int(override))
+
+    return counts
+
+
+class SlotPool:
+    """A named semaphore that records queue wait and utilization"""
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self.in_use = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(capacity)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self.waiting += 1
+        self._report()
+        start = time.monotonic()
+
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        wait = time.monotonic() - start
+        metrics.observe('governor_slot_wait_seconds', wait, pool=self.name)
+        self.in_use += 1
+        self._report()
+
+        held_since = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_use -= 1
+            self._semaphore.release()
+            metrics.observe(
+                'governor_slot_hold_seconds',
+                time.monotonic() - held_since,
+                pool=self.name
+            )
+            self._report()
+
+    def _report(self) -> None:
+        metrics.set_gauge('governor_slots_in_use', self.in_use, pool=self.name)
+        metrics.set_gauge('governor_slots_waiting', self.waiting, pool=self.name)
+        metrics.set_gauge(
+            'governor_slot_utilization',
+            self.in_use / self.capacity,
+            pool=self.name
+        )
+
+    def stats(self) -> Dict:
+        return {
+            'capacity': self.capacity,
+            'in_use': self.in_use,
+            'waiting': self.waiting,
+        }
+
+
+class ResourceGovernor:
+    """
+    Named slot pools shared by every service in the process
+
+    Usage:
+        async with get_governor().slot('encode'):
+            await run_io(stream.run)
+    """
+
+    def __init__(self, slot_counts: Dict[str, int] | None = None):
+        counts = slot_counts or default_slot_counts()
+        self.pools = {
+            name: SlotPool(name, capacity)
+            for name, capacity in counts.items()
+        }
+        for name, capacity in counts.items():
+            metrics.set_gauge('governor_slots_capacity', capacity, pool=name)
+        logger.info(f"Resource governor slots: {counts}")
+
+    def slot(self, name: str):
+        """Async context manager holding one slot of the named pool"""
+        if name not in self.pools:
+            raise ValueError(f"Unknown resource pool: {name}")
+        return self.pools[name].slot()
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+_governor: ResourceGovernor | None = None
+
+
+def get_governor() -> ResourceGovernor:
+    """Get or create ResourceGovernor singleton"""
+    global _governor
+
+    if _governor is None:
+        _governor = ResourceGovernor()
+
+    return _governor
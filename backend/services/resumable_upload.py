@@ -0,0 +1,331 @@
+"""Resumable chunked uploads: create, write chunks at offsets, finalize"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+from .executor import run_io
+from .metrics import metrics
+from .upload_stream import (
+    MAX_UPLOAD_BYTES,
+    UploadTooLargeError,
+    get_remaining_storage,
+)
+from .workspace import get_workspace_manager
+
+logger = logging.getLogger(__name__)
+
+RESUMABLE_UPLOAD_DIR = Path(os.getenv("RESUMABLE_UPLOAD_DIR", "/tmp/clipforge/uploads"))
+RESUMABLE_UPLOAD_TTL = int(os.getenv("RESUMABLE_UPLOAD_TTL", 24 * 3600))
+
+# Suggested chunk size for clients; any size is accepted
+RESUMABLE_CHUNK_SIZE = int(os.getenv("RESUMABLE_CHUNK_SIZE", 8 * 1024 * 1024))
+
+
+class UploadNotFoundError(ValueError):
+    """Unknown, expired or foreign upload id"""
+
+
+def _merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Add [start, end) to a sorted list of disjoint ranges"""
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def _missing_ranges(ranges: List[List[int]], size: int) -> List[List[int]]:
+    missing = []
+    position = 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+
+class ResumableUploadStore:
+    """
+    Server-side state for resumable uploads
+
+    Each upload is a directory holding a preallocated data file, the
+    upload's info and the byte ranges received so far. Chunks are written
+    with pwrite at their offset, so clients can send several chunks in
+    parallel and re-send only what is missing after a dropped connection.
+    The ranges file is updated under flock, so any API process can
+    receive chunks for any upload.
+    """
+
+    def __init__(self, root: Path = RESUMABLE_UPLOAD_DIR, ttl: int = RESUMABLE_UPLOAD_TTL):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+
+    def _dir(self, upload_id: str) -> Path:
+        # Ids are generated here; reject anything that could escape root
+        try:
+            uuid.UUID(upload_id)
+        except ValueError:
+            raise UploadNotFoundError("Upload not found")
+        return self.root / upload_id
+
+    def _read_info(self, upload_id: str, user_id: str) -> Dict:
+        info_path = self._dir(upload_id) / 'info.json'
+        try:
+            info = json.loads(info_path.read_text())
+        except FileNotFoundError:
+            raise UploadNotFoundError("Upload not found")
+
+        if info['user_id'] != user_id:
+            raise UploadNotFoundError("Upload not found")
+
+        return info
+
+    def _read_ranges(self, upload_id: str) -> List[List[int]]:
+        ranges_path = self._dir(upload_id) / 'ranges.json'
+        with open(ranges_path, 'r') as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            return json.load(f)
+
+    def _add_range(self, upload_id: str, start: int, end: int) -> List[List[int]]:
+        ranges_path = self._dir(upload_id) / 'ranges.json'
+        with open(ranges_path, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            ranges = _merge_range(json.load(f), start, end)
+            f.seek(0)
+            f.truncate()
+            json.dump(ranges, f)
+            return ranges
+
+    def _status(self, info: Dict, ranges: List[List[int]]) -> Dict:
+        received = sum(end - start for start, end in ranges)
+        return {
+            'upload_id': info['upload_id'],
+            'filename': info['filename'],
+            'size': info['size'],
+            'received': received,
+            # First gap, for clients that upload sequentially
+            'offset': ranges[0][1] if ranges and ranges[0][0] == 0 else 0,
+            'missing': _missing_ranges(ranges, info['size']),
+            'complete': received == info['size'],
+            'expires_at': info['created_at'] + self.ttl,
+        }
+
+    async def create(
+        self,
+        user_id: str,
+        filename: str,
+        size: int,
+        content_type: str = 'video/mp4',
+        sha256: Optional[str] = None
+    ) -> Dict:
+        """
+        Start an upload of `size` bytes
+
+        The user's remaining storage is checked here, before any bytes
+        are sent.
+
+        Returns:
+            Upload status with upload_id and a suggested chunk_size
+        """
+        if size <= 0:
+            raise ValueError("size must be positive")
+        if not content_type.startswith('video/'):
+            raise ValueError("File must be a video")
+
+        limit = min(MAX_UPLOAD_BYTES, await get_remaining_storage(user_id))
+        if size > limit:
+            metrics.inc('uploads_rejected', reason='quota')
+            raise UploadTooLargeError(
+                f"Upload of {size} bytes exceeds remaining storage ({limit} bytes)"
+            )
+
+        await run_io(self.cleanup_expired)
+        await run_io(get_workspace_manager().ensure_headroom, size)
+
+        info = {
+            'upload_id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'filename': Path(filename).name or 'upload',
+            'size': size,
+            'content_type': content_type,
+            'sha256': sha256.lower() if sha256 else None,
+            'created_at': int(time.time()),
+        }
+        await run_io(self._create, info)
+
+        logger.info(f"Resumable upload created: {info['upload_id']} ({size} bytes)")
+
+        return {
+            **self._status(info, []),
+            'chunk_size': RESUMABLE_CHUNK_SIZE,
+        }
+
+    def _create(self, info: Dict) -> None:
+        upload_dir = self._dir(info['upload_id'])
+        upload_dir.mkdir()
+
+        # Sparse file of the final size; chunks land at their offsets
+        with open(upload_dir / 'data', 'wb') as f:
+            f.truncate(info['size'])
+
+        (upload_dir / 'ranges.json').write_text('[]')
+        (upload_dir / 'info.json').write_text(json.dumps(info))
+
+    async def status(self, upload_id: str, user_id: str) -> Dict:
+        info = await run_io(self._read_info, upload_id, user_id)
+        ranges = await run_io(self._read_ranges, upload_id)
+        return self._status(info, ranges)
+
+    async def write_chunk(
+        self,
+        upload_id: str,
+        user_id: str,
+        offset: int,
+        stream: AsyncIterator[bytes],
+        length: Optional[int] = None
+    ) -> Dict:
+        """
+        Write a chunk at `offset` from an async byte stream
+
+        Bytes are written as they arrive. If the stream breaks, the part
+        that was written is still recorded, so the client only re-sends
+        the rest.
+
+        Args:
+            upload_id: Upload ID
+            user_id: Owner of the upload
+            offset: Byte offset of the chunk in the file
+            stream: Chunk body
+            length: Declared chunk length (Content-Length), if known
+
+        Returns:
+            Upload status after the chunk
+        """
+        info = await run_io(self._read_info, upload_id, user_id)
+        size = info['size']
+
+        if offset < 0 or offset > size:
+            raise ValueError(f"Offset {offset} outside upload of {size} bytes")
+        if length is not None and offset + length > size:
+            raise ValueError("Chunk extends past the declared upload size")
+
+        fd = await run_io(os.open, self._dir(upload_id) / 'data', os.O_WRONLY)
+        position = offset
+
+        try:
+            async for data in stream:
+                if not data:
+                    continue
+                if position + len(data) > size:
+                    raise ValueError("Chunk extends past the declared upload size")
+
+                await run_io(os.pwrite, fd, data, position)
+                position += len(data)
+                metrics.inc('upload_bytes_received', len(data))
+
+        finally:
+            os.close(fd)
+            if position > offset:
+                ranges = await run_io(self._add_range, upload_id, offset, position)
+
+        if position == offset:
+            ranges = await run_io(self._read_ranges, upload_id)
+
+        return self._status(info, ranges)
+
+    async def finalize(self, upload_id: str, user_id: str, dest_dir: Path) -> Dict:
+        """
+        Check every byte has arrived and move the file to dest_dir
+
+        Returns:
+            Dictionary with file_path, filename, size and sha256
+        """
+        info = await run_io(self._read_info, upload_id, user_id)
+        ranges = await run_io(self._read_ranges, upload_id)
+        status = self._status(info, ranges)
+
+        if not status['complete']:
+            raise ValueError(
+                f"Upload incomplete: {status['received']} of {info['size']} "
+                f"bytes received"
+            )
+
+        upload_dir = self._dir(upload_id)
+        sha256 = await run_io(self._hash_file, upload_dir / 'data')
+
+        if info['sha256'] and sha256 != info['sha256']:
+            raise ValueError("Upload checksum mismatch")
+
+        suffix = Path(info['filename']).suffix or '.mp4'
+        file_path = Path(dest_dir) / f"{upload_id}{suffix}"
+        await run_io(shutil.move, str(upload_dir / 'data'), file_path)
+        await run_io(shutil.rmtree, upload_dir, True)
+
+        logger.info(f"Resumable upload finalized: {upload_id}")
+
+        return {
+            'file_path': str(file_path),
+            'filename': info['filename'],
+            'size': info['size'],
+            'sha256': sha256,
+        }
+
+    def _hash_file(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(RESUMABLE_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    async def abort(self, upload_id: str, user_id: str) -> None:
+        await run_io(self._read_info, upload_id, user_id)
+        await run_io(shutil.rmtree, self._dir(upload_id), True)
+
+    def cleanup_expired(self) -> int:
+        """Delete uploads older than the TTL (blocking)"""
+        removed = 0
+        cutoff = time.time() - self.ttl
+
+        for upload_dir in self.root.iterdir():
+            # info.json is written once, at creation
+            info_path = upload_dir / 'info.json'
+            try:
+                created = (
+                    info_path.stat().st_mtime if info_path.exists()
+                    else upload_dir.stat().st_mtime
+                )
+                if created < cutoff:
+                    shutil.rmtree(upload_dir, ignore_errors=True)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+
+        if removed:
+            logger.info(f"Removed {removed} expired resumable uploads")
+
+        return removed
+
+
+_resumable_uploads: ResumableUploadStore | None = None
+
+
+def get_resumable_uploads() -> ResumableUploadStore:
+    """Get or create ResumableUploadStore singleton"""
+    global _resumable_uploads
+
+    if _resumable_uploads is None:
+        _resumable_uploads = ResumableUploadStore()
+
+    return _resumable_uploads
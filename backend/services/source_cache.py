@@ -0,0 +1,511 @@
+"""Content-addressed on-disk cache for source videos from storage"""
+
+import os
+import fcntl
+import shutil
+import asyncio
+import time
+import hashlib
+import logging
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+from .supabase_client import get_supabase_client
+from .executor import get_io_executor, run_io
+from .storage_io import stream_download
+from .resource_governor import get_governor
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SOURCE_CACHE_DIR = Path(os.getenv("SOURCE_CACHE_DIR", "/tmp/clipforge/source-cache"))
+SOURCE_CACHE_MAX_BYTES = int(os.getenv("SOURCE_CACHE_MAX_BYTES", 10 * 1024 ** 3))
+SIGNED_URL_TTL = int(os.getenv("SIGNED_URL_TTL", 3600))
+
+# Held while a process counts and evicts, so two processes never evict
+# against the same count
+_INDEX_LOCK = '.lock'
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    path: Path
+    size: int
+    refs: int = 0
+
+
+def _lock_shared(path: Path) -> int:
+    """
+    Open a cached file with a shared flock and mark it most recently used
+
+    The lock tells other processes the file is in use. Blocking; run it
+    in the I/O executor.
+
+    Returns:
+        The locked file descriptor
+
+    Raises:
+        FileNotFoundError: The file was evicted, possibly by another
+            process, before it could be locked
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        # Evicted between the open and the lock: the path is gone or
+        # already names another download
+        if os.fstat(fd).st_ino != os.stat(path).st_ino:
+            raise FileNotFoundError(f"Evicted: {path}")
+        # Most recently used, for every process sharing the directory
+        os.utime(path)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _create_locked(part_path: Path) -> int:
+    """Create a partial download, locked exclusively while it is written"""
+    fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _publish(part_fd: int, part_path: Path, path: Path) -> int:
+    """
+    Move a finished download into place and check it out
+
+    Returns:
+        The file locked by _lock_shared()
+    """
+    # Shared from here, so the checkout can lock it too and nobody can
+    # evict it in between
+    fcntl.flock(part_fd, fcntl.LOCK_SH)
+    os.replace(part_path, path)
+    return _lock_shared(path)
+
+
+def _log_evict_error(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Source cache eviction failed: {str(future.exception())}")
+
+
+class CachedSource:
+    """A checked-out cache entry; release() when done with the file"""
+
+    def __init__(self, cache: "SourceCache", entry: CacheEntry, fd: int):
+        self._cache = cache
+        self._entry = entry
+        # Locked by _lock_shared()
+        self._fd = fd
+        entry.size = os.fstat(fd).st_size
+        self.path = entry.path
+        self.released = False
+
+    def release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        os.close(self._fd)
+        self._cache._release(self._entry)
+
+
+class RemoteSource:
+    """
+    A signed URL standing in for a local file
+
+    ffmpeg reads it with HTTP range requests, fetching only the index
+    and the parts of the stream it decodes.
+    """
+
+    def __init__(self, url: str):
+        self.path = url
+        self.released = False
+
+    def release(self) -> None:
+        self.released = True
+
+
+def is_remote(path) -> bool:
+    return str(path).startswith(('http://', 'https://'))
+
+
+class SourceCache:
+    """
+    Shared on-disk cache of storage objects
+
+    Entries are keyed by bucket, storage path and the object's etag, so
+    a replaced object never serves stale bytes. Entries in use are
+    flock'ed and are never evicted; everything else is evicted
+    least-recently-used once the byte budget is exceeded.
+
+    The directory is shared by every worker process: usage is measured
+    from the files in it, including other processes' partial downloads,
+    and a checkout touches the file's mtime, so the budget and the LRU
+    order cover all of them. Locking, scanning and eviction block on the
+    filesystem and on other processes, so async callers run them in the
+    I/O executor.
+    """
+
+    def __init__(
+        self,
+        root: Path = SOURCE_CACHE_DIR,
+        max_bytes: int = SOURCE_CACHE_MAX_BYTES
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        # Entries this process has checked out
+        self._entries: Dict[str, CacheEntry] = {}
+        self._fetching: Dict[str, asyncio.Future] = {}
+        self._signed_urls: Dict[str, Tuple[str, float]] = {}
+        self._load_existing()
+
+    @property
+    def bytes_used(self) -> int:
+        files, partial = self._scan()
+        return sum(size for _, _, size in files) + partial
+
+    def _load_existing(self) -> None:
+        """Drop partial downloads nobody is writing, then enforce the budget"""
+        for path in self.root.glob('*.part'):
+            # Downloads in progress hold a lock on their part file
+            self._try_remove(path)
+
+        self._evict()
+
+    def _scan(self) -> Tuple[List[Tuple[float, Path, int]], int]:
+        """
+        Files in the cache directory, whichever process wrote them
+
+        Returns:
+            ((last used, path, size) of each cached file, least recently
+            used first; bytes in partial downloads)
+        """
+        files = []
+        partial = 0
+
+        for path in self.root.iterdir():
+            if path.suffix not in ('.src', '.part'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.suffix == '.src':
+                files.append((stat.st_mtime, path, stat.st_size))
+            else:
+                partial += stat.st_size
+
+        files.sort()
+        return files, partial
+
+    @contextmanager
+    def _index_lock(self) -> Iterator[None]:
+        fd = os.open(self.root / _INDEX_LOCK, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _key(self, bucket: str, storage_path: str, version: str) -> str:
+        return hashlib.sha256(
+            f"{bucket}/{storage_path}:{version}".encode()
+        ).hexdigest()
+
+    async def stat_object(self, bucket: str, storage_path: str) -> Dict:
+        """
+        Version, etag and size of a storage object
+
+        The version is the object's etag, falling back to its update time.
+        """
+        supabase = get_supabase_client()
+
+        folder, _, name = storage_path.rpartition('/')
+        items = await supabase.storage.from_(bucket).list(folder, {'search': name})
+
+        for item in items or []:
+            if item.get('name') == name:
+                metadata = item.get('metadata') or {}
+                etag = str(metadata.get('eTag') or '').strip('"')
+                return {
+                    'version': etag or str(item.get('updated_at') or ''),
+                    'etag': etag or None,
+                    'size': int(metadata.get('size') or 0),
+                }
+
+        raise FileNotFoundError(f"Storage object not found: {bucket}/{storage_path}")
+
+    @asynccontextmanager
+    async def acquire(
+        self,
+        bucket: str,
+        storage_path: str,
+        range_read: bool = False
+    ) -> AsyncIterator[Union[Path, str]]:
+        """
+        Yield a local path for a storage object, downloading on a miss
+
+        With range_read, a miss yields a signed URL instead of downloading
+        (see checkout_range).
+
+        Usage:
+            async with cache.acquire('videos', file_path) as path:
+                await run_ffmpeg(ffmpeg.input(str(path))...)
+        """
+        if range_read:
+            source = await self.checkout_range(bucket, storage_path)
+        else:
+            source = await self.checkout(bucket, storage_path)
+        try:
+            yield source.path
+        finally:
+            source.release()
+
+    async def _lookup(self, key: str) -> Optional[CachedSource]:
+        path = self.root / f"{key}.src"
+
+        try:
+            fd = await run_io(_lock_shared, path)
+        except FileNotFoundError:
+            # Not cached, or just evicted by another process
+            return None
+
+        metrics.inc('source_cache_hits')
+        return self._checkout_entry(CacheEntry(key, path, 0), fd)
+
+    async def checkout(self, bucket: str, storage_path: str) -> CachedSource:
+        """Like acquire(), for holders that outlive a single block"""
+        stat = await self.stat_object(bucket, storage_path)
+        key = self._key(bucket, storage_path, stat['version'])
+
+        while True:
+            source = await self._lookup(key)
+            if source is not None:
+                return source
+
+            pending = self._fetching.get(key)
+            if pending is not None:
+                # Another task is already downloading it; wait and retry
+                await asyncio.shield(pending)
+                continue
+
+            metrics.inc('source_cache_misses')
+            pending = asyncio.get_running_loop().create_future()
+            self._fetching[key] = pending
+            try:
+                source = await self._fetch(key, bucket, storage_path, stat)
+                await run_io(self._evict)
+                return source
+            finally:
+                del self._fetching[key]
+                pending.set_result(None)
+
+    async def checkout_range(
+        self,
+        bucket: str,
+        storage_path: str
+    ) -> Union[CachedSource, RemoteSource]:
+        """
+        Cached copy if there is one, otherwise a signed URL to read from
+
+        For work that touches a small part of the source (a thumbnail, a
+        short clip), bytes transferred then scale with the output instead
+        of the source length. Nothing is downloaded into the cache.
+        """
+        stat = await self.stat_object(bucket, storage_path)
+        source = await self._lookup(self._key(bucket, storage_path, stat['version']))
+        if source is not None:
+            return source
+
+        metrics.inc('source_range_reads')
+        return RemoteSource(await self.signed_url(bucket, storage_path))
+
+    async def signed_url(self, bucket: str, storage_path: str) -> str:
+        """Signed download URL, reused until close to expiry"""
+        cache_key = f"{bucket}/{storage_path}"
+        cached = self._signed_urls.get(cache_key)
+        if cached and cached[1] > time.time() + 60:
+            return cached[0]
+
+        supabase = get_supabase_client()
+
+        result = await supabase.storage.from_(bucket).create_signed_url(
+            storage_path,
+            SIGNED_URL_TTL
+        )
+        url = result.get('signedURL')
+        if not url:
+            raise FileNotFoundError(f"Could not sign {bucket}/{storage_path}")
+
+        self._signed_urls[cache_key] = (url, time.time() + SIGNED_URL_TTL)
+        return url
+
+    async def adopt(
+        self,
+        bucket: str,
+        storage_path: str,
+        local_path: Path
+    ) -> None:
+        """
+        Move a file that was just uploaded into the cache
+
+        Imports and uploads still have the bytes locally, so later stages
+        get a hit instead of downloading them back.
+        """
+        try:
+            stat = await self.stat_object(bucket, storage_path)
+        except Exception as e:
+            logger.warning(f"Not caching {storage_path}: {str(e)}")
+            Path(local_path).unlink(missing_ok=True)
+            return
+
+        key = self._key(bucket, storage_path, stat['version'])
+        path = self.root / f"{key}.src"
+        await run_io(shutil.move, str(local_path), path)
+        # A move keeps the old mtime, which would make it first to go
+        await run_io(os.utime, path)
+
+        await run_io(self._evict)
+
+    async def _fetch(
+        self,
+        key: str,
+        bucket: str,
+        storage_path: str,
+        stat: Dict
+    ) -> CachedSource:
+        part_path = self.root / f"{key}.{os.getpid()}.part"
+        path = self.root / f"{key}.src"
+
+        # Make room up front rather than after the bytes are on disk
+        await run_io(self._evict, stat['size'])
+
+        # Locked while the download runs, so a process starting up can
+        # tell it from one left behind by a crash
+        part_fd = await run_io(_create_locked, part_path)
+        try:
+            try:
+                async with get_governor().slot('download'):
+                    size = await run_io(
+                        stream_download,
+                        bucket,
+                        storage_path,
+                        part_path,
+                        expected_size=stat['size'] or None,
+                        etag=stat['etag']
+                    )
+                fd = await run_io(_publish, part_fd, part_path, path)
+            except Exception:
+                part_path.unlink(missing_ok=True)
+                raise
+
+            metrics.inc('source_cache_bytes_downloaded', size)
+            return self._checkout_entry(CacheEntry(key, path, size), fd)
+
+        finally:
+            os.close(part_fd)
+
+    def _checkout_entry(self, entry: CacheEntry, fd: int) -> CachedSource:
+        """Count a checkout of a file locked by _lock_shared()"""
+        # Concurrent lookups of one key share the first one's entry
+        entry = self._entries.setdefault(entry.key, entry)
+        entry.refs += 1
+        return CachedSource(self, entry, fd)
+
+    def _release(self, entry: CacheEntry) -> None:
+        entry.refs -= 1
+        if entry.refs == 0 and self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._evict()
+            return
+
+        # release() is sync but mostly called on the event loop
+        loop.run_in_executor(get_io_executor(), self._evict).add_done_callback(
+            _log_evict_error
+        )
+
+    def _evict(self, extra_bytes: int = 0) -> None:
+        """Evict idle files, least recently used first, until within budget"""
+        with self._index_lock():
+            files, partial = self._scan()
+            used = sum(size for _, _, size in files) + partial + extra_bytes
+            entries = len(files)
+
+            for _, path, size in files:
+                if used <= self.max_bytes:
+                    break
+
+                # Files in use anywhere hold a shared lock
+                if path.stem in self._entries or not self._try_remove(path):
+                    continue
+
+                entries -= 1
+                used -= size
+                metrics.inc('source_cache_evictions')
+                logger.info(f"Evicted cached source {path.stem} ({size} bytes)")
+
+        if used > self.max_bytes:
+            logger.warning(
+                f"Source cache over budget: {used} > {self.max_bytes} bytes "
+                f"(all remaining entries in use)"
+            )
+
+        self._report(entries, used - extra_bytes)
+
+    def _try_remove(self, path: Path) -> bool:
+        """Delete a file unless another process holds it open"""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return True
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        try:
+            path.unlink(missing_ok=True)
+        finally:
+            os.close(fd)
+
+        return True
+
+    def _report(self, entries: int, used: int) -> None:
+        metrics.set_gauge('source_cache_bytes', used)
+        metrics.set_gauge('source_cache_entries', entries)
+
+    def stats(self) -> Dict:
+        files, partial = self._scan()
+        return {
+            'entries': len(files),
+            'bytes_used': sum(size for _, _, size in files) + partial,
+            'max_bytes': self.max_bytes,
+            # Checked out by this process
+            'in_use': len(self._entries),
+        }
+
+
+_source_cache: SourceCache | None = None
+
+
+def get_source_cache() -> SourceCache:
+    """Get or create SourceCache singleton"""
+    global _source_cache
+
+    if _source_cache is None:
+        _source_cache = SourceCache()
+
+    return _source_cache
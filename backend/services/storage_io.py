@@ -0,0 +1,738 @@
+"""Streaming transfers to and from Supabase storage"""
+
+import os
+import re
+import hmac
+import math
+import time
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from urllib.parse import quote, urlsplit, parse_qsl
+from xml.etree import ElementTree
+import httpx
+from dotenv import load_dotenv
+from .executor import run_io
+from .metrics import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", 1024 * 1024))
+STORAGE_MAX_RETRIES = int(os.getenv("STORAGE_MAX_RETRIES", 5))
+STORAGE_TIMEOUT = float(os.getenv("STORAGE_TIMEOUT", 60.0))
+
+# Multipart uploads go through Supabase's S3-compatible endpoint and need
+# S3 access keys (Storage settings); without them every upload is single-shot
+STORAGE_S3_ENDPOINT = os.getenv("STORAGE_S3_ENDPOINT")
+STORAGE_S3_REGION = os.getenv("STORAGE_S3_REGION", "us-east-1")
+STORAGE_S3_ACCESS_KEY_ID = os.getenv("STORAGE_S3_ACCESS_KEY_ID")
+STORAGE_S3_SECRET_ACCESS_KEY = os.getenv("STORAGE_S3_SECRET_ACCESS_KEY")
+
+STORAGE_MULTIPART_THRESHOLD = int(os.getenv("STORAGE_MULTIPART_THRESHOLD", 64 * 1024 ** 2))
+STORAGE_PART_SIZE = int(os.getenv("STORAGE_PART_SIZE", 16 * 1024 ** 2))
+STORAGE_UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", 4))
+
+# S3 limits
+_MIN_PART_SIZE = 5 * 1024 ** 2
+_MAX_PARTS = 10000
+
+_S3_NS = '{http://s3.amazonaws.com/doc/2006-03-01/}'
+
+# Single-part uploads get the MD5 of the object as etag; multipart etags
+# ("<md5>-<parts>") are not a content hash and are not verified
+_MD5_ETAG = re.compile(r'^[0-9a-f]{32}$')
+
+
+class StorageIntegrityError(Exception):
+    """Downloaded bytes do not match the object's size or hash"""
+
+
+class StorageUploadError(Exception):
+    """Upload rejected by storage after retries"""
+
+
+def _storage_url() -> str:
+    supabase_url = os.getenv("SUPABASE_URL")
+    if not supabase_url:
+        raise ValueError("SUPABASE_URL must be set")
+    return f"{supabase_url.rstrip('/')}/storage/v1"
+
+
+def _auth_headers() -> Dict[str, str]:
+    supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not supabase_key:
+        raise ValueError("SUPABASE_SERVICE_ROLE_KEY must be set")
+    return {
+        'Authorization': f"Bearer {supabase_key}",
+        'apikey': supabase_key,
+    }
+
+
+def object_url(bucket: str, storage_path: str) -> str:
+    return f"{_storage_url()}/object/{bucket}/{quote(storage_path)}"
+
+
+def _hash_existing(path: Path, chunk_size: int):
+    """MD5 of bytes already on disk, to continue hashing after a resume"""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest
+
+
+def stream_download(
+    bucket: str,
+    storage_path: str,
+    dest: Path,
+    expected_size: Optional[int] = None,
+    etag: Optional[str] = None,
+    chunk_size: int = STORAGE_CHUNK_SIZE,
+    max_retries: int = STORAGE_MAX_RETRIES
+) -> int:
+    """
+    Download a storage object to a file in fixed-size chunks (blocking)
+
+    Memory use is one chunk regardless of object size. If the connection
+    drops, the download resumes from the bytes already written using an
+    HTTP Range request. Size and, for single-part objects, the MD5 etag
+    are verified as the bytes arrive.
+
+    Args:
+        bucket: Storage bucket
+        storage_path: Object path in the bucket
+        dest: File to write; existing bytes are treated as a partial download
+        expected_size: Object size in bytes, if known
+        etag: Object etag, if known
+        chunk_size: Bytes per read/write
+        max_retries: Attempts after a failed or interrupted request
+
+    Returns:
+        Number of bytes in dest
+
+    Raises:
+        StorageIntegrityError: Size or hash mismatch
+        httpx.HTTPError: Request failed after max_retries attempts
+    """
+    dest = Path(dest)
+    url = object_url(bucket, storage_path)
+    expected_md5 = (etag or '').strip('"').lower()
+    if not _MD5_ETAG.match(expected_md5):
+        expected_md5 = None
+
+    offset = dest.stat().st_size if dest.exists() else 0
+    digest = _hash_existing(dest, chunk_size) if offset else hashlib.md5()
+    attempt = 0
+
+    with httpx.Client(timeout=STORAGE_TIMEOUT) as client:
+        while True:
+            if expected_size and offset >= expected_size:
+                break
+
+            headers = _auth_headers()
+            if offset:
+                headers['Range'] = f"bytes={offset}-"
+
+            try:
+                with client.stream('GET', url, headers=headers) as response:
+                    if response.status_code == 416 and expected_size is None:
+                        # Range starts at the end: nothing left to fetch
+                        break
+                    response.raise_for_status()
+
+                    if offset and response.status_code != 206:
+                        # Server ignored the Range header; start over
+                        logger.warning(f"Range not honoured for {storage_path}, restarting")
+                        offset = 0
+                        digest = hashlib.md5()
+
+                    if expected_size is None:
+                        expected_size = _total_size(response, offset)
+
+                    with open(dest, 'r+b' if offset else 'wb') as f:
+                        f.seek(offset)
+                        f.truncate()
+                        for chunk in response.iter_bytes(chunk_size):
+                            f.write(chunk)
+                            digest.update(chunk)
+                            offset += len(chunk)
+                            metrics.inc('storage_bytes_downloaded', len(chunk))
+
+                            if expected_size and offset > expected_size:
+                                raise StorageIntegrityError(
+                                    f"{storage_path}: received more than "
+                                    f"{expected_size} bytes"
+                                )
+                break
+
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                status = getattr(getattr(e, 'response', None), 'status_code', 0)
+                if 400 <= status < 500 and status not in (408, 429):
+                    raise
+
+                attempt += 1
+                if attempt > max_retries:
+                    raise
+
+                metrics.inc('storage_download_retries')
+                logger.warning(
+                    f"Download of {storage_path} interrupted at {offset} bytes "
+                    f"({str(e)}), resuming (attempt {attempt}/{max_retries})"
+                )
+                time.sleep(min(2 ** attempt, 30) / 4)
+
+    if expected_size is not None and offset != expected_size:
+        raise StorageIntegrityError(
+            f"{storage_path}: expected {expected_size} bytes, got {offset}"
+        )
+
+    if expected_md5 and digest.hexdigest() != expected_md5:
+        raise StorageIntegrityError(
+            f"{storage_path}: md5 {digest.hexdigest()} does not match etag {expected_md5}"
+        )
+
+    return offset
+
+
+def _total_size(response: httpx.Response, offset: int) -> Optional[int]:
+    """Full object size from Content-Range or Content-Length"""
+    content_range = response.headers.get('content-range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total.isdigit():
+            return int(total)
+
+    length = response.headers.get('content-length')
+    if length and length.isdigit():
+        return offset + int(length) if response.status_code == 206 else int(length)
+
+    return None
+
+
+def _s3_endpoint() -> str:
+    return (STORAGE_S3_ENDPOINT or f"{_storage_url()}/s3").rstrip('/')
+
+
+def _sigv4_headers(
+    method: str,
+    url: str,
+    payload_hash: str,
+    headers: Optional[Dict[str, str]] = None
+) -> Dict[str, str]:
+    """AWS Signature Version 4 headers for an S3 request"""
+    parsed = urlsplit(url)
+    amz_date = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    date = amz_date[:8]
+
+    signed = {
+        **{k.lower(): v for k, v in (headers or {}).items()},
+        'host': parsed.netloc,
+        'x-amz-date': amz_date,
+        'x-amz-content-sha256': payload_hash,
+    }
+    names = sorted(signed)
+
+    query = '&'.join(
+        f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}"
+        for k, v in sorted(parse_qsl(parsed.query, keep_blank_values=True))
+    )
+    canonical_request = '\n'.join([
+        method,
+        parsed.path or '/',
+        query,
+        ''.join(f"{name}:{str(signed[name]).strip()}\n" for name in names),
+        ';'.join(names),
+        payload_hash,
+    ])
+
+    scope = f"{date}/{STORAGE_S3_REGION}/s3/aws4_request"
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256',
+        amz_date,
+        scope,
+        hashlib.sha256(canonical_request.encode()).hexdigest(),
+    ])
+
+    key = f"AWS4{STORAGE_S3_SECRET_ACCESS_KEY}".encode()
+    for part in (date, STORAGE_S3_REGION, 's3', 'aws4_request'):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    signed['authorization'] = (
+        f"AWS4-HMAC-SHA256 Credential={STORAGE_S3_ACCESS_KEY_ID}/{scope}, "
+        f"SignedHeaders={';'.join(names)}, Signature={signature}"
+    )
+    del signed['host']
+    return signed
+
+
+class StorageUploader:
+    """
+    Upload local files to storage over pooled connections
+
+    Files above STORAGE_MULTIPART_THRESHOLD are split into parts that are
+    sent concurrently with S3 multipart upload; each part is retried on
+    its own. Smaller files, or any file when no S3 keys are configured,
+    are streamed in a single request. Memory use is at most
+    `concurrency` parts.
+    """
+
+    def __init__(
+        self,
+        part_size: int = STORAGE_PART_SIZE,
+        concurrency: int = STORAGE_UPLOAD_CONCURRENCY,
+        multipart_threshold: int = STORAGE_MULTIPART_THRESHOLD,
+        max_retries: int = STORAGE_MAX_RETRIES
+    ):
+        self.part_size = max(part_size, _MIN_PART_SIZE)
+        self.concurrency = concurrency
+        self.multipart_threshold = multipart_threshold
+        self.max_retries = max_retries
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def multipart_enabled(self) -> bool:
+        return bool(STORAGE_S3_ACCESS_KEY_ID and STORAGE_S3_SECRET_ACCESS_KEY)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=STORAGE_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency * 2,
+                    max_keepalive_connections=self.concurrency * 2
+                )
+            )
+        return self._client
+
+    def open(self) -> None:
+        """Create the connection pool up front, at app or worker startup"""
+        self._get_client()
+
+    async def close(self) -> None:
+        """Close the pooled connections, at shutdown"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def upload_file(
+        self,
+        file_path,
+        bucket: str,
+        storage_path: str,
+        content_type: str
+    ) -> Dict:
+        """
+        Upload a local file, replacing any existing object
+
+        Args:
+            file_path: Local file
+            bucket: Storage bucket
+            storage_path: Object path in the bucket
+            content_type: MIME type of the object
+
+        Returns:
+            Dictionary with size, parts and method
+        """
+        size = os.path.getsize(file_path)
+        started = time.monotonic()
+
+        if self.multipart_enabled and size > self.multipart_threshold:
+            parts = await self._upload_multipart(
+                file_path, bucket, storage_path, content_type, size
+            )
+            method = 'multipart'
+        else:
+            await self._upload_single(file_path, bucket, storage_path, content_type, size)
+            parts = 1
+            method = 'single'
+
+        elapsed = time.monotonic() - started
+        metrics.inc('storage_bytes_uploaded', size, method=method)
+        metrics.observe('storage_upload_seconds', elapsed, method=method)
+        logger.info(
+            f"Uploaded {storage_path} ({size} bytes, {parts} part(s)) "
+            f"in {elapsed:.1f}s"
+        )
+
+        return {'size': size, 'parts': parts, 'method': method}
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        build: Callable[[], Dict],
+        what: str
+    ) -> httpx.Response:
+        """
+        Send a request, retrying transport errors, 5xx, 408 and 429
+
+        `build` returns fresh request kwargs (headers, content) for each
+        attempt, so streamed bodies and signatures are recreated.
+        """
+        client = self._get_client()
+        attempt = 0
+
+        while True:
+            try:
+                response = await client.request(method, url, **build())
+                if response.status_code < 400:
+                    return response
+                if response.status_code < 500 and response.status_code not in (408, 429):
+                    raise StorageUploadError(
+                        f"{what}: HTTP {response.status_code} {response.text[:200]}"
+                    )
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise StorageUploadError(f"{what} failed after {attempt} attempts: {error}")
+
+            metrics.inc('storage_upload_retries')
+            logger.warning(f"{what} failed ({error}), retrying ({attempt}/{self.max_retries})")
+            await asyncio.sleep(min(2 ** attempt, 30) / 4)
+
+    async def upload_bytes(
+        self,
+        data: bytes,
+        bucket: str,
+        storage_path: str,
+        content_type: str
+    ) -> Dict:
+        """Upload an in-memory object (thumbnails, small outputs)"""
+        await self._post_object(
+            bucket,
+            storage_path,
+            content_type,
+            len(data),
+            lambda: data
+        )
+        metrics.inc('storage_bytes_uploaded', len(data), method='single')
+        return {'size': len(data), 'parts': 1, 'method': 'single'}
+
+    def open_stream(
+        self,
+        bucket: str,
+        storage_path: str,
+        content_type: str
+    ) -> "StreamingUpload":
+        """Start an upload fed from a stream of unknown length"""
+        if not self.multipart_enabled:
+            raise StorageUploadError("Streaming uploads need S3 access keys")
+        return StreamingUpload(self, bucket, storage_path, content_type)
+
+    async def _post_object(
+        self,
+        bucket: str,
+        storage_path: str,
+        content_type: str,
+        size: int,
+        body: Callable[[], object]
+    ) -> None:
+        def build() -> Dict:
+            return {
+                'headers': {
+                    **_auth_headers(),
+                    'Content-Type': content_type,
+                    'Content-Length': str(size),
+                    'x-upsert': 'true',
+                },
+                'content': body(),
+            }
+
+        await self._request(
+            'POST',
+            object_url(bucket, storage_path),
+            build,
+            f"Upload {storage_path}"
+        )
+
+    async def _upload_single(
+        self,
+        file_path,
+        bucket: str,
+        storage_path: str,
+        content_type: str,
+        size: int
+    ) -> None:
+        async def body() -> AsyncIterator[bytes]:
+            f = await run_io(open, file_path, 'rb')
+            try:
+                while chunk := await run_io(f.read, STORAGE_CHUNK_SIZE):
+                    yield chunk
+            finally:
+                f.close()
+
+        await self._post_object(bucket, storage_path, content_type, size, body)
+
+    def _s3_url(self, bucket: str, storage_path: str) -> str:
+        return f"{_s3_endpoint()}/{bucket}/{quote(storage_path, safe='/-_.~')}"
+
+    async def _create_multipart(self, url: str, content_type: str) -> str:
+        create_url = f"{url}?uploads"
+        response = await self._request(
+            'POST',
+            create_url,
+            lambda: {'headers': _sigv4_headers(
+                'POST',
+                create_url,
+                hashlib.sha256(b'').hexdigest(),
+                {'content-type': content_type}
+            )},
+            f"Create multipart upload {url}"
+        )
+
+        result = ElementTree.fromstring(response.content)
+        upload_id = (
+            result.findtext(f'{_S3_NS}UploadId') or result.findtext('UploadId')
+        )
+        if not upload_id:
+            raise StorageUploadError(f"No UploadId for {url}")
+
+        return upload_id
+
+    async def _put_part(
+        self,
+        url: str,
+        upload_id: str,
+        number: int,
+        data: bytes
+    ) -> str:
+        """Upload one part; returns its etag"""
+        part_url = f"{url}?partNumber={number}&uploadId={quote(upload_id, safe='')}"
+        payload_hash = await run_io(lambda: hashlib.sha256(data).hexdigest())
+
+        response = await self._request(
+            'PUT',
+            part_url,
+            lambda: {
+                'headers': {
+                    **_sigv4_headers('PUT', part_url, payload_hash),
+                    'Content-Length': str(len(data)),
+                },
+                'content': data,
+            },
+            f"Part {number} of {url}"
+        )
+        return response.headers.get('etag')
+
+    async def _complete_multipart(
+        self,
+        url: str,
+        upload_id: str,
+        etags: List[str]
+    ) -> None:
+        complete = (
+            '<CompleteMultipartUpload>'
+            + ''.join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in enumerate(etags, start=1)
+            )
+            + '</CompleteMultipartUpload>'
+        ).encode()
+        complete_url = f"{url}?uploadId={quote(upload_id, safe='')}"
+
+        await self._request(
+            'POST',
+            complete_url,
+            lambda: {
+                'headers': _sigv4_headers(
+                    'POST',
+                    complete_url,
+                    hashlib.sha256(complete).hexdigest(),
+                    {'content-type': 'application/xml'}
+                ),
+                'content': complete,
+            },
+            f"Complete multipart upload {url}"
+        )
+
+    async def _upload_multipart(
+        self,
+        file_path,
+        bucket: str,
+        storage_path: str,
+        content_type: str,
+        size: int
+    ) -> int:
+        url = self._s3_url(bucket, storage_path)
+        part_size = max(self.part_size, math.ceil(size / _MAX_PARTS))
+        part_count = math.ceil(size / part_size)
+
+        upload_id = await self._create_multipart(url, content_type)
+        etags: List[Optional[str]] = [None] * part_count
+        semaphore = asyncio.Semaphore(self.concurrency)
+        fd = os.open(file_path, os.O_RDONLY)
+
+        async def upload_part(number: int) -> None:
+            offset = (number - 1) * part_size
+            length = min(part_size, size - offset)
+
+            async with semaphore:
+                data = await run_io(os.pread, fd, length, offset)
+                etags[number - 1] = await self._put_part(url, upload_id, number, data)
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for number in range(1, part_count + 1):
+                    group.create_task(upload_part(number))
+
+            await self._complete_multipart(url, upload_id, etags)
+
+        except BaseException:
+            await self._abort_multipart(url, upload_id)
+            raise
+
+        finally:
+            os.close(fd)
+
+        return part_count
+
+    async def _abort_multipart(self, url: str, upload_id: str) -> None:
+        abort_url = f"{url}?uploadId={quote(upload_id, safe='')}"
+        try:
+            await self._get_client().delete(
+                abort_url,
+                headers=_sigv4_headers('DELETE', abort_url, hashlib.sha256(b'').hexdigest())
+            )
+        except Exception as e:
+            logger.warning(f"Could not abort multipart upload {upload_id}: {str(e)}")
+
+
+class StreamingUpload:
+    """
+    Multipart upload fed while the bytes are still being produced
+
+    write_from() cuts the stream into parts and uploads each one as soon
+    as it is full, with at most `concurrency` parts in flight, so memory
+    stays bounded and upload overlaps with whatever produces the stream
+    (ffmpeg writing to a pipe). Nothing becomes visible in storage until
+    commit(); abort() discards the parts. Streams shorter than one part
+    are sent as a single object on commit.
+    """
+
+    def __init__(
+        self,
+        uploader: StorageUploader,
+        bucket: str,
+        storage_path: str,
+        content_type: str
+    ):
+        self.uploader = uploader
+        self.bucket = bucket
+        self.storage_path = storage_path
+        self.content_type = content_type
+        self.url = uploader._s3_url(bucket, storage_path)
+        self.size = 0
+
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._etags: Dict[int, str] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._slots = asyncio.Semaphore(uploader.concurrency)
+        self._started = time.monotonic()
+
+    async def write_from(self, reader: asyncio.StreamReader) -> int:
+        """Consume a stream until EOF; returns the bytes read"""
+        part_size = self.uploader.part_size
+
+        while chunk := await reader.read(STORAGE_CHUNK_SIZE):
+            self._buffer += chunk
+            self.size += len(chunk)
+
+            while len(self._buffer) >= part_size:
+                data = bytes(self._buffer[:part_size])
+                del self._buffer[:part_size]
+                await self._send_part(data)
+
+        return self.size
+
+    async def _send_part(self, data: bytes) -> None:
+        # Surface a failed part now rather than after the stream ends
+        for task in self._tasks:
+            if task.done() and task.exception():
+                raise task.exception()
+
+        if self._upload_id is None:
+            self._upload_id = await self.uploader._create_multipart(
+                self.url,
+                self.content_type
+            )
+
+        number = len(self._tasks) + 1
+        if number > _MAX_PARTS:
+            raise StorageUploadError(f"{self.storage_path}: more than {_MAX_PARTS} parts")
+
+        await self._slots.acquire()
+        self._tasks.append(asyncio.create_task(self._put(number, data)))
+
+    async def _put(self, number: int, data: bytes) -> None:
+        try:
+            self._etags[number] = await self.uploader._put_part(
+                self.url,
+                self._upload_id,
+                number,
+                data
+            )
+        finally:
+            self._slots.release()
+
+    async def commit(self) -> Dict:
+        """Upload what is left and make the object visible"""
+        if self._upload_id is None:
+            await self.uploader.upload_bytes(
+                bytes(self._buffer),
+                self.bucket,
+                self.storage_path,
+                self.content_type
+            )
+            self._buffer.clear()
+            return {'size': self.size, 'parts': 1, 'method': 'single'}
+
+        if self._buffer:
+            await self._send_part(bytes(self._buffer))
+            self._buffer.clear()
+
+        await asyncio.gather(*self._tasks)
+        await self.uploader._complete_multipart(
+            self.url,
+            self._upload_id,
+            [self._etags[number] for number in range(1, len(self._tasks) + 1)]
+        )
+
+        elapsed = time.monotonic() - self._started
+        metrics.inc('storage_bytes_uploaded', self.size, method='stream')
+        metrics.observe('storage_upload_seconds', elapsed, method='stream')
+        logger.info(
+            f"Streamed {self.storage_path} ({self.size} bytes, "
+            f"{len(self._tasks)} parts) in {elapsed:.1f}s"
+        )
+
+        return {'size': self.size, 'parts': len(self._tasks), 'method': 'stream'}
+
+    async def abort(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        if self._upload_id is not None:
+            await self.uploader._abort_multipart(self.url, self._upload_id)
+
+
+_storage_uploader: StorageUploader | None = None
+
+
+def get_storage_uploader() -> StorageUploader:
+    """Get or create StorageUploader singleton"""
+    global _storage_uploader
+
+    if _storage_uploader is None:
+        _storage_uploader = StorageUploader()
+
+    return _storage_uploader
@@ -1,19 +1,219 @@
-"""Supabase client configuration"""
+"""
+Async Supabase client on a shared connection pool
+
+supabase-py's AsyncClient over pooled httpx connections, so database
+writes and storage lookups never block the event loop and share
+keep-alive connections (HTTP/2 when `h2` is installed):
+
+    supabase = get_supabase_client()
+    result = await supabase.table('videos')\\
+        .update({'status': 'ready'})\\
+        .eq('id', video_id)\\
+        .execute()
+
+Idempotent requests (reads, updates, deletes, upserts and storage
+metadata calls) are retried with backoff on transport errors and 408/
+429/502/503/504; inserts and RPCs are not. Latency is recorded per
+endpoint as supabase_request_seconds{endpoint="PATCH videos"}.
+"""
 
 import os
-from supabase import create_client, Client
+import time
+import random
+import asyncio
+import logging
+import importlib.util
+from typing import Dict, Optional
+import httpx
 from dotenv import load_dotenv
+from supabase import AsyncClient, AsyncClientOptions
+from .metrics import metrics
 
 load_dotenv()
 
-_supabase_client: Client | None = None
+logger = logging.getLogger(__name__)
+
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", 100))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", 20))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", 30.0))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 10.0))
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", 3))
+
+# "auto" uses HTTP/2 when the h2 package is installed
+SUPABASE_HTTP2 = os.getenv("SUPABASE_HTTP2", "auto")
+
+_RETRY_STATUSES = {408, 429, 502, 503, 504}
+
+# POSTs that only read, so are safe to send again
+_READ_ONLY_POSTS = ('/storage/v1/object/list/', '/storage/v1/object/sign/')
+
+
+def _endpoint(request: httpx.Request) -> str:
+    """Metrics label: 'PATCH videos', 'rpc lease_processing_job', 'storage sign'"""
+    path = request.url.path
+
+    if '/rest/v1/rpc/' in path:
+        return f"rpc {path.rsplit('/', 1)[1]}"
+    if '/rest/v1/' in path:
+        return f"{request.method} {path.split('/rest/v1/', 1)[1]}"
+    if '/storage/v1/object/' in path:
+        return f"storage {path.split('/storage/v1/object/', 1)[1].split('/', 1)[0]}"
+    return f"{request.method} {path}"
+
+
+def _idempotent(request: httpx.Request) -> bool:
+    if request.method != 'POST':
+        return True
+
+    # Upserts converge on the same rows; inserts and RPCs may not
+    if 'resolution=' in request.headers.get('prefer', ''):
+        return True
+    return any(prefix in request.url.path for prefix in _READ_ONLY_POSTS)
+
+
+class RetryingTransport(httpx.AsyncBaseTransport):
+    """
+    Retry idempotent requests on transient failures and time them
+
+    Wraps the pooled transport, so every supabase-py sub-client gets the
+    same retries and metrics without knowing about them.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = _endpoint(request)
+        attempts = SUPABASE_MAX_RETRIES + 1 if _idempotent(request) else 1
+
+        for attempt in range(attempts):
+            start = time.monotonic()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                metrics.inc('supabase_errors', endpoint=endpoint, status='transport')
+                if attempt + 1 >= attempts:
+                    raise
+                logger.warning(f"Supabase {endpoint} failed ({str(e)}), retrying")
+            else:
+                metrics.observe(
+                    'supabase_request_seconds',
+                    time.monotonic() - start,
+                    endpoint=endpoint
+                )
+
+                if response.status_code < 400:
+                    return response
+
+                metrics.inc('supabase_errors', endpoint=endpoint, status=str(response.status_code))
+                if response.status_code not in _RETRY_STATUSES or attempt + 1 >= attempts:
+                    return response
+
+                await response.aclose()
+                logger.warning(
+                    f"Supabase {endpoint} returned {response.status_code}, retrying"
+                )
 
+            metrics.inc('supabase_retries', endpoint=endpoint)
+            await asyncio.sleep(min(5.0, 0.2 * 2 ** attempt) * (0.5 + random.random()))
 
-def get_supabase_client() -> Client:
-    """Get or create Supabase client singleton"""
-    global _supabase_client
+    async def aclose(self) -> None:
+        await self._transport.aclose()
 
-    if _supabase_client is None:
+
+def _pooled_transport() -> httpx.AsyncBaseTransport:
+    if SUPABASE_HTTP2 == 'auto':
+        http2 = importlib.util.find_spec('h2') is not None
+    else:
+        http2 = SUPABASE_HTTP2.lower() in ('1', 'true', 'yes')
+
+    return httpx.AsyncHTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+            keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+class SupabaseClient(AsyncClient):
+    """
+    supabase-py AsyncClient whose sub-clients share one connection pool
+
+    The PostgREST and storage clients each set their own base_url on the
+    httpx client they are given, so they cannot share one httpx client;
+    instead each gets its own over the same transport, and with it the
+    same pool, retries and metrics.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            url: Project URL
+            key: Service role key
+            transport: httpx transport, e.g. httpx.MockTransport in tests;
+                a new pool by default
+        """
+        self._transport = RetryingTransport(transport or _pooled_transport())
+        self._storage_http = self._http_client()
+
+        super().__init__(
+            url.rstrip('/'),
+            key,
+            AsyncClientOptions(
+                httpx_client=self._http_client(),
+                # The service role key is the only credential; no sessions
+                auto_refresh_token=False,
+                persist_session=False,
+            )
+        )
+
+    def _http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            transport=self._transport,
+            timeout=SUPABASE_TIMEOUT,
+            follow_redirects=True,
+        )
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = self._init_storage_client(
+                storage_url=self.storage_url,
+                headers=self.options.headers,
+                http_client=self._storage_http,
+            )
+        return self._storage
+
+    async def close(self) -> None:
+        """Close the pooled connections"""
+        await self.options.httpx_client.aclose()
+        await self._storage_http.aclose()
+
+
+# Connections cannot be shared between event loops, so each loop that
+# uses Supabase (the API's, each worker process's) gets its own client
+_supabase_clients: Dict[asyncio.AbstractEventLoop, SupabaseClient] = {}
+
+
+def get_supabase_client() -> SupabaseClient:
+    """
+    Get or create the running event loop's Supabase client
+
+    Clients of loops that were closed without close_supabase_client()
+    are dropped when the next loop creates one, so their sockets are
+    closed when the transports are collected.
+    """
+    loop = asyncio.get_running_loop()
+    client = _supabase_clients.get(loop)
+
+    if client is None:
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
@@ -22,6 +222,20 @@ def get_supabase_client() -> Client:
                 "SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set"
             )
 
-        _supabase_client = create_client(supabase_url, supabase_key)
+        _drop_closed_loops()
+        client = _supabase_clients[loop] = SupabaseClient(supabase_url, supabase_key)
+
+    return client
+
+
+def _drop_closed_loops() -> None:
+    for loop in [loop for loop in _supabase_clients if loop.is_closed()]:
+        del _supabase_clients[loop]
+
 
-    return _supabase_client
+async def close_supabase_client() -> None:
+    """Close the running loop's connections, if it has a client"""
+    client = _supabase_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+    _drop_closed_loops()
@@ -0,0 +1,183 @@
+"""Compact in-memory transcript with time-range queries"""
+
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional
+
+
+def _offsets(parts: Iterable[str]) -> array:
+    offsets = array('I', [0])
+    position = 0
+    for part in parts:
+        position += len(part)
+        offsets.append(position)
+    return offsets
+
+
+def _seconds(value: float) -> float:
+    # float32 -> the millisecond value it was stored from
+    return round(value, 3)
+
+
+class Transcript:
+    """
+    Words and segments of a transcript, stored column-wise
+
+    Start/end times are float32 arrays and all word (and segment) text
+    lives in one string with an offsets array, so an hour of speech takes
+    well under a megabyte instead of a dict per word. Words and segments
+    are kept sorted by start time and are assumed not to overlap each
+    other, which makes range lookups a bisect.
+
+    Converts to and from the dict format the transcription engines
+    produce: {'text', 'language', 'duration', 'segments': [{'id', 'start',
+    'end', 'text'}], 'words': [{'word', 'start', 'end'}]}.
+    """
+
+    __slots__ = (
+        'text', 'language', 'duration',
+        'word_starts', 'word_ends', '_word_text', '_word_offsets',
+        'segment_starts', 'segment_ends', '_segment_text', '_segment_offsets',
+    )
+
+    def __init__(
+        self,
+        words: Iterable[Dict] = (),
+        segments: Iterable[Dict] = (),
+        text: Optional[str] = None,
+        language: Optional[str] = None,
+        duration: Optional[float] = None
+    ):
+        words = sorted(words, key=lambda word: word['start'])
+        segments = sorted(segments, key=lambda segment: segment['start'])
+
+        self.word_starts = array('f', (word['start'] for word in words))
+        self.word_ends = array('f', (word['end'] for word in words))
+        self._word_text = ''.join(word['word'] for word in words)
+        self._word_offsets = _offsets(word['word'] for word in words)
+
+        self.segment_starts = array('f', (segment['start'] for segment in segments))
+        self.segment_ends = array('f', (segment['end'] for segment in segments))
+        self._segment_text = ''.join(segment.get('text', '') for segment in segments)
+        self._segment_offsets = _offsets(segment.get('text', '') for segment in segments)
+
+        self.text = self._segment_text.strip() if text is None else text
+        self.language = language
+        self.duration = duration
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Transcript":
+        """Build from the engines' dict format"""
+        return cls(
+            words=data.get('words') or [],
+            segments=data.get('segments') or [],
+            text=data.get('text'),
+            language=data.get('language'),
+            duration=data.get('duration'),
+        )
+
+    def to_dict(self) -> Dict:
+        """Convert back to the engines' dict format"""
+        return {
+            'text': self.text,
+            'language': self.language,
+            'duration': self.duration,
+            'segments': self.segments_between(),
+            'words': self.words_between(),
+        }
+
+    @property
+    def word_count(self) -> int:
+        return len(self.word_starts)
+
+    @property
+    def segment_count(self) -> int:
+        return len(self.segment_starts)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the arrays and text buffers"""
+        arrays = (
+            self.word_starts, self.word_ends, self._word_offsets,
+            self.segment_starts, self.segment_ends, self._segment_offsets,
+        )
+        return (
+            sum(values.itemsize * len(values) for values in arrays)
+            + sys.getsizeof(self._word_text)
+            + sys.getsizeof(self._segment_text)
+        )
+
+    def word(self, index: int) -> str:
+        return self._word_text[self._word_offsets[index]:self._word_offsets[index + 1]]
+
+    def segment_text(self, index: int) -> str:
+        return self._segment_text[
+            self._segment_offsets[index]:self._segment_offsets[index + 1]
+        ]
+
+    def word_range(self, start: Optional[float] = None, end: Optional[float] = None) -> range:
+        """Indexes of the words overlapping [start, end)"""
+        first = 0 if start is None else bisect_right(self.word_ends, start)
+        last = self.word_count if end is None else bisect_left(self.word_starts, end)
+        return range(first, max(first, last))
+
+    def segment_range(self, start: Optional[float] = None, end: Optional[float] = None) -> range:
+        """Indexes of the segments overlapping [start, end)"""
+        first = 0 if start is None else bisect_right(self.segment_ends, start)
+        last = self.segment_count if end is None else bisect_left(self.segment_starts, end)
+        return range(first, max(first, last))
+
+    def words_in_segment(self, index: int) -> range:
+        """
+        Indexes of the words that start within a segment
+
+        Words before the first segment belong to it, and words after the
+        last segment's start to the last one.
+        """
+        first = 0 if index == 0 else bisect_left(
+            self.word_starts, self.segment_starts[index]
+        )
+        last = self.word_count if index + 1 >= self.segment_count else bisect_left(
+            self.word_starts, self.segment_starts[index + 1]
+        )
+        return range(first, max(first, last))
+
+    def words_between(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Dict]:
+        """Words overlapping [start, end) as {'word', 'start', 'end'}"""
+        return [
+            {
+                'word': self.word(i),
+                'start': _seconds(self.word_starts[i]),
+                'end': _seconds(self.word_ends[i]),
+            }
+            for i in self.word_range(start, end)
+        ]
+
+    def segments_between(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Dict]:
+        """Segments overlapping [start, end) as {'id', 'start', 'end', 'text'}"""
+        return [self._segment(i) for i in self.segment_range(start, end)]
+
+    def segment_at(self, time: float) -> Optional[Dict]:
+        """The segment being spoken at a time, or None in a gap"""
+        index = bisect_right(self.segment_starts, time) - 1
+        if index < 0 or time >= self.segment_ends[index]:
+            return None
+        return self._segment(index)
+
+    def text_between(self, start: Optional[float] = None, end: Optional[float] = None) -> str:
+        """Text of the segments overlapping [start, end)"""
+        segments = self.segment_range(start, end)
+        if not segments:
+            return ''
+        return self._segment_text[
+            self._segment_offsets[segments.start]:self._segment_offsets[segments.stop]
+        ].strip()
+
+    def _segment(self, index: int) -> Dict:
+        return {
+            'id': index,
+            'start': _seconds(self.segment_starts[index]),
+            'end': _seconds(self.segment_ends[index]),
+            'text': self.segment_text(index),
+        }
@@ -0,0 +1,117 @@
+"""Reuse transcripts of identical audio instead of transcribing it again"""
+
+import os
+import hashlib
+import logging
+from typing import Dict, Optional, Tuple
+from .transcript import Transcript
+from .transcript_store import get_transcript_store
+from .executor import run_io
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_CACHE_ENABLED = os.getenv("TRANSCRIPT_CACHE_ENABLED", "true").lower() == "true"
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def fingerprint_audio(pcm_path: str) -> str:
+    """sha256 of the decoded audio samples"""
+    digest = hashlib.sha256()
+    with open(pcm_path, 'rb') as audio:
+        while chunk := audio.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """
+    Look up transcripts by a fingerprint of the decoded audio
+
+    The key covers the 16 kHz PCM samples plus engine, model and
+    language, so a retried job or a second upload of the same file is
+    answered from the transcripts table, while a different model or
+    language still transcribes. A transcript from any engine the router
+    would accept counts. Hit rate is kept per engine.
+    """
+
+    def __init__(self, enabled: bool = TRANSCRIPT_CACHE_ENABLED):
+        self.enabled = enabled
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    async def fingerprint(self, pcm_path: str) -> str:
+        """Hash of the decoded audio, shared by the keys of every engine"""
+        return await run_io(fingerprint_audio, pcm_path)
+
+    def key(self, audio_hash: str, engine: str, model: str, language: str) -> str:
+        """Cache key for audio transcribed with these settings"""
+        return hashlib.sha256(
+            f"{audio_hash}:{engine}:{model}:{language}".encode()
+        ).hexdigest()
+
+    async def lookup(self, cache_keys: Dict[str, str]) -> Optional[Tuple[str, Dict, Transcript]]:
+        """
+        Find a transcript under any of the candidate engines' keys
+
+        Args:
+            cache_keys: Engine name to cache key, in routing order; the
+                first engine with a stored transcript wins
+
+        Returns:
+            (engine name, transcripts row, Transcript), or None on a miss
+        """
+        if not self.enabled or not cache_keys:
+            return None
+
+        store = get_transcript_store()
+        rows = {
+            row['cache_key']: row
+            for row in await store.find_by_cache_keys(list(cache_keys.values()))
+        }
+
+        for engine, cache_key in cache_keys.items():
+            row = rows.get(cache_key)
+            if row is None:
+                continue
+
+            self._record(engine, True)
+            logger.info(f"Transcript cache hit ({engine}): transcript {row['id']}")
+            return engine, row, await store.load(row)
+
+        # Counted against the engine that will do the work
+        self._record(next(iter(cache_keys)), False)
+        return None
+
+    def _record(self, engine: str, hit: bool) -> None:
+        counts = self._counts.setdefault(engine, {'hits': 0, 'misses': 0})
+        counts['hits' if hit else 'misses'] += 1
+
+        metrics.inc('transcript_cache_hits' if hit else 'transcript_cache_misses', engine=engine)
+        metrics.set_gauge(
+            'transcript_cache_hit_rate',
+            counts['hits'] / (counts['hits'] + counts['misses']),
+            engine=engine
+        )
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            engine: {
+                **counts,
+                'hit_rate': counts['hits'] / (counts['hits'] + counts['misses']),
+            }
+            for engine, counts in self._counts.items()
+        }
+
+
+_transcript_cache: TranscriptCache | None = None
+
+
+def get_transcript_cache() -> TranscriptCache:
+    """Get or create TranscriptCache singleton"""
+    global _transcript_cache
+
+    if _transcript_cache is None:
+        _transcript_cache = TranscriptCache()
+
+    return _transcript_cache
@@ -0,0 +1,488 @@
+"""Transcripts stored as time-indexed segment rows with packed word timings"""
+
+import os
+import sys
+import zlib
+import logging
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from .supabase_client import get_supabase_client
+from .db_writer import get_batch_writer
+from .transcript import Transcript
+
+logger = logging.getLogger(__name__)
+
+# Encoding of transcript_segments.word_timings; bump when it changes
+TRANSCRIPT_FORMAT_VERSION = 1
+
+_TRANSCRIPT_COLUMNS = (
+    'id, format_version, language, duration, text, engine, status, transcribed_until'
+)
+
+# Segments per request when reading a transcript
+TRANSCRIPT_PAGE_SIZE = int(os.getenv("TRANSCRIPT_PAGE_SIZE", 500))
+
+
+def pack_timings(timings: Iterable[Tuple[float, float]]) -> str:
+    """
+    Encode word (start, end) pairs as a bytea literal
+
+    zlib-compressed little-endian float32 [start, end, start, end, ...]
+    """
+    values = array('f', (t for pair in timings for t in pair))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return '\\x' + zlib.compress(values.tobytes()).hex()
+
+
+def unpack_timings(value: Optional[str]) -> List[Tuple[float, float]]:
+    """Decode a bytea literal written by pack_timings"""
+    if not value:
+        return []
+
+    values = array('f')
+    values.frombytes(zlib.decompress(bytes.fromhex(value[2:])))
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    return list(zip(values[0::2], values[1::2]))
+
+
+def _with_segments(transcription: Union[Dict, Transcript]) -> Transcript:
+    """A Transcript, with one segment spanning the words if it had none"""
+    if not isinstance(transcription, Transcript):
+        transcription = Transcript.from_dict(transcription)
+
+    if transcription.segment_count or not transcription.word_count:
+        return transcription
+
+    return Transcript(
+        words=transcription.words_between(),
+        segments=[{
+            'start': transcription.word_starts[0],
+            'end': transcription.word_ends[-1],
+            'text': transcription.text,
+        }],
+        text=transcription.text,
+        language=transcription.language,
+        duration=transcription.duration,
+    )
+
+
+def _segment_rows(transcript_id: str, transcription: Transcript, first_idx: int = 0) -> List[Dict]:
+    """transcript_segments rows, numbered from first_idx"""
+    rows = []
+    for index, segment in enumerate(transcription.segments_between()):
+        words = transcription.words_in_segment(index)
+        rows.append({
+            'transcript_id': transcript_id,
+            'idx': first_idx + index,
+            'start_time': segment['start'],
+            'end_time': segment['end'],
+            'text': segment['text'],
+            'words': [transcription.word(i) for i in words],
+            'word_timings': pack_timings(zip(
+                transcription.word_starts[words.start:words.stop],
+                transcription.word_ends[words.start:words.stop]
+            )),
+        })
+    return rows
+
+
+class TranscriptStore:
+    """
+    Read and write transcripts in `transcripts` / `transcript_segments`
+
+    Reads come back in the shape the transcription services produce
+    ({'text', 'language', 'duration', 'segments', 'words'}), optionally
+    limited to the segments overlapping a time window.
+
+    A transcript is either written whole with save(), or while it is
+    being transcribed: begin(), then append() for each stitched part,
+    then finish(). Until finish() its status is 'partial' and
+    `transcribed_until` says how far the segments reach; save() goes
+    through the same steps, so a transcript is only 'complete' once all
+    of its segments are stored.
+    """
+
+    async def save(
+        self,
+        video_id: str,
+        user_id: str,
+        transcription: Union[Dict, Transcript],
+        engine: Optional[str] = None,
+        cache_key: Optional[str] = None
+    ) -> Dict:
+        """
+        Replace a video's transcript
+
+        Args:
+            video_id: Video ID
+            user_id: Owner of the video
+            transcription: Transcript, or a dict with text, segments and words
+            engine: Engine that produced it, e.g. 'groq'
+            cache_key: Audio fingerprint and settings, see TranscriptCache
+
+        Returns:
+            Summary for videos.transcription: status, language, duration,
+            counts, transcript_id and format_version
+        """
+        transcription = _with_segments(transcription)
+
+        # Partial, and not reusable from the cache, until every segment
+        # is written
+        transcript_id = await self.begin(video_id, user_id, transcription.language, engine)
+
+        try:
+            await get_batch_writer().insert_many(
+                'transcript_segments',
+                _segment_rows(transcript_id, transcription),
+                returning=False
+            )
+            return await self.finish(transcript_id, transcription, engine, cache_key)
+
+        except Exception:
+            await self.delete(transcript_id)
+            raise
+
+    async def begin(
+        self,
+        video_id: str,
+        user_id: str,
+        language: Optional[str] = None,
+        engine: Optional[str] = None
+    ) -> str:
+        """
+        Start writing a video's transcript part by part, replacing any
+        previous one
+
+        Returns:
+            transcript_id for append() and finish()
+        """
+        supabase = get_supabase_client()
+
+        result = await supabase.table('transcripts').upsert({
+            'video_id': video_id,
+            'user_id': user_id,
+            'language': language,
+            'duration': None,
+            'text': '',
+            'segment_count': 0,
+            'word_count': 0,
+            'format_version': TRANSCRIPT_FORMAT_VERSION,
+            'engine': engine,
+            'cache_key': None,
+            'status': 'partial',
+            'transcribed_until': 0,
+        }, on_conflict='video_id').execute()
+        transcript_id = result.data[0]['id']
+
+        await self._delete_segments(transcript_id)
+
+        return transcript_id
+
+    async def append(self, transcript_id: str, part: Dict, first_idx: int) -> int:
+        """
+        Write the segments of a stitched part
+
+        Args:
+            transcript_id: From begin()
+            part: {'start', 'end', 'segments', 'words'}, see TranscriptStream
+            first_idx: Number of segments written before this part
+
+        Returns:
+            Number of segments written
+        """
+        transcription = _with_segments(Transcript(
+            words=part['words'],
+            segments=part['segments'],
+        ))
+
+        await get_batch_writer().insert_many(
+            'transcript_segments',
+            _segment_rows(transcript_id, transcription, first_idx),
+            returning=False
+        )
+
+        # Same row as finish(), so a late flush never undoes it
+        await get_batch_writer().update('transcripts', transcript_id, {
+            'segment_count': first_idx + transcription.segment_count,
+            'transcribed_until': part['end'],
+        })
+
+        return transcription.segment_count
+
+    async def finish(
+        self,
+        transcript_id: str,
+        transcription: Transcript,
+        engine: Optional[str] = None,
+        cache_key: Optional[str] = None
+    ) -> Dict:
+        """
+        Complete a transcript written with append()
+
+        The segments are already stored; only the transcripts row is
+        updated with the full text and counts.
+
+        Returns:
+            Summary for videos.transcription, as save()
+        """
+        summary = self.summarize(transcription, transcript_id)
+
+        await get_batch_writer().update('transcripts', transcript_id, {
+            'text': transcription.text,
+            'language': summary['language'],
+            'duration': summary['duration'],
+            'segment_count': summary['segment_count'],
+            'word_count': summary['word_count'],
+            'engine': engine,
+            'cache_key': cache_key,
+            'status': 'complete',
+            'transcribed_until': transcription.duration,
+        })
+
+        logger.info(
+            f"Transcript {transcript_id} completed: "
+            f"{transcription.segment_count} segments, "
+            f"{transcription.word_count} words"
+        )
+
+        return summary
+
+    async def delete(self, transcript_id: str) -> None:
+        """Delete a transcript and its segments, e.g. one left partial by a failure"""
+        supabase = get_supabase_client()
+
+        await supabase.table('transcripts')\
+            .delete()\
+            .eq('id', transcript_id)\
+            .execute()
+
+    async def _delete_segments(self, transcript_id: str) -> None:
+        supabase = get_supabase_client()
+
+        await supabase.table('transcript_segments')\
+            .delete()\
+            .eq('transcript_id', transcript_id)\
+            .execute()
+
+    @staticmethod
+    def summarize(transcription: Transcript, transcript_id: Optional[str] = None) -> Dict:
+        """
+        The summary kept in videos.transcription
+
+        Only metadata: the text stays in transcript_segments, so the videos
+        row does not carry the whole transcript.
+        """
+        summary = {
+            'status': 'complete',
+            'language': transcription.language,
+            'duration': transcription.duration,
+            'segment_count': transcription.segment_count,
+            'word_count': transcription.word_count,
+            'format_version': TRANSCRIPT_FORMAT_VERSION,
+        }
+        if transcript_id is not None:
+            summary['transcript_id'] = transcript_id
+        return summary
+
+    async def get(
+        self,
+        video_id: str,
+        user_id: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None
+    ) -> Optional[Dict]:
+        """
+        Load a transcript, or the part of it between start and end
+
+        Segments overlapping the window are returned whole; words are
+        limited to the window. While the video is still being transcribed
+        this is what has been written so far, with status 'partial'.
+
+        Returns:
+            Transcription dict, or None if the video has no transcript
+        """
+        transcript = await self._find(video_id, user_id)
+        if transcript is None:
+            return None
+
+        transcription = await self.load(transcript, start, end)
+
+        return {
+            **transcription.to_dict(),
+            'words': transcription.words_between(start, end),
+            'transcript_id': transcript['id'],
+            'engine': transcript['engine'],
+            'status': transcript['status'],
+            'transcribed_until': transcript['transcribed_until'],
+        }
+
+    async def get_transcript(
+        self,
+        video_id: str,
+        user_id: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None
+    ) -> Optional[Tuple[str, Optional[str], Transcript]]:
+        """
+        Load a transcript as a Transcript, limited to segments overlapping
+        [start, end) when given
+
+        Returns:
+            (transcript_id, engine, Transcript), or None if the video has
+            no transcript
+        """
+        transcript = await self._find(video_id, user_id)
+        if transcript is None:
+            return None
+
+        return transcript['id'], transcript['engine'], await self.load(transcript, start, end)
+
+    async def get_text(self, video_id: str, user_id: str) -> Optional[str]:
+        """
+        The full text of a finished transcript, rebuilt from its segments
+
+        Only the segment text is read, not the words or their timings.
+
+        Returns:
+            Transcript text, or None if the video has no complete transcript
+        """
+        transcript = await self._find(video_id, user_id)
+        if transcript is None or transcript['status'] != 'complete':
+            return None
+
+        if transcript['format_version'] > TRANSCRIPT_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported transcript format {transcript['format_version']}"
+            )
+
+        rows = await self._fetch_segments(transcript['id'], None, None, 'idx, text')
+        return ''.join(row['text'] for row in rows).strip()
+
+    async def _find(self, video_id: str, user_id: str) -> Optional[Dict]:
+        supabase = get_supabase_client()
+
+        result = await supabase.table('transcripts')\
+            .select(_TRANSCRIPT_COLUMNS)\
+            .eq('video_id', video_id)\
+            .eq('user_id', user_id)\
+            .maybe_single()\
+            .execute()
+
+        # maybe_single() gives no response at all when there is no row
+        return result.data if result else None
+
+    async def find_by_cache_keys(self, cache_keys: List[str]) -> List[Dict]:
+        """
+        Transcripts made from the same audio with any of these settings
+
+        Returns:
+            transcripts rows (id, video_id, cache_key, ...) for load()
+        """
+        if not cache_keys:
+            return []
+
+        supabase = get_supabase_client()
+
+        result = await supabase.table('transcripts')\
+            .select(f'{_TRANSCRIPT_COLUMNS}, video_id, cache_key')\
+            .in_('cache_key', cache_keys)\
+            .execute()
+
+        return result.data or []
+
+    async def load(
+        self,
+        transcript: Dict,
+        start: Optional[float] = None,
+        end: Optional[float] = None
+    ) -> Transcript:
+        """
+        Load the segments of a transcripts row into a Transcript
+
+        Args:
+            transcript: Row with the columns in _TRANSCRIPT_COLUMNS
+            start: Only segments ending after this time
+            end: Only segments starting before this time
+        """
+        if transcript['format_version'] > TRANSCRIPT_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported transcript format {transcript['format_version']}"
+            )
+
+        rows = await self._fetch_segments(transcript['id'], start, end)
+
+        segments = []
+        words = []
+
+        for row in rows:
+            segments.append({
+                'start': row['start_time'],
+                'end': row['end_time'],
+                'text': row['text'],
+            })
+            words.extend(
+                {'word': word, 'start': word_start, 'end': word_end}
+                for word, (word_start, word_end) in zip(
+                    row['words'],
+                    unpack_timings(row['word_timings'])
+                )
+            )
+
+        # The stored text is only set once the transcript is complete
+        whole = start is None and end is None and transcript['status'] == 'complete'
+
+        return Transcript(
+            words=words,
+            segments=segments,
+            text=transcript['text'] if whole else None,
+            language=transcript['language'],
+            duration=transcript['duration'],
+        )
+
+    async def _fetch_segments(
+        self,
+        transcript_id: str,
+        start: Optional[float],
+        end: Optional[float],
+        columns: str = 'idx, start_time, end_time, text, words, word_timings'
+    ) -> List[Dict]:
+        """Segments overlapping [start, end), paged by idx; columns must include idx"""
+        supabase = get_supabase_client()
+        rows: List[Dict] = []
+        last_idx = -1
+
+        while True:
+            query = supabase.table('transcript_segments')\
+                .select(columns)\
+                .eq('transcript_id', transcript_id)\
+                .gt('idx', last_idx)
+
+            if start is not None:
+                query = query.gt('end_time', start)
+            if end is not None:
+                query = query.lt('start_time', end)
+
+            result = await query.order('idx').limit(TRANSCRIPT_PAGE_SIZE).execute()
+            page = result.data or []
+            rows.extend(page)
+
+            if len(page) < TRANSCRIPT_PAGE_SIZE:
+                return rows
+
+            last_idx = page[-1]['idx']
+
+
+_transcript_store: TranscriptStore | None = None
+
+
+def get_transcript_store() -> TranscriptStore:
+    """Get or create TranscriptStore singleton"""
+    global _transcript_store
+
+    if _transcript_store is None:
+        _transcript_store = TranscriptStore()
+
+    return _transcript_store
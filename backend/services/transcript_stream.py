@@ -0,0 +1,124 @@
+"""A transcript published segment by segment while it is transcribed"""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptStream:
+    """
+    One transcription's segments, published in audio order as they finish
+
+    The transcription service publishes each stitched part; any number
+    of subscribers can wait until the transcript reaches a point in the
+    audio or walk it window by window, so work on the start of a long
+    video begins while the rest is still being transcribed.
+
+    If an engine fails part-way and the job falls back to another one,
+    the new engine's output for audio that was already published is
+    dropped, so subscribers never see a segment twice.
+    """
+
+    def __init__(self):
+        self.segments: List[Dict] = []
+        self.words: List[Dict] = []
+        # Audio before this point has been published
+        self.transcribed_until = 0.0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, part: Dict) -> Optional[Dict]:
+        """
+        Add a stitched part of the transcript
+
+        Args:
+            part: {'start', 'end', 'segments', 'words'} covering [start, end)
+
+        Returns:
+            The part without anything published before, or None if it
+            added nothing
+        """
+        frontier = self.transcribed_until
+        if part['end'] <= frontier:
+            return None
+
+        def new(item: Dict) -> bool:
+            return (item['start'] + item['end']) / 2 >= frontier
+
+        published = {
+            'start': max(part['start'], frontier),
+            'end': part['end'],
+            'segments': [segment for segment in part['segments'] if new(segment)],
+            'words': [word for word in part['words'] if new(word)],
+        }
+
+        async with self._changed:
+            self.segments.extend(published['segments'])
+            self.words.extend(published['words'])
+            self.transcribed_until = published['end']
+            self._changed.notify_all()
+
+        return published
+
+    async def finish(self, error: Optional[BaseException] = None) -> None:
+        """Mark the transcript complete, or failed with `error`"""
+        async with self._changed:
+            self.done = True
+            self.error = self.error or error
+            self._changed.notify_all()
+
+    async def wait_until(self, seconds: float) -> float:
+        """
+        Wait until the audio up to `seconds` is transcribed, or all of it is
+
+        Returns:
+            How far the transcript reaches
+
+        Raises:
+            RuntimeError: If the transcription failed
+        """
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: self.done or self.transcribed_until >= seconds
+            )
+
+        if self.error is not None:
+            raise RuntimeError(f"Transcription failed: {self.error}")
+
+        return self.transcribed_until
+
+    def text_between(self, start: float, end: float) -> str:
+        """Text of the segments centred in [start, end)"""
+        return ''.join(
+            segment['text'] for segment in self.segments
+            if start <= (segment['start'] + segment['end']) / 2 < end
+        ).strip()
+
+    async def windows(
+        self,
+        seconds: float,
+        min_seconds: float = 0.0
+    ) -> AsyncIterator[Tuple[float, float, str]]:
+        """
+        Yield (start, end, text) for consecutive windows of `seconds` each
+        as soon as it is transcribed
+
+        A remainder shorter than `min_seconds` at the end of the audio is
+        joined to the last window instead of being yielded on its own.
+        """
+        start = 0.0
+
+        while True:
+            until = await self.wait_until(start + seconds + min_seconds)
+
+            if self.done and until - start <= seconds + min_seconds:
+                if until > start:
+                    yield start, until, self.text_between(start, until)
+                return
+
+            end = start + seconds
+            yield start, end, self.text_between(start, end)
+            start = end
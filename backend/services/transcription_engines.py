@@ -0,0 +1,670 @@
+"""Transcription engines behind one interface, with routing and fallback"""
+
+import os
+import time
+import asyncio
+import logging
+import functools
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+import whisper
+from groq import Groq, RateLimitError
+from .video_service import VideoService
+from .transcript import Transcript
+from .audio_chunks import (
+    AudioChunk,
+    ChunkStitcher,
+    TRANSCRIBE_CHUNK_SECONDS,
+    TRANSCRIBE_CHUNK_SEARCH,
+    detect_silences,
+    pcm_duration,
+    plan_chunks,
+    split_chunk,
+)
+from .rate_limit import TokenBucket
+from .executor import run_io, run_transcribe
+from .whisper_models import WHISPER_MODEL, transcribe as whisper_transcribe
+from .resource_governor import get_governor
+from .progress import ProgressCallback
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Engines to register, in order of preference when they score the same
+TRANSCRIPTION_ENGINES = [
+    name.strip()
+    for name in os.getenv("TRANSCRIPTION_ENGINES", "groq,whisper").split(",")
+    if name.strip()
+]
+
+# Engines failing more than this share of recent jobs are tried last
+TRANSCRIPTION_MAX_ERROR_RATE = float(os.getenv("TRANSCRIPTION_MAX_ERROR_RATE", 0.5))
+
+# Recent jobs per engine that the error rate is computed over
+TRANSCRIPTION_ERROR_WINDOW = int(os.getenv("TRANSCRIPTION_ERROR_WINDOW", 20))
+
+GROQ_TRANSCRIBE_MODEL = os.getenv("GROQ_TRANSCRIBE_MODEL", "whisper-large-v3")
+
+# Upload encoding for Groq: 'flac' (lossless) or 'opus' (smaller)
+GROQ_AUDIO_CODEC = os.getenv("GROQ_AUDIO_CODEC", "flac")
+
+# Largest file one Groq request accepts
+GROQ_MAX_FILE_BYTES = int(os.getenv("GROQ_MAX_FILE_BYTES", 25 * 1024 * 1024))
+
+# Target audio per Groq request, in seconds
+GROQ_CHUNK_SECONDS = float(os.getenv("GROQ_CHUNK_SECONDS", 600))
+
+# Account rate limits, shared by the worker processes on this host
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", 20))
+GROQ_AUDIO_SECONDS_PER_HOUR = float(os.getenv("GROQ_AUDIO_SECONDS_PER_HOUR", 7200))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", 3))
+
+_AUDIO_EXTENSIONS = {'flac': 'flac', 'opus': 'ogg'}
+
+# Awaited with each stitched part of a transcript as it is ready:
+# {'start', 'end', 'segments', 'words'} covering [start, end) of the audio
+PartialCallback = Callable[[Dict], Awaitable[None]]
+
+
+class TranscriptionEngine:
+    """
+    Base class for transcription engines
+
+    Subclasses set `name` and `model` and implement transcribe(). The
+    hints are the router's estimates until the engine has finished a
+    job: `speed_hint` is audio seconds per wall-clock second and
+    `overhead_hint` the fixed seconds per job. `pool` names the governor
+    pool whose queue depth slows the engine down.
+    """
+
+    name = ''
+    model = ''
+    speed_hint = 1.0
+    overhead_hint = 0.0
+    pool: Optional[str] = None
+    max_audio_seconds: Optional[float] = None
+
+    def available(self) -> bool:
+        return True
+
+    async def transcribe(
+        self,
+        pcm_path: str,
+        language: str,
+        progress: Optional[ProgressCallback] = None,
+        on_partial: Optional[PartialCallback] = None
+    ) -> Transcript:
+        """
+        Transcribe 16 kHz mono s16le audio
+
+        Args:
+            pcm_path: Audio written by extract_audio(codec='pcm')
+            language: Language code
+            progress: Awaited with (percent, details) as the job advances
+            on_partial: Awaited with each part of the transcript, in audio
+                order, as soon as it and everything before it is done
+        """
+        raise NotImplementedError
+
+
+async def _run_chunks(chunks: Iterable[Awaitable[None]]) -> None:
+    """
+    Transcribe chunks concurrently, stopping at the first failure
+
+    The other chunks are cancelled before the error is raised, so none
+    keeps calling the engine or publishing parts once the router has
+    moved on to a fallback engine.
+    """
+    try:
+        async with asyncio.TaskGroup() as group:
+            for chunk in chunks:
+                group.create_task(chunk)
+    except ExceptionGroup as e:
+        # The chunk's own error, for the router's fallback and logs
+        raise e.exceptions[0]
+
+
+class GroqEngine(TranscriptionEngine):
+    """
+    Groq's hosted Whisper
+
+    The audio is cut at silences into chunks of about GROQ_CHUNK_SECONDS,
+    each encoded under GROQ_MAX_FILE_BYTES (halved again if it is not)
+    and sent concurrently within the request and audio-seconds rate
+    limits, then stitched.
+    """
+
+    name = 'groq'
+    model = GROQ_TRANSCRIBE_MODEL
+    speed_hint = 100.0
+    overhead_hint = 2.0
+    pool = 'llm'
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        self.video_service = VideoService()
+        # Retries go through the buckets below instead
+        self.client = Groq(api_key=self.api_key, max_retries=0) if self.api_key else None
+
+        share = max(1, int(os.getenv("RESOURCE_SHARE_PROCESSES", 1)))
+        self.requests = TokenBucket(
+            'groq_requests',
+            GROQ_REQUESTS_PER_MINUTE / 60 / share,
+            max(1.0, GROQ_REQUESTS_PER_MINUTE / share)
+        )
+        self.audio = TokenBucket(
+            'groq_audio_seconds',
+            GROQ_AUDIO_SECONDS_PER_HOUR / 3600 / share,
+            GROQ_AUDIO_SECONDS_PER_HOUR / share
+        )
+
+    def available(self) -> bool:
+        return self.client is not None
+
+    async def transcribe(
+        self,
+        pcm_path: str,
+        language: str,
+        progress: Optional[ProgressCallback] = None,
+        on_partial: Optional[PartialCallback] = None
+    ) -> Transcript:
+        duration = pcm_duration(pcm_path)
+
+        silences = []
+        if duration > GROQ_CHUNK_SECONDS + TRANSCRIBE_CHUNK_SEARCH:
+            silences = await run_io(detect_silences, pcm_path)
+
+        chunks = plan_chunks(duration, silences, chunk_seconds=GROQ_CHUNK_SECONDS)
+        stitcher = ChunkStitcher(duration, language)
+        done = 0.0
+
+        logger.info(f"Sending {duration:.0f}s of audio to Groq in {len(chunks)} chunks")
+
+        async def transcribe_chunk(chunk: AudioChunk) -> None:
+            nonlocal done
+            result = None
+
+            # The slot bounds concurrent requests and encoded chunks in memory
+            async with get_governor().slot('llm'):
+                data = await self.video_service.encode_speech(
+                    pcm_path,
+                    chunk.start,
+                    chunk.duration,
+                    GROQ_AUDIO_CODEC
+                )
+                if len(data) <= GROQ_MAX_FILE_BYTES:
+                    result = await self._request(data, chunk.duration, language)
+
+            if result is None:
+                logger.info(
+                    f"Groq chunk at {chunk.start:.0f}s is {len(data)} bytes, splitting"
+                )
+                await _run_chunks(transcribe_chunk(half) for half in split_chunk(chunk))
+                return
+
+            partial = stitcher.add(chunk, result)
+            if partial and on_partial:
+                await on_partial(partial)
+
+            done += chunk.keep_end - chunk.keep_start
+            if progress:
+                await progress(done / duration * 100, {'stage': 'transcribing'})
+
+        await _run_chunks(transcribe_chunk(chunk) for chunk in chunks)
+
+        transcription = stitcher.result()
+        transcription['duration'] = duration
+
+        return Transcript.from_dict(transcription)
+
+    async def _request(self, data: bytes, seconds: float, language: str) -> Dict:
+        """One transcription request, paced by the rate-limit buckets"""
+        filename = f"audio.{_AUDIO_EXTENSIONS[GROQ_AUDIO_CODEC]}"
+
+        # Groq bills at least 10 seconds per request; a rate-limited
+        # attempt is not billed, so retries only take a request token
+        await self.audio.acquire(max(seconds, 10))
+
+        for attempt in range(GROQ_MAX_RETRIES + 1):
+            await self.requests.acquire()
+
+            try:
+                response = await run_io(
+                    self.client.audio.transcriptions.create,
+                    file=(filename, data),
+                    model=self.model,
+                    language=language,
+                    response_format="verbose_json",
+                    temperature=0.0
+                )
+                metrics.inc('groq_transcription_requests')
+                return _format_groq_response(response)
+
+            except RateLimitError as e:
+                if attempt == GROQ_MAX_RETRIES:
+                    raise
+
+                retry_after = e.response.headers.get('retry-after')
+                delay = float(retry_after) if retry_after else 2 ** attempt
+                metrics.inc('groq_rate_limited')
+                # Everyone waits, not only this request
+                self.requests.hold(delay)
+
+
+def _field(item, name: str):
+    # Groq returns response extras as plain dicts
+    return item.get(name) if isinstance(item, dict) else getattr(item, name)
+
+
+def _format_groq_response(response) -> Dict:
+    """Groq's verbose_json response in our transcription format"""
+    return {
+        'text': response.text,
+        'language': getattr(response, 'language', None),
+        'segments': [
+            {
+                'id': idx,
+                'start': _field(segment, 'start'),
+                'end': _field(segment, 'end'),
+                'text': _field(segment, 'text'),
+            }
+            for idx, segment in enumerate(getattr(response, 'segments', None) or [])
+        ],
+        'words': [
+            {
+                'word': _field(word, 'word'),
+                'start': _field(word, 'start'),
+                'end': _field(word, 'end'),
+            }
+            for word in (getattr(response, 'words', None) or [])
+        ]
+    }
+
+
+class WhisperEngine(TranscriptionEngine):
+    """
+    Local Whisper in the transcription process pool
+
+    Long audio is split at silences into chunks that are transcribed in
+    parallel across the pool's processes, then stitched.
+    """
+
+    name = 'whisper'
+    model = WHISPER_MODEL
+    speed_hint = 2.0
+    overhead_hint = 1.0
+    pool = 'transcribe'
+
+    def available(self) -> bool:
+        try:
+            whisper.available_models()
+            return True
+        except Exception:
+            return False
+
+    async def transcribe(
+        self,
+        pcm_path: str,
+        language: str,
+        progress: Optional[ProgressCallback] = None,
+        on_partial: Optional[PartialCallback] = None
+    ) -> Transcript:
+        duration = pcm_duration(pcm_path)
+
+        silences = []
+        if duration > TRANSCRIBE_CHUNK_SECONDS + TRANSCRIBE_CHUNK_SEARCH:
+            silences = await run_io(detect_silences, pcm_path)
+
+        chunks = plan_chunks(duration, silences)
+        stitcher = ChunkStitcher(duration, language)
+        done = 0
+
+        logger.info(f"Transcribing {duration:.0f}s of audio in {len(chunks)} chunks")
+
+        async def transcribe_chunk(chunk: AudioChunk) -> None:
+            nonlocal done
+
+            # A single chunk is the whole file
+            start, length = (None, None) if len(chunks) == 1 else (chunk.start, chunk.duration)
+
+            # Transcribe in a process that keeps the model loaded
+            async with get_governor().slot('transcribe'):
+                output = await run_transcribe(
+                    whisper_transcribe,
+                    self.model,
+                    pcm_path,
+                    language,
+                    start,
+                    length
+                )
+
+            self._record_model_stats(output)
+
+            partial = stitcher.add(chunk, _format_whisper_result(output['result']))
+            if partial and on_partial:
+                await on_partial(partial)
+
+            done += 1
+            if progress:
+                await progress(done / len(chunks) * 100, {
+                    'stage': 'transcribing',
+                    'chunks_done': done,
+                    'chunks': len(chunks),
+                })
+
+        await _run_chunks(transcribe_chunk(chunk) for chunk in chunks)
+
+        transcription = stitcher.result()
+        transcription['duration'] = duration
+
+        return Transcript.from_dict(transcription)
+
+    def _record_model_stats(self, output: Dict) -> None:
+        """Report model load/inference time and resident model sizes"""
+        if output['load_seconds']:
+            metrics.inc('whisper_model_loads', model=self.model)
+            metrics.observe('whisper_model_load_seconds', output['load_seconds'], model=self.model)
+        else:
+            metrics.inc('whisper_model_hits', model=self.model)
+
+        metrics.observe('whisper_inference_seconds', output['inference_seconds'], model=self.model)
+
+        pid = str(output['pid'])
+        for name, model in output['registry']['models'].items():
+            metrics.set_gauge('whisper_model_resident_bytes', model['resident_bytes'], model=name, pid=pid)
+
+
+def _format_whisper_result(result: Dict) -> Dict:
+    """Whisper's output in our transcription format"""
+    return {
+        'text': result['text'],
+        'language': result['language'],
+        'segments': [
+            {
+                'id': segment['id'],
+                'start': segment['start'],
+                'end': segment['end'],
+                'text': segment['text'],
+            }
+            for segment in result['segments']
+        ],
+        'words': [
+            {
+                'word': word['word'],
+                'start': word['start'],
+                'end': word['end'],
+            }
+            for segment in result['segments']
+            for word in segment.get('words', [])
+        ]
+    }
+
+
+class FakeEngine(TranscriptionEngine):
+    """
+    Deterministic engine for development and tests
+
+    Emits one word every `word_seconds` and a segment every
+    `segment_words` words, named by position, so the same audio length
+    always gives the same transcript, delivered one segment at a time to
+    on_partial. `fail=True` makes every job raise, for exercising fallback.
+    """
+
+    def __init__(
+        self,
+        name: str = 'fake',
+        model: str = 'fake',
+        word_seconds: float = 0.5,
+        segment_words: int = 10,
+        delay: float = 0.0,
+        fail: bool = False
+    ):
+        self.name = name
+        self.model = model
+        self.word_seconds = word_seconds
+        self.segment_words = segment_words
+        self.delay = delay
+        self.fail = fail
+        self.speed_hint = 1000.0
+
+    async def transcribe(
+        self,
+        pcm_path: str,
+        language: str,
+        progress: Optional[ProgressCallback] = None,
+        on_partial: Optional[PartialCallback] = None
+    ) -> Transcript:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"Engine {self.name} failed")
+
+        duration = pcm_duration(pcm_path)
+        words = [
+            {
+                'word': f" w{index}",
+                'start': index * self.word_seconds,
+                'end': (index + 0.8) * self.word_seconds,
+            }
+            for index in range(int(duration / self.word_seconds))
+        ]
+        segments = [
+            {
+                'start': group[0]['start'],
+                'end': group[-1]['end'],
+                'text': ''.join(word['word'] for word in group),
+            }
+            for group in (
+                words[first:first + self.segment_words]
+                for first in range(0, len(words), self.segment_words)
+            )
+        ]
+
+        # One part per segment, as a chunked engine would deliver them
+        if on_partial:
+            stitched_until = 0.0
+            for index, segment in enumerate(segments):
+                end = duration if index == len(segments) - 1 else segments[index + 1]['start']
+                await on_partial({
+                    'start': stitched_until,
+                    'end': end,
+                    'segments': [segment],
+                    'words': words[index * self.segment_words:(index + 1) * self.segment_words],
+                })
+                stitched_until = end
+
+        if progress:
+            await progress(100, {'stage': 'transcribing'})
+
+        return Transcript(
+            words=words,
+            segments=segments,
+            language=language,
+            duration=duration,
+        )
+
+
+class EngineStats:
+    """Throughput, latency and recent outcomes of one engine"""
+
+    def __init__(self, engine: TranscriptionEngine, window: int = TRANSCRIPTION_ERROR_WINDOW):
+        self.jobs = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+        # Audio seconds per second, smoothed; starts at the engine's hint
+        self.speed = engine.speed_hint
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def to_dict(self) -> Dict:
+        return {
+            'jobs': self.jobs,
+            'failures': self.failures,
+            'in_flight': self.in_flight,
+            'audio_seconds': round(self.audio_seconds, 1),
+            'busy_seconds': round(self.busy_seconds, 1),
+            'speed': round(self.speed, 2),
+            'error_rate': round(self.error_rate, 3),
+        }
+
+
+class EngineRegistry:
+    """
+    Registered engines and the router choosing between them
+
+    rank() orders the available engines by estimated completion time:
+    overhead plus audio length over measured speed, stretched by the
+    queue in the engine's governor pool and the jobs already routed to
+    it. Engines whose recent error rate is above
+    TRANSCRIPTION_MAX_ERROR_RATE go last. transcribe() walks that order,
+    falling back to the next engine when one fails.
+    """
+
+    def __init__(self):
+        self._engines: Dict[str, TranscriptionEngine] = {}
+        self._stats: Dict[str, EngineStats] = {}
+
+    def register(self, engine: TranscriptionEngine) -> None:
+        """Add an engine, replacing one with the same name"""
+        self._engines[engine.name] = engine
+        self._stats[engine.name] = EngineStats(engine)
+
+    def unregister(self, name: str) -> None:
+        self._engines.pop(name, None)
+        self._stats.pop(name, None)
+
+    def get(self, name: str) -> Optional[TranscriptionEngine]:
+        return self._engines.get(name)
+
+    def _estimate(self, engine: TranscriptionEngine, duration: float) -> float:
+        stats = self._stats[engine.name]
+        backlog = stats.in_flight
+
+        if engine.pool:
+            pool = get_governor().stats().get(engine.pool)
+            if pool:
+                backlog += pool['waiting'] / pool['capacity']
+
+        return engine.overhead_hint + duration / stats.speed * (1 + backlog)
+
+    def rank(self, duration: float) -> List[TranscriptionEngine]:
+        """Available engines able to take `duration` seconds, best first"""
+        engines = [
+            engine for engine in self._engines.values()
+            if engine.available()
+            and (engine.max_audio_seconds is None or duration <= engine.max_audio_seconds)
+        ]
+
+        return sorted(engines, key=lambda engine: (
+            self._stats[engine.name].error_rate > TRANSCRIPTION_MAX_ERROR_RATE,
+            self._estimate(engine, duration),
+        ))
+
+    async def transcribe(
+        self,
+        engines: List[TranscriptionEngine],
+        pcm_path: str,
+        language: str,
+        progress: Optional[ProgressCallback] = None,
+        on_partial: Optional[Callable[[TranscriptionEngine, Dict], Awaitable[None]]] = None
+    ) -> Tuple[TranscriptionEngine, Transcript]:
+        """
+        Transcribe with the first engine that succeeds
+
+        Args:
+            engines: Engines to try, in order (see rank())
+            pcm_path: 16 kHz mono s16le audio
+            language: Language code
+            progress: Progress callback
+            on_partial: Awaited with (engine, part) for each part of the
+                transcript; after a fallback the next engine starts again
+                from the beginning of the audio
+
+        Returns:
+            (engine used, Transcript)
+
+        Raises:
+            RuntimeError: If no engines were given
+            Exception: The last engine's error, if all of them fail
+        """
+        if not engines:
+            raise RuntimeError("No transcription engine available")
+
+        audio_seconds = pcm_duration(pcm_path)
+        error: Optional[Exception] = None
+
+        for engine in engines:
+            stats = self._stats[engine.name]
+            stats.in_flight += 1
+            metrics.set_gauge('transcription_engine_in_flight', stats.in_flight, engine=engine.name)
+            started = time.monotonic()
+
+            try:
+                transcript = await engine.transcribe(
+                    pcm_path,
+                    language,
+                    progress,
+                    on_partial=functools.partial(on_partial, engine) if on_partial else None
+                )
+
+            except Exception as e:
+                error = e
+                stats.failures += 1
+                stats.outcomes.append(False)
+                metrics.inc('transcription_engine_failures', engine=engine.name)
+                logger.error(f"Transcription engine {engine.name} failed: {str(e)}")
+                continue
+
+            else:
+                elapsed = time.monotonic() - started
+                stats.jobs += 1
+                stats.outcomes.append(True)
+                stats.audio_seconds += audio_seconds
+                stats.busy_seconds += elapsed
+                if elapsed > 0 and audio_seconds > 0:
+                    stats.speed = 0.7 * stats.speed + 0.3 * audio_seconds / elapsed
+
+                metrics.observe('transcription_engine_seconds', elapsed, engine=engine.name)
+                metrics.inc('transcription_engine_audio_seconds', audio_seconds, engine=engine.name)
+                metrics.set_gauge('transcription_engine_speed', stats.speed, engine=engine.name)
+
+                return engine, transcript
+
+            finally:
+                stats.in_flight -= 1
+                metrics.set_gauge('transcription_engine_in_flight', stats.in_flight, engine=engine.name)
+
+        raise error
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+
+_ENGINE_FACTORIES = {
+    'groq': GroqEngine,
+    'whisper': WhisperEngine,
+    'fake': FakeEngine,
+}
+
+_engine_registry: EngineRegistry | None = None
+
+
+def get_engine_registry() -> EngineRegistry:
+    """Get or create the EngineRegistry, with TRANSCRIPTION_ENGINES registered"""
+    global _engine_registry
+
+    if _engine_registry is None:
+        _engine_registry = EngineRegistry()
+        for name in TRANSCRIPTION_ENGINES:
+            if name not in _ENGINE_FACTORIES:
+                raise ValueError(f"Unknown transcription engine: {name}")
+            _engine_registry.register(_ENGINE_FACTORIES[name]())
+
+    return _engine_registry
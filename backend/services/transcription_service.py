@@ -1,236 +1,257 @@
 """Video transcription using Whisper and Groq"""
 
-import os
+import asyncio
 import logging
-from pathlib import Path
 from typing import Dict, Optional
-import whisper
-from groq import Groq
 from .video_service import VideoService
-from .supabase_client import get_supabase_client
+from .db_writer import get_batch_writer
+from .audio_chunks import pcm_duration
+from .transcript_store import get_transcript_store
+from .transcript_cache import get_transcript_cache
+from .transcript_stream import TranscriptStream
+from .transcription_engines import TranscriptionEngine, get_engine_registry
+from .workspace import get_workspace_manager
+from .progress import ProgressCallback, scale_progress
 
 logger = logging.getLogger(__name__)
 
 
+class _PartWriter:
+    """
+    Publish each stitched part of a transcription to its stream and
+    write its segments to the transcript store
+    """
+
+    def __init__(self, video_id: str, user_id: str, language: str, stream: TranscriptStream):
+        self.video_id = video_id
+        self.user_id = user_id
+        self.language = language
+        self.stream = stream
+        self.transcript_id: Optional[str] = None
+        self.engine: Optional[str] = None
+        # Parts from more than one engine: the stored segments are a mix
+        self.fell_back = False
+        self.segment_count = 0
+        # Parts are written in the order they were published
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, engine: TranscriptionEngine, part: Dict) -> None:
+        async with self._lock:
+            if self.engine is not None and engine.name != self.engine:
+                self.fell_back = True
+            self.engine = engine.name
+
+            published = await self.stream.publish(part)
+            if not published:
+                return
+
+            store = get_transcript_store()
+            if self.transcript_id is None:
+                self.transcript_id = await store.begin(
+                    self.video_id,
+                    self.user_id,
+                    self.language,
+                    engine.name
+                )
+
+            self.segment_count += await store.append(
+                self.transcript_id,
+                published,
+                self.segment_count
+            )
+
+    async def discard(self) -> None:
+        """Delete the transcript written so far, after the job failed"""
+        async with self._lock:
+            if self.transcript_id is None:
+                return
+            try:
+                await get_transcript_store().delete(self.transcript_id)
+            except Exception as e:
+                logger.error(f"Could not delete partial transcript {self.transcript_id}: {str(e)}")
+            self.transcript_id = None
+
+
 class TranscriptionService:
     def __init__(self):
         self.video_service = VideoService()
-        self.temp_dir = Path("/tmp/clipforge")
-        self.temp_dir.mkdir(exist_ok=True)
-        self.groq_api_key = os.getenv("GROQ_API_KEY")
-        self.use_groq = bool(self.groq_api_key)
+        self.engines = get_engine_registry()
 
     def check_availability(self) -> bool:
-        """Check if Whisper is available"""
-        try:
-            whisper.available_models()
-            return True
-        except Exception:
-            return False
+        """Check if local Whisper is available"""
+        whisper_engine = self.engines.get('whisper')
+        return bool(whisper_engine and whisper_engine.available())
 
     async def transcribe_video(
         self,
         video_id: str,
         user_id: str,
-        language: str = "en"
+        language: str = "en",
+        source_path: Optional[str] = None,
+        duration: Optional[float] = None,
+        progress: Optional[ProgressCallback] = None,
+        stream: Optional[TranscriptStream] = None
     ) -> Dict:
         """
-        Transcribe video using Whisper (local) or Groq (API)
+        Transcribe video with the engine the router picks
+
+        Engines are ranked by estimated completion time for the audio's
+        length (see EngineRegistry.rank); a failing engine falls back to
+        the next one. Segments are published to `stream` and written to
+        the transcript store as each chunk is stitched, so the start of
+        the transcript is readable before the rest is done.
 
         Args:
             video_id: Video ID
             user_id: User ID
             language: Language code (default: en)
+            source_path: Local copy of the source video; skips the storage
+                download and is left in place for the caller
+            duration: Source duration in seconds, if already known
+            progress: Progress callback
+            stream: Receives the segments as they are transcribed; it is
+                finished (or failed) when this returns
 
         Returns:
-            Transcription data with timestamps
+            Dict with the Transcript, the engine used ('method') and
+            whether it came from the transcript cache
         """
-        supabase = get_supabase_client()
-        audio_path = None
-        video_path = None
-
-        try:
-            logger.info(f"Starting transcription for video: {video_id}")
-
-            # Update status
-            supabase.table('videos').update({
-                'status': 'processing'
-            }).eq('id', video_id).execute()
-
-            # Get video info
-            video_info = await self.video_service.get_video_info(
-                video_id,
-                user_id
-            )
+        async with get_workspace_manager().workspace(f"transcribe-{video_id}") as workspace:
+            source = None
+            stream = stream or TranscriptStream()
+            writer = _PartWriter(video_id, user_id, language, stream)
+
+            try:
+                logger.info(f"Starting transcription for video: {video_id}")
+
+                # Update status
+                await get_batch_writer().update('videos', video_id, {
+                    'status': 'processing'
+                }, wait=False)
+
+                if source_path is None:
+                    # Get video info
+                    video_info = await self.video_service.get_video_info(
+                        video_id,
+                        user_id,
+                        'file_path, duration'
+                    )
+
+                    duration = duration or video_info.get('duration')
+
+                    # Check out the cached source, downloading on a miss
+                    source = await self.video_service.source_cache.checkout(
+                        'videos',
+                        video_info['file_path']
+                    )
+                    source_path = str(source.path)
+
+                # Extract audio as raw 16 kHz PCM: local Whisper reads it
+                # without decoding again, Groq chunks are encoded from it
+                audio_path = workspace.file('audio.pcm')
+                await self.video_service.extract_audio(
+                    source_path,
+                    str(audio_path),
+                    duration=duration,
+                    progress=scale_progress(progress, 0, 30),
+                    codec='pcm'
+                )
 
-            # Download video
-            video_path = self.video_service._download_from_storage(
-                video_info['file_path'],
-                'videos'
-            )
+                logger.info(f"Audio extracted: {audio_path}")
 
-            # Extract audio
-            audio_path = self.temp_dir / f"{video_id}.mp3"
-            self.video_service.extract_audio(str(video_path), str(audio_path))
+                if progress:
+                    await progress(30, {'stage': 'transcribing'})
 
-            logger.info(f"Audio extracted: {audio_path}")
+                audio_seconds = pcm_duration(str(audio_path))
+                engines = self.engines.rank(audio_seconds)
 
-            # Transcribe
-            if self.use_groq:
-                transcription = await self._transcribe_with_groq(
-                    audio_path,
-                    language
-                )
-            else:
-                transcription = await self._transcribe_with_whisper(
-                    audio_path,
-                    language
+                # Same audio, engine, model and language: reuse the transcript
+                cache = get_transcript_cache()
+                audio_hash = await cache.fingerprint(str(audio_path))
+                cache_keys = {
+                    engine.name: cache.key(audio_hash, engine.name, engine.model, language)
+                    for engine in engines
+                }
+                cached = await cache.lookup(cache_keys)
+
+                if cached:
+                    method, row, transcription = cached
+                    await stream.publish({
+                        'start': 0.0,
+                        'end': audio_seconds,
+                        'segments': transcription.segments_between(),
+                        'words': transcription.words_between(),
+                    })
+                else:
+                    engine, transcription = await self.engines.transcribe(
+                        engines,
+                        str(audio_path),
+                        language,
+                        progress=scale_progress(progress, 30, 95),
+                        on_partial=writer
+                    )
+                    method = engine.name
+
+                logger.info(
+                    f"Transcription completed: {len(transcription.text)} chars, "
+                    f"{transcription.word_count} words"
                 )
 
-            logger.info(f"Transcription completed: {len(transcription.get('text', ''))} chars")
-
-            # Save to database
-            supabase.table('videos').update({
-                'transcription': transcription,
-                'status': 'ready'
-            }).eq('id', video_id).execute()
-
-            # Create processing job record
-            supabase.table('processing_jobs').insert({
-                'user_id': user_id,
-                'video_id': video_id,
-                'job_type': 'transcription',
-                'status': 'completed',
-                'progress': 100,
-                'completed_at': 'now()',
-                'metadata': {
-                    'word_count': len(transcription.get('text', '').split()),
-                    'language': language,
-                    'method': 'groq' if self.use_groq else 'whisper'
+                # Segments and word timings go to the transcript store;
+                # the videos row only keeps a summary
+                store = get_transcript_store()
+                if cached and row['video_id'] == video_id:
+                    summary = store.summarize(transcription, row['id'])
+                elif writer.transcript_id and not writer.fell_back:
+                    # Every segment was written as it was transcribed
+                    summary = await store.finish(
+                        writer.transcript_id,
+                        transcription,
+                        engine=method,
+                        cache_key=cache_keys[method]
+                    )
+                else:
+                    summary = await store.save(
+                        video_id,
+                        user_id,
+                        transcription,
+                        engine=method,
+                        cache_key=cache_keys[method]
+                    )
+
+                await get_batch_writer().update('videos', video_id, {
+                    'transcription': summary,
+                    'status': 'ready'
+                })
+
+                await stream.finish()
+
+                # Cleanup
+                if source:
+                    source.release()
+
+                return {
+                    'video_id': video_id,
+                    'transcription': transcription,
+                    'method': method,
+                    'cached': bool(cached),
+                    'status': 'completed'
                 }
-            }).execute()
-
-            # Cleanup
-            if audio_path and audio_path.exists():
-                audio_path.unlink()
-            if video_path and video_path.exists():
-                video_path.unlink()
-
-            return {
-                'video_id': video_id,
-                'transcription': transcription,
-                'status': 'completed'
-            }
 
-        except Exception as e:
-            logger.error(f"Transcription error: {str(e)}")
+            except Exception as e:
+                logger.error(f"Transcription error: {str(e)}")
+                await stream.finish(e)
 
-            # Update status to failed
-            supabase.table('videos').update({
-                'status': 'failed'
-            }).eq('id', video_id).execute()
+                # Never leave a transcript stuck at 'partial'
+                await writer.discard()
 
-            # Cleanup
-            if audio_path and audio_path.exists():
-                audio_path.unlink()
-            if video_path and video_path.exists():
-                video_path.unlink()
+                # Update status to failed
+                await get_batch_writer().update('videos', video_id, {
+                    'status': 'failed'
+                })
 
-            raise
-
-    async def _transcribe_with_groq(
-        self,
-        audio_path: Path,
-        language: str
-    ) -> Dict:
-        """Transcribe using Groq Whisper API (fast, cloud-based)"""
-        try:
-            client = Groq(api_key=self.groq_api_key)
-
-            with open(audio_path, 'rb') as audio_file:
-                response = client.audio.transcriptions.create(
-                    file=audio_file,
-                    model="whisper-large-v3",
-                    language=language,
-                    response_format="verbose_json",
-                    temperature=0.0
-                )
-
-            # Convert to our format
-            transcription = {
-                'text': response.text,
-                'language': response.language,
-                'duration': response.duration,
-                'segments': [
-                    {
-                        'id': idx,
-                        'start': segment.start,
-                        'end': segment.end,
-                        'text': segment.text,
-                    }
-                    for idx, segment in enumerate(response.segments or [])
-                ],
-                'words': [
-                    {
-                        'word': word.word,
-                        'start': word.start,
-                        'end': word.end,
-                    }
-                    for word in (response.words or [])
-                ] if hasattr(response, 'words') else []
-            }
-
-            return transcription
-
-        except Exception as e:
-            logger.error(f"Groq transcription error: {str(e)}")
-            raise
-
-    async def _transcribe_with_whisper(
-        self,
-        audio_path: Path,
-        language: str
-    ) -> Dict:
-        """Transcribe using local Whisper model (slower, offline)"""
-        try:
-            # Load model (can cache this)
-            model = whisper.load_model("base")
-
-            # Transcribe
-            result = model.transcribe(
-                str(audio_path),
-                language=language,
-                word_timestamps=True,
-                verbose=False
-            )
+                # Cleanup
+                if source:
+                    source.release()
 
-            # Format output
-            transcription = {
-                'text': result['text'],
-                'language': result['language'],
-                'duration': 0,  # Will be set from video metadata
-                'segments': [
-                    {
-                        'id': segment['id'],
-                        'start': segment['start'],
-                        'end': segment['end'],
-                        'text': segment['text'],
-                    }
-                    for segment in result['segments']
-                ],
-                'words': [
-                    {
-                        'word': word['word'],
-                        'start': word['start'],
-                        'end': word['end'],
-                    }
-                    for segment in result['segments']
-                    for word in segment.get('words', [])
-                ]
-            }
-
-            return transcription
-
-        except Exception as e:
-            logger.error(f"Whisper transcription error: {str(e)}")
-            raise
+                raise
@@ -0,0 +1,304 @@
+"""Stream multipart video uploads to disk without buffering them in memory"""
+
+import os
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+from multipart.multipart import MultipartParser, parse_options_header
+from .supabase_client import get_supabase_client
+from .executor import run_io
+from .metrics import metrics
+from .workspace import get_workspace_manager
+
+logger = logging.getLogger(__name__)
+
+# Hard cap for a single upload, whatever the user's remaining quota
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 10 * 1024 ** 3))
+
+# Allowance for multipart boundaries, part headers and small form fields
+# when comparing Content-Length against the limit
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+MAX_FIELD_BYTES = 4096
+
+
+class UploadTooLargeError(ValueError):
+    """Upload exceeds the user's remaining storage or MAX_UPLOAD_BYTES"""
+
+
+async def get_remaining_storage(user_id: str) -> int:
+    """Bytes left in the user's storage_limit"""
+    supabase = get_supabase_client()
+
+    query = supabase.table('profiles')\
+        .select('storage_used, storage_limit')\
+        .eq('id', user_id)\
+        .maybe_single()
+
+    result = await query.execute()
+
+    if not result or not result.data:
+        raise ValueError("User not found")
+
+    profile = result.data
+    return max(0, (profile.get('storage_limit') or 0) - (profile.get('storage_used') or 0))
+
+
+class _PartCollector:
+    """
+    MultipartParser callbacks
+
+    The parser calls these synchronously; file bytes are queued in
+    `pending` and written by the async loop in receive_video_upload.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.pending: List[bytes] = []
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.file_parts = 0
+        self.done = False
+
+        self._header_field = b''
+        self._header_value = b''
+        self._headers: Dict[bytes, bytes] = {}
+        self._field_name: Optional[str] = None
+        self._field_value = bytearray()
+        self._in_file = False
+
+    def callbacks(self) -> Dict:
+        return {
+            'on_part_begin': self.on_part_begin,
+            'on_header_field': self.on_header_field,
+            'on_header_value': self.on_header_value,
+            'on_header_end': self.on_header_end,
+            'on_headers_finished': self.on_headers_finished,
+            'on_part_data': self.on_part_data,
+            'on_part_end': self.on_part_end,
+            'on_end': self.on_end,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._field_name = None
+        self._field_value = bytearray()
+        self._in_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b''
+        self._header_value = b''
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(
+            self._headers.get(b'content-disposition', b'')
+        )
+        name = options.get(b'name', b'').decode(errors='replace')
+
+        if b'filename' not in options:
+            self._field_name = name
+            return
+
+        if name != 'file':
+            raise ValueError(f"Unexpected file field: {name}")
+
+        self.file_parts += 1
+        if self.file_parts > 1:
+            raise ValueError("Only one file per upload")
+
+        self._in_file = True
+        self.filename = Path(
+            options[b'filename'].decode(errors='replace')
+        ).name or 'upload'
+        self.content_type = self._headers.get(
+            b'content-type', b''
+        ).decode(errors='replace')
+
+        if not self.content_type.startswith('video/'):
+            raise ValueError("File must be a video")
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self.pending.append(data[start:end])
+        elif self._field_name is not None:
+            self._field_value += data[start:end]
+            if len(self._field_value) > MAX_FIELD_BYTES:
+                raise ValueError(f"Form field too large: {self._field_name}")
+
+    def on_part_end(self) -> None:
+        if self._field_name is not None:
+            self.fields[self._field_name] = self._field_value.decode(
+                errors='replace'
+            )
+        self._in_file = False
+
+    def on_end(self) -> None:
+        self.done = True
+
+
+class _UploadFile:
+    """Destination file and running hash, written from the I/O executor"""
+
+    def __init__(self, dest_dir: Path, suffix: str):
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=dest_dir)
+        self.file = os.fdopen(fd, 'wb')
+        self.path = path
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data: bytes) -> None:
+        self.file.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def discard(self) -> None:
+        self.file.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+async def receive_video_upload(
+    request,
+    dest_dir: Path,
+    user_id: Optional[str] = None
+) -> Dict:
+    """
+    Parse a multipart/form-data upload, streaming the file part to disk
+
+    Memory use is bounded by the size of one request chunk. The file is
+    hashed (SHA-256) as it is written. The upload is refused up front if
+    Content-Length is over the user's remaining storage, and aborted as
+    soon as the received bytes cross it.
+
+    The user can be given as an argument (query string) or as a `user_id`
+    form field. If that field comes after the file, the quota is only
+    known at the end and MAX_UPLOAD_BYTES bounds the stream until then.
+
+    Args:
+        request: Starlette request
+        dest_dir: Directory for the uploaded file
+        user_id: User ID, if known before reading the body
+
+    Returns:
+        Dictionary with user_id, file_path, filename, content_type, size
+        and sha256
+
+    Raises:
+        UploadTooLargeError: Upload exceeds the remaining storage
+        InsufficientDiskError: Upload would leave too little free disk
+        ValueError: Malformed request, missing file/user or non-video file
+    """
+    content_type, options = parse_options_header(
+        request.headers.get('content-type', '')
+    )
+    boundary = options.get(b'boundary')
+    if content_type != b'multipart/form-data' or not boundary:
+        raise ValueError("Expected multipart/form-data")
+
+    limit = MAX_UPLOAD_BYTES
+    quota_checked = False
+
+    async def apply_quota(uid: str) -> None:
+        nonlocal limit, quota_checked
+        limit = min(MAX_UPLOAD_BYTES, await get_remaining_storage(uid))
+        quota_checked = True
+
+    if user_id:
+        await apply_quota(user_id)
+
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit():
+        if int(content_length) > limit + MULTIPART_OVERHEAD_BYTES:
+            metrics.inc('uploads_rejected', reason='quota')
+            raise UploadTooLargeError(
+                f"Upload of {content_length} bytes exceeds remaining storage "
+                f"({limit} bytes)"
+            )
+        await run_io(get_workspace_manager().ensure_headroom, int(content_length))
+
+    collector = _PartCollector()
+    parser = MultipartParser(boundary, collector.callbacks())
+    upload: Optional[_UploadFile] = None
+
+    try:
+        async for chunk in request.stream():
+            if not chunk:
+                continue
+            parser.write(chunk)
+
+            if not collector.pending:
+                continue
+
+            if upload is None:
+                user_id = user_id or collector.fields.get('user_id')
+                if user_id and not quota_checked:
+                    await apply_quota(user_id)
+                upload = _UploadFile(
+                    dest_dir,
+                    Path(collector.filename).suffix or '.mp4'
+                )
+
+            data = b''.join(collector.pending)
+            collector.pending.clear()
+
+            if upload.size + len(data) > limit:
+                metrics.inc('uploads_rejected', reason='quota')
+                raise UploadTooLargeError(
+                    f"Upload exceeds remaining storage ({limit} bytes)"
+                )
+
+            await run_io(upload.write, data)
+            metrics.inc('upload_bytes_received', len(data))
+
+        parser.finalize()
+
+        if not collector.done:
+            raise ValueError("Incomplete multipart body")
+        if upload is None:
+            raise ValueError("No video file in upload")
+
+        user_id = user_id or collector.fields.get('user_id')
+        if not user_id:
+            raise ValueError("user_id is required")
+
+        if not quota_checked:
+            await apply_quota(user_id)
+            if upload.size > limit:
+                metrics.inc('uploads_rejected', reason='quota')
+                raise UploadTooLargeError(
+                    f"Upload exceeds remaining storage ({limit} bytes)"
+                )
+
+        await run_io(upload.close)
+
+    except BaseException:
+        # Also on disconnect/cancel, so no await here
+        if upload is not None:
+            upload.discard()
+        raise
+
+    logger.info(
+        f"Upload received: {collector.filename} ({upload.size} bytes) "
+        f"for user {user_id}"
+    )
+
+    return {
+        'user_id': user_id,
+        'file_path': upload.path,
+        'filename': collector.filename,
+        'content_type': collector.content_type,
+        'size': upload.size,
+        'sha256': upload.sha256.hexdigest(),
+    }
@@ -7,14 +7,60 @@ import ffmpeg
 from pathlib import Path
 from typing import Dict, Optional, Tuple
 from .supabase_client import get_supabase_client
+from .db_writer import get_batch_writer
+from .executor import run_io
+from .resource_governor import get_governor
+from .ffmpeg_runner import run_ffmpeg
+from .progress import ProgressCallback, scale_progress
+from .source_cache import get_source_cache, is_remote
+from .storage_io import get_storage_uploader
+from .workspace import get_workspace_manager
+from .transcript_store import get_transcript_store
+from .audio_chunks import PCM_SAMPLE_RATE
 
 logger = logging.getLogger(__name__)
 
+# 16 kHz mono speech audio for transcription: raw s16le that local Whisper
+# reads as-is, or a compact file for uploading to a remote engine
+SPEECH_AUDIO_OUTPUTS = {
+    'pcm': {'format': 's16le', 'acodec': 'pcm_s16le'},
+    'flac': {'format': 'flac', 'acodec': 'flac'},
+    'opus': {'format': 'ogg', 'acodec': 'libopus', 'audio_bitrate': '24k'},
+}
+
+# Columns returned by get_video_info unless a caller asks for others. The
+# transcription jsonb (every word with timestamps, megabytes for long
+# videos) is left out; see get_transcription
+VIDEO_INFO_COLUMNS = (
+    'id, user_id, title, description, file_path, thumbnail_path, duration, '
+    'file_size, mime_type, status, source_url, metadata, created_at, updated_at'
+)
+
 
 class VideoService:
     def __init__(self):
-        self.temp_dir = Path("/tmp/clipforge")
-        self.temp_dir.mkdir(exist_ok=True)
+        self.source_cache = get_source_cache()
+
+    def open_source(
+        self,
+        storage_path: str,
+        bucket: str = 'videos',
+        range_read: bool = False
+    ):
+        """
+        Async context manager yielding a local copy of a stored video
+
+        Served from the shared source cache; downloads only on a miss.
+        With range_read a miss yields a signed URL instead, for work
+        that only needs a small part of the video.
+        """
+        return self.source_cache.acquire(bucket, storage_path, range_read)
+
+    def _input(self, path, **options):
+        """ffmpeg.input() that seeks over HTTP for signed URLs"""
+        if is_remote(path):
+            options.update(seekable=1, multiple_requests=1, reconnect=1)
+        return ffmpeg.input(str(path), **options)
 
     def check_ffmpeg(self) -> bool:
         """Check if ffmpeg is available"""
@@ -28,27 +74,92 @@ class VideoService:
         except Exception:
             return False
 
-    async def get_video_info(self, video_id: str, user_id: str) -> Dict:
-        """Get video information from database"""
+    async def get_video_info(
+        self,
+        video_id: str,
+        user_id: str,
+        columns: str = VIDEO_INFO_COLUMNS
+    ) -> Dict:
+        """
+        Get video information from database
+
+        Args:
+            video_id: Video ID
+            user_id: User ID
+            columns: Columns to fetch, e.g. 'file_path, duration'
+
+        Returns:
+            The requested columns of the video row
+        """
         supabase = get_supabase_client()
 
-        result = supabase.table('videos')\
-            .select('*')\
+        query = supabase.table('videos')\
+            .select(columns)\
             .eq('id', video_id)\
             .eq('user_id', user_id)\
-            .maybeSingle()\
-            .execute()
+            .maybe_single()
+
+        result = await query.execute()
 
-        if not result.data:
+        if not result or not result.data:
             raise ValueError("Video not found")
 
         return result.data
 
+    async def get_transcription(
+        self,
+        video_id: str,
+        user_id: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None
+    ) -> Optional[Dict]:
+        """
+        Load a video's transcription, or None if it has none yet
+
+        Args:
+            video_id: Video ID
+            user_id: User ID
+            start: Only segments ending after this time (seconds)
+            end: Only segments starting before this time (seconds)
+        """
+        transcript = await get_transcript_store().get(video_id, user_id, start, end)
+        if transcript is not None:
+            return transcript
+
+        # Transcribed before the transcript store: the full blob is still
+        # on the videos row
+        video = await self.get_video_info(video_id, user_id, 'transcription')
+        return video.get('transcription')
+
+    async def get_transcription_text(self, video_id: str, user_id: str) -> Optional[str]:
+        """
+        Load the full text of a video's finished transcription
+
+        The text is rebuilt from transcript_segments; videos.transcription
+        only holds a summary.
+
+        Returns:
+            Transcript text, or None if the video has not been transcribed
+        """
+        text = await get_transcript_store().get_text(video_id, user_id)
+        if text is not None:
+            return text
+
+        # Transcribed before the transcript store: the text is still in
+        # the videos row
+        video = await self.get_video_info(
+            video_id,
+            user_id,
+            'transcription_text:transcription->>text'
+        )
+        return video.get('transcription_text')
+
     async def process_uploaded_video(
         self,
         file_path: str,
         user_id: str,
-        filename: str
+        filename: str,
+        sha256: Optional[str] = None
     ) -> Dict:
         """
         Process uploaded video file
@@ -63,7 +174,7 @@ class VideoService:
 
         try:
             # Get video metadata using ffprobe
-            metadata = self._get_video_metadata(file_path)
+            metadata = await run_io(self._get_video_metadata, file_path)
             file_size = Path(file_path).stat().st_size
 
             # Create database record
@@ -80,39 +191,39 @@ class VideoService:
                     'height': metadata.get('height'),
                     'codec': metadata.get('codec_name'),
                     'bit_rate': metadata.get('bit_rate'),
+                    'sha256': sha256,
                 }
             }
 
-            result = supabase.table('videos').insert(video_data).execute()
+            result = await supabase.table('videos').insert(video_data).execute()
             video_id = result.data[0]['id']
 
             # Upload to Supabase Storage
             storage_path = f"{user_id}/videos/{video_id}.mp4"
 
-            with open(file_path, 'rb') as f:
-                supabase.storage.from_('videos').upload(
-                    storage_path,
-                    f,
-                    file_options={"content-type": "video/mp4"}
-                )
+            await self._upload_to_storage(
+                file_path,
+                storage_path,
+                "video/mp4"
+            )
 
-            # Generate and upload thumbnail
-            thumbnail_path = await self.generate_thumbnail(
+            # Generate and upload thumbnail from the local file
+            thumbnail_path = await self._render_thumbnail(
+                file_path,
                 video_id,
                 user_id,
                 timestamp=int(metadata.get('duration', 30) / 2)
             )
 
             # Update database
-            supabase.table('videos').update({
+            await get_batch_writer().update('videos', video_id, {
                 'file_path': storage_path,
                 'thumbnail_path': thumbnail_path,
                 'status': 'ready'
-            }).eq('id', video_id).execute()
+            })
 
-            # Cleanup temp file
-            if os.path.exists(file_path):
-                os.unlink(file_path)
+            # Keep the bytes for later stages instead of deleting them
+            await self.source_cache.adopt('videos', storage_path, file_path)
 
             return {
                 'video_id': video_id,
@@ -123,9 +234,9 @@ class VideoService:
             logger.error(f"Error processing video: {str(e)}")
 
             if video_id:
-                supabase.table('videos').update({
+                await get_batch_writer().update('videos', video_id, {
                     'status': 'failed'
-                }).eq('id', video_id).execute()
+                })
 
             if os.path.exists(file_path):
                 os.unlink(file_path)
@@ -174,82 +285,89 @@ class VideoService:
         Returns:
             Path to uploaded thumbnail in storage
         """
-        supabase = get_supabase_client()
-        temp_thumb = None
-
         try:
             # Get video file
-            video_info = await self.get_video_info(video_id, user_id)
-            video_path = self._download_from_storage(
-                video_info['file_path'],
-                'videos'
-            )
-
-            # Generate thumbnail
-            temp_thumb = self.temp_dir / f"{video_id}_thumb.jpg"
+            video_info = await self.get_video_info(video_id, user_id, 'file_path')
 
-            (
-                ffmpeg
-                .input(str(video_path), ss=timestamp)
-                .filter('scale', 1280, -1)
-                .output(str(temp_thumb), vframes=1, format='image2')
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
-            )
-
-            # Upload to storage
-            storage_path = f"{user_id}/thumbnails/{video_id}.jpg"
-
-            with open(temp_thumb, 'rb') as f:
-                supabase.storage.from_('videos').upload(
-                    storage_path,
-                    f,
-                    file_options={"content-type": "image/jpeg"}
+            # One frame: seek over HTTP rather than download the source
+            async with self.open_source(
+                video_info['file_path'],
+                range_read=True
+            ) as video_path:
+                return await self._render_thumbnail(
+                    video_path,
+                    video_id,
+                    user_id,
+                    timestamp
                 )
 
-            # Cleanup
-            if video_path.exists():
-                video_path.unlink()
-            if temp_thumb.exists():
-                temp_thumb.unlink()
-
-            return storage_path
-
         except Exception as e:
             logger.error(f"Error generating thumbnail: {str(e)}")
+            raise
 
-            if temp_thumb and temp_thumb.exists():
-                temp_thumb.unlink()
+    async def _render_thumbnail(
+        self,
+        video_path,
+        video_id: str,
+        user_id: str,
+        timestamp: int
+    ) -> str:
+        """Extract a frame from a local video and upload it as the thumbnail"""
+        storage_path = f"{user_id}/thumbnails/{video_id}.jpg"
+        await self.render_frame(video_path, storage_path, timestamp)
+        return storage_path
 
-            raise
+    async def render_frame(
+        self,
+        video_path,
+        storage_path: str,
+        timestamp: float
+    ) -> None:
+        """
+        Encode one frame as JPEG straight into storage
+
+        The JPEG is read from ffmpeg's stdout; no temp file is written.
+        """
+        stream = (
+            self._input(video_path, ss=timestamp)
+            .filter('scale', 1280, -1)
+            .output('pipe:', vframes=1, format='image2pipe', vcodec='mjpeg')
+        )
+        async with get_governor().slot('decode'):
+            data = await run_ffmpeg(stream)
+
+        if not data:
+            raise ValueError(f"No frame at {timestamp}s")
+
+        async with get_governor().slot('upload'):
+            await get_storage_uploader().upload_bytes(
+                data,
+                'videos',
+                storage_path,
+                'image/jpeg'
+            )
 
     async def transcode_video(
         self,
         video_id: str,
         user_id: str,
         output_format: str = "mp4",
-        resolution: str = "1080p"
+        resolution: str = "1080p",
+        progress: Optional[ProgressCallback] = None
     ) -> Dict:
         """
         Transcode video to different format/resolution
 
         Supported resolutions: 480p, 720p, 1080p, 1440p, 4k
         """
-        supabase = get_supabase_client()
-
         try:
             # Get video info
-            video_info = await self.get_video_info(video_id, user_id)
-
-            # Download video
-            video_path = self._download_from_storage(
-                video_info['file_path'],
-                'videos'
+            video_info = await self.get_video_info(
+                video_id,
+                user_id,
+                'file_path, duration'
             )
 
-            # Transcode
-            output_path = self.temp_dir / f"{video_id}_transcoded.{output_format}"
-
             # Resolution mapping
             resolution_map = {
                 '480p': (854, 480),
@@ -261,37 +379,29 @@ class VideoService:
 
             width, height = resolution_map.get(resolution, (1920, 1080))
 
-            (
-                ffmpeg
-                .input(str(video_path))
-                .filter('scale', width, height)
-                .output(
-                    str(output_path),
-                    vcodec='libx264',
-                    acodec='aac',
-                    preset='medium',
-                    crf=23
-                )
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
-            )
-
-            # Upload transcoded video
             storage_path = f"{user_id}/transcoded/{video_id}_{resolution}.{output_format}"
 
-            with open(output_path, 'rb') as f:
-                supabase.storage.from_('videos').upload(
+            # Transcode and upload
+            async with self.open_source(video_info['file_path']) as video_path:
+                source = (
+                    ffmpeg
+                    .input(str(video_path))
+                    .filter('scale', width, height)
+                )
+                await self.encode_to_storage(
+                    source,
                     storage_path,
-                    f,
-                    file_options={"content-type": f"video/{output_format}"}
+                    output_format,
+                    {
+                        'vcodec': 'libx264',
+                        'acodec': 'aac',
+                        'preset': 'medium',
+                        'crf': 23,
+                    },
+                    duration=video_info.get('duration'),
+                    progress=scale_progress(progress, 0, 95)
                 )
 
-            # Cleanup
-            if video_path.exists():
-                video_path.unlink()
-            if output_path.exists():
-                output_path.unlink()
-
             return {
                 'transcoded_path': storage_path,
                 'format': output_format,
@@ -302,29 +412,46 @@ class VideoService:
             logger.error(f"Error transcoding video: {str(e)}")
             raise
 
-    def extract_audio(self, video_path: str, output_path: str) -> str:
+    async def extract_audio(
+        self,
+        video_path: str,
+        output_path: str,
+        duration: Optional[float] = None,
+        progress: Optional[ProgressCallback] = None,
+        codec: str = 'mp3'
+    ) -> str:
         """
         Extract audio from video
 
         Args:
             video_path: Input video file
             output_path: Output audio file
+            duration: Source duration in seconds, for progress percentages
+            progress: Progress callback
+            codec: 'mp3', or a speech encoding from SPEECH_AUDIO_OUTPUTS:
+                'pcm' (raw Whisper input), 'flac' or 'opus'
 
         Returns:
             Path to extracted audio
         """
+        if codec == 'mp3':
+            options = {'acodec': 'libmp3lame', 'audio_bitrate': '192k'}
+        else:
+            options = {
+                **SPEECH_AUDIO_OUTPUTS[codec],
+                'ac': 1,
+                'ar': PCM_SAMPLE_RATE,
+            }
+
         try:
-            (
+            stream = (
                 ffmpeg
                 .input(video_path)
-                .output(
-                    output_path,
-                    acodec='libmp3lame',
-                    audio_bitrate='192k'
-                )
+                .output(output_path, vn=None, **options)
                 .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
             )
+            async with get_governor().slot('decode'):
+                await run_ffmpeg(stream, duration=duration, progress=progress)
 
             return output_path
 
@@ -332,61 +459,145 @@ class VideoService:
             logger.error(f"FFmpeg error: {e.stderr.decode()}")
             raise
 
-    def cut_video(
+    async def encode_speech(
         self,
-        input_path: str,
-        output_path: str,
-        start_time: int,
-        end_time: int
-    ) -> str:
+        pcm_path: str,
+        start: float,
+        duration: float,
+        codec: str = 'flac'
+    ) -> bytes:
         """
-        Cut video segment
+        Encode part of a 16 kHz mono PCM file for upload, in memory
 
         Args:
-            input_path: Input video file
-            output_path: Output video file
-            start_time: Start time in seconds
-            end_time: End time in seconds
+            pcm_path: s16le file written by extract_audio(codec='pcm')
+            start: Start of the range in seconds
+            duration: Length of the range in seconds
+            codec: 'flac' or 'opus'
 
         Returns:
-            Path to cut video
+            The encoded file
         """
         try:
-            duration = end_time - start_time
-
-            (
+            stream = (
                 ffmpeg
-                .input(input_path, ss=start_time, t=duration)
-                .output(
-                    output_path,
-                    vcodec='libx264',
-                    acodec='aac',
-                    preset='fast'
-                )
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
+                .input(pcm_path, format='s16le', ar=PCM_SAMPLE_RATE, ac=1, ss=start, t=duration)
+                .output('pipe:', **SPEECH_AUDIO_OUTPUTS[codec])
             )
-
-            return output_path
+            async with get_governor().slot('decode'):
+                return await run_ffmpeg(stream)
 
         except ffmpeg.Error as e:
             logger.error(f"FFmpeg error: {e.stderr.decode()}")
             raise
 
-    def _download_from_storage(
+    async def cut_to_storage(
         self,
+        input_path: str,
         storage_path: str,
-        bucket: str = 'videos'
-    ) -> Path:
-        """Download file from Supabase storage to temp directory"""
-        supabase = get_supabase_client()
+        start_time: int,
+        end_time: int,
+        output_format: str = "mp4",
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict:
+        """
+        Cut a video segment and store it at storage_path
 
-        filename = Path(storage_path).name
-        local_path = self.temp_dir / filename
+        Args:
+            input_path: Input video file or signed URL
+            storage_path: Destination in the videos bucket
+            start_time: Start time in seconds
+            end_time: End time in seconds
+            output_format: Output container
+            progress: Progress callback
 
-        data = supabase.storage.from_(bucket).download(storage_path)
+        Returns:
+            Upload info (size, parts, method)
+        """
+        duration = end_time - start_time
+
+        return await self.encode_to_storage(
+            self._input(input_path, ss=start_time, t=duration),
+            storage_path,
+            output_format,
+            {'vcodec': 'libx264', 'acodec': 'aac', 'preset': 'fast'},
+            duration=duration,
+            progress=progress
+        )
+
+    async def encode_to_storage(
+        self,
+        source,
+        storage_path: str,
+        output_format: str,
+        output_options: Dict,
+        duration: Optional[float] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict:
+        """
+        Encode an ffmpeg-python input/filter chain into storage
 
-        with open(local_path, 'wb') as f:
-            f.write(data)
+        MP4 is written to a pipe as fragmented MP4 and uploaded part by
+        part while ffmpeg is encoding, so the output never touches local
+        disk. That needs multipart uploads (S3 access keys); otherwise,
+        and for other containers, the output goes through a temp file.
 
-        return local_path
+        Returns:
+            Upload info (size, parts, method)
+        """
+        uploader = get_storage_uploader()
+        content_type = f"video/{output_format}"
+
+        if output_format == 'mp4' and uploader.multipart_enabled:
+            stream = source.output(
+                'pipe:',
+                format='mp4',
+                movflags='frag_keyframe+empty_moov+default_base_moof',
+                **output_options
+            )
+            upload = uploader.open_stream('videos', storage_path, content_type)
+
+            try:
+                async with get_governor().slot('encode'), get_governor().slot('upload'):
+                    await run_ffmpeg(
+                        stream,
+                        duration=duration,
+                        progress=progress,
+                        stdout_consumer=upload.write_from
+                    )
+                    return await upload.commit()
+
+            except BaseException:
+                await upload.abort()
+                raise
+
+        async with get_workspace_manager().workspace('encode') as workspace:
+            output_path = workspace.file(f"output.{output_format}")
+
+            stream = source.output(str(output_path), **output_options).overwrite_output()
+            async with get_governor().slot('encode'):
+                await run_ffmpeg(stream, duration=duration, progress=progress)
+
+            await self._upload_to_storage(output_path, storage_path, content_type)
+            return {'size': output_path.stat().st_size, 'method': 'file'}
+
+    async def _upload_to_storage(
+        self,
+        file_path,
+        storage_path: str,
+        content_type: str,
+        bucket: str = 'videos'
+    ) -> None:
+        """
+        Upload a local file to Supabase storage
+
+        Large files are sent as concurrent multipart parts, see
+        StorageUploader.
+        """
+        async with get_governor().slot('upload'):
+            await get_storage_uploader().upload_file(
+                file_path,
+                bucket,
+                storage_path,
+                content_type
+            )
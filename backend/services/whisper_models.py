@@ -0,0 +1,299 @@
+"""Whisper models kept loaded inside the transcription processes"""
+
+import os
+import gc
+import time
+import logging
+import threading
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Dict, List, Optional
+from .audio_chunks import read_pcm
+
+logger = logging.getLogger(__name__)
+
+# Model used for local transcription
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+
+# Models loaded when a transcription process starts and kept while idle
+WHISPER_WARM_MODELS = [
+    name.strip()
+    for name in os.getenv("WHISPER_WARM_MODELS", WHISPER_MODEL).split(",")
+    if name.strip()
+]
+
+# Other models are dropped after this many idle seconds
+WHISPER_IDLE_TTL = float(os.getenv("WHISPER_IDLE_TTL", 900))
+
+# Below this much available memory, idle models are dropped (warm ones last)
+WHISPER_MIN_AVAILABLE_BYTES = int(os.getenv(
+    "WHISPER_MIN_AVAILABLE_BYTES",
+    1024 * 1024 * 1024
+))
+
+# How often an idle transcription process checks for models to drop
+WHISPER_EVICT_INTERVAL = float(os.getenv("WHISPER_EVICT_INTERVAL", 60))
+
+
+def available_memory_bytes() -> int:
+    """MemAvailable from /proc/meminfo, or free physical pages elsewhere"""
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return WHISPER_MIN_AVAILABLE_BYTES
+
+
+def _resident_bytes(model: Any) -> int:
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for tensor in chain(model.parameters(), model.buffers())
+    )
+
+
+class _LoadedModel:
+    def __init__(self, model: Any, load_seconds: float):
+        self.model = model
+        self.load_seconds = load_seconds
+        self.resident_bytes = _resident_bytes(model)
+        self.last_used = time.monotonic()
+        self.uses = 0
+        self.in_use = 0
+
+
+class WhisperModelRegistry:
+    """
+    Load each Whisper model once per process and reuse it across jobs
+
+    Models in `warm` are loaded up front and kept; others are dropped
+    after `idle_ttl` seconds unused. When available memory falls below
+    `min_available_bytes`, idle models are dropped one at a time, least
+    recently used first and warm ones last, before another model is
+    loaded.
+    """
+
+    def __init__(
+        self,
+        warm: Optional[List[str]] = None,
+        idle_ttl: float = WHISPER_IDLE_TTL,
+        min_available_bytes: int = WHISPER_MIN_AVAILABLE_BYTES
+    ):
+        self.warm = list(WHISPER_WARM_MODELS if warm is None else warm)
+        self.idle_ttl = idle_ttl
+        self.min_available_bytes = min_available_bytes
+        self._models: "OrderedDict[str, _LoadedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def acquire(self, name: str) -> _LoadedModel:
+        """
+        Get a loaded model, loading it on first use
+
+        Call release() when done so it can be dropped again.
+
+        Raises:
+            ValueError: If the model name is unknown
+        """
+        import whisper
+
+        with self._lock:
+            loaded = self._models.get(name)
+            if loaded is not None:
+                self._models.move_to_end(name)
+                self.hits += 1
+                loaded.in_use += 1
+                return loaded
+
+        if name not in whisper.available_models():
+            raise ValueError(f"Unknown Whisper model: {name}")
+
+        self.evict(keep=name)
+
+        started = time.monotonic()
+        model = whisper.load_model(name)
+        loaded = _LoadedModel(model, time.monotonic() - started)
+
+        logger.info(
+            f"Loaded Whisper model {name} in {loaded.load_seconds:.1f}s "
+            f"({loaded.resident_bytes / 1024 ** 2:.0f} MiB)"
+        )
+
+        with self._lock:
+            self._models[name] = loaded
+            self.loads += 1
+            loaded.in_use += 1
+
+        return loaded
+
+    def release(self, name: str) -> None:
+        with self._lock:
+            loaded = self._models.get(name)
+            if loaded is not None:
+                loaded.in_use -= 1
+                loaded.uses += 1
+                loaded.last_used = time.monotonic()
+
+    def warm_up(self) -> None:
+        """Load the warm set"""
+        for name in self.warm:
+            try:
+                self.acquire(name)
+                self.release(name)
+            except Exception as e:
+                logger.error(f"Could not preload Whisper model {name}: {str(e)}")
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Drop models idle past their TTL, and idle models while memory is low
+
+        Returns:
+            Names of the dropped models
+        """
+        now = time.monotonic()
+        dropped = []
+
+        with self._lock:
+            # Names only: a loop variable holding a model would keep it alive
+            expired = [
+                name for name, loaded in self._models.items()
+                if name != keep
+                and name not in self.warm
+                and not loaded.in_use
+                and now - loaded.last_used > self.idle_ttl
+            ]
+            for name in expired:
+                del self._models[name]
+                dropped.append(name)
+
+            if dropped:
+                gc.collect()
+
+            # One at a time, least recently used first, freeing each before
+            # memory is measured again; warm models only when nothing else
+            # is left
+            while available_memory_bytes() < self.min_available_bytes:
+                idle = [
+                    name for name, loaded in self._models.items()
+                    if name != keep and not loaded.in_use
+                ]
+                if not idle:
+                    break
+
+                name = next((name for name in idle if name not in self.warm), idle[0])
+                del self._models[name]
+                dropped.append(name)
+                gc.collect()
+
+            self.evictions += len(dropped)
+
+        if dropped:
+            logger.info(f"Dropped idle Whisper models: {', '.join(dropped)}")
+
+        return dropped
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'loads': self.loads,
+                'hits': self.hits,
+                'evictions': self.evictions,
+                'available_memory_bytes': available_memory_bytes(),
+                'models': {
+                    name: {
+                        'load_seconds': round(loaded.load_seconds, 3),
+                        'resident_bytes': loaded.resident_bytes,
+                        'uses': loaded.uses,
+                        'idle_seconds': round(time.monotonic() - loaded.last_used, 1),
+                    }
+                    for name, loaded in self._models.items()
+                },
+            }
+
+
+_registry: WhisperModelRegistry | None = None
+
+
+def get_model_registry() -> WhisperModelRegistry:
+    """Get or create this process's WhisperModelRegistry"""
+    global _registry
+
+    if _registry is None:
+        _registry = WhisperModelRegistry()
+
+    return _registry
+
+
+def init_transcription_process(processes: int = 1) -> None:
+    """
+    Initializer of the transcription process pool
+
+    Splits the CPU cores between the pool's processes, loads the warm
+    models and starts a thread that drops idle ones.
+    """
+    try:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // processes))
+    except ImportError:
+        pass
+
+    registry = get_model_registry()
+    registry.warm_up()
+
+    def evict_loop() -> None:
+        while True:
+            time.sleep(WHISPER_EVICT_INTERVAL)
+            registry.evict()
+
+    threading.Thread(target=evict_loop, name="whisper-evict", daemon=True).start()
+
+
+def transcribe(
+    model_name: str,
+    pcm_path: str,
+    language: str,
+    start: Optional[float] = None,
+    duration: Optional[float] = None
+) -> Dict:
+    """
+    Transcribe with a registry model (runs in the transcription pool)
+
+    `pcm_path` is 16 kHz mono s16le, Whisper's own input format, so it is
+    memory-mapped rather than decoded again. With `start` and `duration`
+    only that range is read; times in the result are relative to `start`.
+
+    Returns:
+        {'result': Whisper's output, 'load_seconds': time spent loading
+        the model for this call (0 when it was warm), 'inference_seconds',
+        'pid' and 'registry': stats}
+    """
+    registry = get_model_registry()
+    loads_before = registry.loads
+
+    loaded = registry.acquire(model_name)
+    started = time.monotonic()
+    try:
+        result = loaded.model.transcribe(
+            read_pcm(pcm_path, start, duration),
+            language=language,
+            word_timestamps=True,
+            verbose=False
+        )
+    finally:
+        registry.release(model_name)
+
+    return {
+        'result': result,
+        'load_seconds': loaded.load_seconds if registry.loads > loads_before else 0.0,
+        'inference_seconds': time.monotonic() - started,
+        'pid': os.getpid(),
+        'registry': registry.stats(),
+    }
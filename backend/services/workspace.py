@@ -0,0 +1,277 @@
+"""Private per-job scratch directories with disk headroom checks"""
+
+import os
+import re
+import fcntl
+import shutil
+import logging
+import secrets
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict
+from .executor import run_io
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_DIR = Path(os.getenv("WORKSPACE_DIR", "/tmp/clipforge/work"))
+
+# Files handed from the API to workers (uploads awaiting their job); kept
+# outside WORKSPACE_DIR, orphan cleanup only deletes them once expired
+INCOMING_DIR = Path(os.getenv("INCOMING_DIR", "/tmp/clipforge/incoming"))
+
+# Seconds before an incoming file whose job never picked it up is deleted
+INCOMING_FILE_TTL = int(os.getenv("INCOMING_FILE_TTL", 24 * 3600))
+
+WORKSPACE_MIN_FREE_BYTES = int(os.getenv("WORKSPACE_MIN_FREE_BYTES", 2 * 1024 ** 3))
+
+_WORKSPACE_NAME = re.compile(r'^(\d+)-')
+
+# Held with flock by the process using the workspace; pids are reused
+# (containers restart as pid 1), a lock dies with its process
+_LOCK_FILE = '.lock'
+
+# A `.`-prefixed staging directory is only unlocked for the moment between
+# mkdir and flock in _create; older than this, its process is gone
+_STAGING_GRACE_SECONDS = 60
+
+
+class InsufficientDiskError(RuntimeError):
+    """Not enough free disk to start new work"""
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class Workspace:
+    """A private directory for one job's intermediate files"""
+
+    def __init__(self, path: Path, label: str):
+        self.path = path
+        self.label = label
+
+    def file(self, name: str) -> Path:
+        """Path for a file inside the workspace"""
+        return self.path / Path(name).name
+
+    def bytes_used(self) -> int:
+        return _dir_size(self.path)
+
+
+class WorkspaceManager:
+    """
+    Hand out private scratch directories and keep the disk healthy
+
+    Each workspace is `{pid}-{label}-{random}` under the root, so two jobs
+    on the same video never share file names, and holds an flock on its
+    lock file while in use. Workspaces are removed when the job ends;
+    those whose lock nobody holds were left behind by a crashed process
+    and are removed when the next manager starts, together with stale
+    staging directories and incoming files older than `incoming_ttl`.
+    New work is refused while free space would drop below `min_free_bytes`.
+    """
+
+    def __init__(
+        self,
+        root: Path = WORKSPACE_DIR,
+        min_free_bytes: int = WORKSPACE_MIN_FREE_BYTES,
+        incoming_dir: Path = INCOMING_DIR,
+        incoming_ttl: int = INCOMING_FILE_TTL
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.incoming_dir = Path(incoming_dir)
+        self.incoming_dir.mkdir(parents=True, exist_ok=True)
+        self.min_free_bytes = min_free_bytes
+        self.incoming_ttl = incoming_ttl
+        self._active: Dict[str, Workspace] = {}
+        self.cleanup_orphans()
+
+    def cleanup_orphans(self) -> int:
+        """
+        Remove what crashed processes left behind
+
+        - Workspaces whose lock no process holds
+        - Staging directories of workspaces whose process died before
+          renaming them
+        - Incoming files older than incoming_ttl, whose job never ran
+
+        Returns:
+            Number of workspaces, staging directories and files removed
+        """
+        removed = 0
+        staging_cutoff = time.time() - _STAGING_GRACE_SECONDS
+
+        for path in self.root.iterdir():
+            staging = path.name.startswith('.')
+            name = path.name[1:] if staging else path.name
+            if not _WORKSPACE_NAME.match(name) or not path.is_dir():
+                continue
+
+            try:
+                if staging and path.stat().st_mtime > staging_cutoff:
+                    continue
+            except FileNotFoundError:
+                # Renamed by its process in the meantime
+                continue
+
+            if self._remove_unlocked(path):
+                removed += 1
+
+        if removed:
+            logger.info(f"Removed {removed} orphaned workspaces")
+            metrics.inc('workspace_orphans_removed', removed)
+
+        expired = self._cleanup_incoming()
+        if expired:
+            logger.info(f"Removed {expired} expired incoming files")
+            metrics.inc('incoming_files_expired', expired)
+
+        return removed + expired
+
+    @staticmethod
+    def _remove_unlocked(path: Path) -> bool:
+        """Remove a workspace directory unless its lock is held"""
+        try:
+            fd = os.open(path / _LOCK_FILE, os.O_RDWR)
+        except FileNotFoundError:
+            # Workspaces are only visible once locked: no lock file
+            # means one from before workspaces were locked
+            fd = None
+
+        try:
+            if fd is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+
+            shutil.rmtree(path, ignore_errors=True)
+            return True
+
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def _cleanup_incoming(self) -> int:
+        """Delete incoming files not modified within incoming_ttl"""
+        removed = 0
+        cutoff = time.time() - self.incoming_ttl
+
+        for path in self.incoming_dir.iterdir():
+            try:
+                # Uploads still being received are written to, so their
+                # mtime stays recent
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                # Picked up by its job in the meantime
+                continue
+
+        return removed
+
+    def _create(self, name: str) -> int:
+        """
+        Create a workspace directory and lock it
+
+        Returns:
+            Descriptor holding the lock; closing it releases the workspace
+        """
+        staging = self.root / f".{name}"
+        staging.mkdir()
+        fd = os.open(staging / _LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        # Renamed once locked, so cleanup_orphans never sees it unlocked
+        staging.rename(self.root / name)
+        return fd
+
+    def free_bytes(self) -> int:
+        return shutil.disk_usage(self.root).free
+
+    def ensure_headroom(self, expected_bytes: int = 0) -> None:
+        """
+        Raise if writing expected_bytes would leave too little free disk
+
+        Raises:
+            InsufficientDiskError: Free space below the headroom
+        """
+        free = self.free_bytes()
+        if free - expected_bytes < self.min_free_bytes:
+            metrics.inc('workspace_refused')
+            raise InsufficientDiskError(
+                f"Not enough disk space: {free} bytes free, {expected_bytes} "
+                f"needed, {self.min_free_bytes} reserved"
+            )
+
+    @asynccontextmanager
+    async def workspace(
+        self,
+        label: str,
+        expected_bytes: int = 0
+    ) -> AsyncIterator[Workspace]:
+        """
+        Create a private directory for the duration of a block
+
+        Usage:
+            async with get_workspace_manager().workspace(f"transcribe-{video_id}") as ws:
+                audio_path = ws.file('audio.mp3')
+
+        Args:
+            label: Readable part of the directory name
+            expected_bytes: Disk the job is expected to need
+
+        Raises:
+            InsufficientDiskError: Free space below the headroom
+        """
+        await run_io(self.ensure_headroom, expected_bytes)
+
+        safe_label = re.sub(r'[^A-Za-z0-9_.-]', '_', label)[:64]
+        name = f"{os.getpid()}-{safe_label}-{secrets.token_hex(4)}"
+        workspace = Workspace(self.root / name, label)
+        lock_fd = self._create(name)
+
+        self._active[name] = workspace
+        metrics.set_gauge('workspaces_active', len(self._active))
+
+        try:
+            yield workspace
+
+        finally:
+            del self._active[name]
+            metrics.set_gauge('workspaces_active', len(self._active))
+
+            used = await run_io(workspace.bytes_used)
+            metrics.observe('workspace_bytes', used)
+            await run_io(shutil.rmtree, workspace.path, True)
+            os.close(lock_fd)
+
+    def stats(self) -> Dict:
+        return {
+            'active': len(self._active),
+            'bytes_used': sum(ws.bytes_used() for ws in self._active.values()),
+            'free_bytes': self.free_bytes(),
+            'min_free_bytes': self.min_free_bytes,
+        }
+
+
+_workspace_manager: WorkspaceManager | None = None
+
+
+def get_workspace_manager() -> WorkspaceManager:
+    """Get or create WorkspaceManager singleton"""
+    global _workspace_manager
+
+    if _workspace_manager is None:
+        _workspace_manager = WorkspaceManager()
+
+    return _workspace_manager
@@ -1,20 +1,23 @@
 """YouTube video download and processing using yt-dlp"""
 
 import os
+import asyncio
 import logging
 import yt_dlp
-from pathlib import Path
 from typing import Dict, Optional
 from .supabase_client import get_supabase_client
+from .db_writer import get_batch_writer
+from .executor import run_io
+from .resource_governor import get_governor
+from .source_cache import get_source_cache
+from .storage_io import get_storage_uploader
+from .workspace import get_workspace_manager
+from .progress import ProgressCallback, scale_progress
 
 logger = logging.getLogger(__name__)
 
 
 class YouTubeService:
-    def __init__(self):
-        self.temp_dir = Path("/tmp/clipforge")
-        self.temp_dir.mkdir(exist_ok=True)
-
     def check_availability(self) -> bool:
         """Check if yt-dlp is available"""
         try:
@@ -40,146 +43,196 @@ class YouTubeService:
                 'extract_flat': False,
             }
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
+            info = await run_io(self._extract_info, url, ydl_opts, False)
 
-                return {
-                    'title': info.get('title'),
-                    'description': info.get('description'),
-                    'duration': info.get('duration'),
-                    'thumbnail': info.get('thumbnail'),
-                    'uploader': info.get('uploader'),
-                    'upload_date': info.get('upload_date'),
-                    'view_count': info.get('view_count'),
-                    'like_count': info.get('like_count'),
-                    'channel': info.get('channel'),
-                    'channel_url': info.get('channel_url'),
-                    'formats': [
-                        {
-                            'format_id': f.get('format_id'),
-                            'ext': f.get('ext'),
-                            'resolution': f.get('resolution'),
-                            'filesize': f.get('filesize'),
-                        }
-                        for f in info.get('formats', [])
-                        if f.get('vcodec') != 'none' and f.get('acodec') != 'none'
-                    ][:5]  # Top 5 formats
-                }
+            return {
+                'title': info.get('title'),
+                'description': info.get('description'),
+                'duration': info.get('duration'),
+                'thumbnail': info.get('thumbnail'),
+                'uploader': info.get('uploader'),
+                'upload_date': info.get('upload_date'),
+                'view_count': info.get('view_count'),
+                'like_count': info.get('like_count'),
+                'channel': info.get('channel'),
+                'channel_url': info.get('channel_url'),
+                'formats': [
+                    {
+                        'format_id': f.get('format_id'),
+                        'ext': f.get('ext'),
+                        'resolution': f.get('resolution'),
+                        'filesize': f.get('filesize'),
+                    }
+                    for f in info.get('formats', [])
+                    if f.get('vcodec') != 'none' and f.get('acodec') != 'none'
+                ][:5]  # Top 5 formats
+            }
 
         except Exception as e:
             logger.error(f"Error getting video info: {str(e)}")
             raise
 
-    async def import_video(self, url: str, user_id: str) -> Dict:
+    async def import_video(
+        self,
+        url: str,
+        user_id: str,
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict:
         """
         Download video from YouTube and upload to Supabase
 
         Args:
             url: YouTube video URL
             user_id: User ID for database record
+            progress: Progress callback
 
         Returns:
-            Dictionary with video_id and status
+            Dictionary with video_id, file_path, duration and status
         """
-        supabase = get_supabase_client()
-        video_path = None
-        video_id = None
-
-        try:
-            # Get video info first
-            info = await self.get_video_info(url)
-            logger.info(f"Downloading: {info['title']}")
-
-            # Configure download options
-            output_template = str(self.temp_dir / '%(id)s.%(ext)s')
-            ydl_opts = {
-                'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
-                'outtmpl': output_template,
-                'quiet': False,
-                'no_warnings': False,
-                'merge_output_format': 'mp4',
-            }
+        async with get_workspace_manager().workspace('youtube-import') as workspace:
+            supabase = get_supabase_client()
+            video_id = None
+
+            try:
+                # Get video info first
+                info = await self.get_video_info(url)
+                logger.info(f"Downloading: {info['title']}")
+
+                # Configure download options
+                output_template = str(workspace.path / '%(id)s.%(ext)s')
+                ydl_opts = {
+                    'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+                    'outtmpl': output_template,
+                    'quiet': False,
+                    'no_warnings': False,
+                    'merge_output_format': 'mp4',
+                    'progress_hooks': [
+                        self._progress_hook(scale_progress(progress, 0, 70))
+                    ],
+                }
 
-            # Download video
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                download_info = ydl.extract_info(url, download=True)
+                # Download video
+                async with get_governor().slot('download'):
+                    download_info = await run_io(
+                        self._extract_info,
+                        url,
+                        ydl_opts,
+                        True
+                    )
                 video_id_yt = download_info.get('id')
-                video_path = self.temp_dir / f"{video_id_yt}.mp4"
-
-            if not video_path.exists():
-                raise FileNotFoundError("Downloaded video not found")
-
-            file_size = video_path.stat().st_size
-            logger.info(f"Video downloaded: {file_size} bytes")
-
-            # Create database record
-            video_data = {
-                'user_id': user_id,
-                'title': info['title'],
-                'description': info.get('description', ''),
-                'file_path': '',  # Will be updated after upload
-                'file_size': file_size,
-                'mime_type': 'video/mp4',
-                'duration': info.get('duration', 0),
-                'source_url': url,
-                'status': 'uploading',
-                'metadata': {
-                    'youtube_id': video_id_yt,
-                    'uploader': info.get('uploader'),
-                    'thumbnail': info.get('thumbnail'),
-                    'view_count': info.get('view_count'),
+                video_path = workspace.file(f"{video_id_yt}.mp4")
+
+                if not video_path.exists():
+                    raise FileNotFoundError("Downloaded video not found")
+
+                file_size = video_path.stat().st_size
+                logger.info(f"Video downloaded: {file_size} bytes")
+
+                # Create database record
+                video_data = {
+                    'user_id': user_id,
+                    'title': info['title'],
+                    'description': info.get('description', ''),
+                    'file_path': '',  # Will be updated after upload
+                    'file_size': file_size,
+                    'mime_type': 'video/mp4',
+                    'duration': info.get('duration', 0),
+                    'source_url': url,
+                    'status': 'uploading',
+                    'metadata': {
+                        'youtube_id': video_id_yt,
+                        'uploader': info.get('uploader'),
+                        'thumbnail': info.get('thumbnail'),
+                        'view_count': info.get('view_count'),
+                    }
                 }
-            }
 
-            result = supabase.table('videos').insert(video_data).execute()
-            video_id = result.data[0]['id']
-            logger.info(f"Video record created: {video_id}")
+                result = await supabase.table('videos').insert(video_data).execute()
+                video_id = result.data[0]['id']
+                logger.info(f"Video record created: {video_id}")
 
-            # Upload to Supabase Storage
-            storage_path = f"{user_id}/videos/{video_id}.mp4"
+                # Upload to Supabase Storage
+                storage_path = f"{user_id}/videos/{video_id}.mp4"
 
-            with open(video_path, 'rb') as f:
-                supabase.storage.from_('videos').upload(
-                    storage_path,
-                    f,
-                    file_options={"content-type": "video/mp4"}
-                )
+                async with get_governor().slot('upload'):
+                    await get_storage_uploader().upload_file(
+                        video_path,
+                        'videos',
+                        storage_path,
+                        'video/mp4'
+                    )
 
-            # Update database with file path
-            supabase.table('videos').update({
-                'file_path': storage_path,
-                'status': 'ready'
-            }).eq('id', video_id).execute()
+                if progress:
+                    await progress(95, {'stage': 'uploaded'})
 
-            logger.info(f"Video uploaded successfully: {video_id}")
+                # Update database with file path
+                await get_batch_writer().update('videos', video_id, {
+                    'file_path': storage_path,
+                    'status': 'ready'
+                })
 
-            # Cleanup temp file
-            if video_path and video_path.exists():
-                video_path.unlink()
+                logger.info(f"Video uploaded successfully: {video_id}")
 
-            return {
-                'video_id': video_id,
-                'status': 'ready',
-                'message': 'Video imported successfully'
-            }
+                # Keep the download as the cached source for later stages
+                await get_source_cache().adopt('videos', storage_path, video_path)
 
-        except Exception as e:
-            logger.error(f"Error importing video: {str(e)}")
+                return {
+                    'video_id': video_id,
+                    'file_path': storage_path,
+                    'duration': info.get('duration', 0),
+                    'status': 'ready',
+                    'message': 'Video imported successfully'
+                }
 
-            # Update status to failed if record exists
-            if video_id:
-                supabase.table('videos').update({
-                    'status': 'failed',
-                    'metadata': {'error': str(e)}
-                }).eq('id', video_id).execute()
+            except Exception as e:
+                logger.error(f"Error importing video: {str(e)}")
 
-            # Cleanup on error
-            if video_path and video_path.exists():
-                video_path.unlink()
+                # Update status to failed if record exists
+                if video_id:
+                    await get_batch_writer().update('videos', video_id, {
+                        'status': 'failed',
+                        'metadata': {'error': str(e)}
+                    })
 
-            raise
+                raise
 
-    def download_video(self, url: str, output_path: str) -> str:
+    def _progress_hook(self, progress: Optional[ProgressCallback]):
+        """
+        Build a yt-dlp progress hook forwarding to an async callback
+
+        yt-dlp calls hooks from the executor thread, so the callback is
+        scheduled back onto the event loop.
+        """
+        loop = asyncio.get_running_loop()
+
+        def hook(status: Dict) -> None:
+            if progress is None or status.get('status') != 'downloading':
+                return
+
+            total = status.get('total_bytes') or status.get('total_bytes_estimate')
+            if not total:
+                return
+
+            asyncio.run_coroutine_threadsafe(
+                progress(
+                    status.get('downloaded_bytes', 0) / total * 100,
+                    {
+                        'stage': 'downloading',
+                        'speed': status.get('speed'),
+                        'eta': status.get('eta'),
+                    }
+                ),
+                loop
+            )
+
+        return hook
+
+    def _extract_info(self, url: str, ydl_opts: Dict, download: bool) -> Dict:
+        """Run yt-dlp extraction (blocking)"""
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(url, download=download)
+
+    async def download_video(self, url: str, output_path: str) -> str:
         """
         Download video to specific path
 
@@ -196,7 +249,7 @@ class YouTubeService:
             'merge_output_format': 'mp4',
         }
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+        async with get_governor().slot('download'):
+            await run_io(self._extract_info, url, ydl_opts, True)
 
         return output_path
@@ -0,0 +1,305 @@
+"""
+Local fake of the Supabase storage API for development and tests
+
+Serves the subset of endpoints the backend uses, backed by a directory:
+
+- POST/PUT /storage/v1/object/{bucket}/{path}   single-shot upload
+- GET      /storage/v1/object/{bucket}/{path}   download (Range supported)
+- DELETE   /storage/v1/object/{bucket}/{path}
+- POST     /storage/v1/object/list/{bucket}     list a folder
+- S3 multipart under /storage/v1/s3/{bucket}/{path}
+  (?uploads, ?partNumber=&uploadId=, ?uploadId= complete/abort)
+
+Authentication and signatures are not checked. `fail_every` makes every
+Nth part upload return 503, to exercise retries.
+
+Usage:
+    python -m tests.fake_storage --port 9000 --root /tmp/fake-storage
+    SUPABASE_URL=http://127.0.0.1:9000 python worker.py
+"""
+
+import os
+import re
+import json
+import uuid
+import shutil
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit, parse_qs
+from xml.etree import ElementTree
+
+_OBJECT = re.compile(r'^/storage/v1/object/(?!list/)([^/]+)/(.+)$')
+_LIST = re.compile(r'^/storage/v1/object/list/([^/]+)$')
+_S3 = re.compile(r'^/storage/v1/s3/([^/]+)/(.+)$')
+
+
+class FakeStorage:
+    def __init__(self, root: Path, fail_every: int = 0):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.fail_every = fail_every
+        self.part_requests = 0
+        self._lock = threading.Lock()
+
+    def object_path(self, bucket: str, key: str) -> Path:
+        path = (self.root / bucket / key).resolve()
+        if not str(path).startswith(str(self.root.resolve())):
+            raise ValueError("Invalid path")
+        return path
+
+    def upload_dir(self, upload_id: str) -> Path:
+        uuid.UUID(upload_id)
+        return self.root / '.multipart' / upload_id
+
+    def should_fail_part(self) -> bool:
+        with self._lock:
+            self.part_requests += 1
+            return bool(self.fail_every) and self.part_requests % self.fail_every == 0
+
+
+def _md5_file(path: Path) -> str:
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FakeStorageHandler(BaseHTTPRequestHandler):
+    storage: FakeStorage
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes = b'', headers=None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _json(self, status: int, data) -> None:
+        self._send(status, json.dumps(data).encode(), {'Content-Type': 'application/json'})
+
+    def _read_body_to(self, path: Path) -> str:
+        """Stream the request body to a file; returns its md5"""
+        length = int(self.headers.get('Content-Length', 0))
+        digest = hashlib.md5()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            while length > 0:
+                chunk = self.rfile.read(min(length, 1024 * 1024))
+                if not chunk:
+                    break
+                f.write(chunk)
+                digest.update(chunk)
+                length -= len(chunk)
+        return digest.hexdigest()
+
+    def _route(self):
+        parsed = urlsplit(self.path)
+        path = unquote(parsed.path)
+        query = parse_qs(parsed.query, keep_blank_values=True)
+        for pattern, kind in ((_LIST, 'list'), (_OBJECT, 'object'), (_S3, 's3')):
+            match = pattern.match(path)
+            if match:
+                return kind, match.groups(), query
+        return None, (), query
+
+    def do_GET(self) -> None:
+        kind, groups, _ = self._route()
+        if kind not in ('object', 's3'):
+            return self._send(404)
+
+        path = self.storage.object_path(*groups)
+        if not path.is_file():
+            return self._json(404, {'error': 'not_found'})
+
+        size = path.stat().st_size
+        start, end = 0, size - 1
+        status = 200
+        headers = {'ETag': f'"{_md5_file(path)}"', 'Accept-Ranges': 'bytes'}
+
+        range_header = self.headers.get('Range')
+        if range_header:
+            match = re.match(r'bytes=(\d*)-(\d*)', range_header)
+            if match and match.group(1):
+                start = int(match.group(1))
+                if match.group(2):
+                    end = min(int(match.group(2)), size - 1)
+            elif match and match.group(2):
+                start = max(0, size - int(match.group(2)))
+            if start >= size:
+                return self._send(416, headers={'Content-Range': f'bytes */{size}'})
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def do_PUT(self) -> None:
+        kind, groups, query = self._route()
+
+        if kind == 'object':
+            return self._put_object(*groups, upsert=self.headers.get('x-upsert') == 'true')
+
+        if kind == 's3' and 'partNumber' in query:
+            if self.storage.should_fail_part():
+                # Drain the body so the connection stays usable
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                return self._send(503)
+            part_dir = self.storage.upload_dir(query['uploadId'][0])
+            if not part_dir.is_dir():
+                return self._send(404)
+            number = int(query['partNumber'][0])
+            md5 = self._read_body_to(part_dir / f'{number:05d}.part')
+            return self._send(200, headers={'ETag': f'"{md5}"'})
+
+        if kind == 's3':
+            return self._put_object(*groups, upsert=True)
+
+        self._send(404)
+
+    def _put_object(self, bucket: str, key: str, upsert: bool) -> None:
+        path = self.storage.object_path(bucket, key)
+        if path.exists() and not upsert:
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            return self._json(400, {'error': 'Duplicate', 'message': 'The resource already exists'})
+        tmp = path.with_name(f'.{path.name}.{uuid.uuid4().hex}')
+        md5 = self._read_body_to(tmp)
+        os.replace(tmp, path)
+        self._json(200, {'Key': f'{bucket}/{key}', 'ETag': md5})
+
+    def do_POST(self) -> None:
+        kind, groups, query = self._route()
+
+        if kind == 'object':
+            return self._put_object(*groups, upsert=self.headers.get('x-upsert') == 'true')
+
+        if kind == 'list':
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            folder = self.storage.root / groups[0] / body.get('prefix', '')
+            search = body.get('search', '')
+            items = []
+            if folder.is_dir():
+                for path in sorted(folder.iterdir()):
+                    if path.is_file() and not path.name.startswith('.') and search in path.name:
+                        stat = path.stat()
+                        items.append({
+                            'name': path.name,
+                            'updated_at': str(stat.st_mtime),
+                            'metadata': {'eTag': f'"{_md5_file(path)}"', 'size': stat.st_size},
+                        })
+            return self._json(200, items)
+
+        if kind == 's3' and 'uploads' in query:
+            upload_id = str(uuid.uuid4())
+            upload_dir = self.storage.upload_dir(upload_id)
+            upload_dir.mkdir(parents=True)
+            (upload_dir / 'key').write_text(json.dumps(groups))
+            body = (
+                '<InitiateMultipartUploadResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                f'<Bucket>{groups[0]}</Bucket><Key>{groups[1]}</Key>'
+                f'<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>'
+            ).encode()
+            return self._send(200, body, {'Content-Type': 'application/xml'})
+
+        if kind == 's3' and 'uploadId' in query:
+            upload_dir = self.storage.upload_dir(query['uploadId'][0])
+            if not upload_dir.is_dir():
+                return self._send(404)
+            request = ElementTree.fromstring(
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            )
+            path = self.storage.object_path(*groups)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f'.{path.name}.{uuid.uuid4().hex}')
+            with open(tmp, 'wb') as out:
+                for part in request.iter('Part'):
+                    number = int(part.findtext('PartNumber'))
+                    part_path = upload_dir / f'{number:05d}.part'
+                    if f'"{_md5_file(part_path)}"' != part.findtext('ETag'):
+                        tmp.unlink()
+                        return self._send(400, b'<Error><Code>InvalidPart</Code></Error>')
+                    with open(part_path, 'rb') as f:
+                        shutil.copyfileobj(f, out)
+            os.replace(tmp, path)
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            return self._send(200, b'<CompleteMultipartUploadResult/>', {'Content-Type': 'application/xml'})
+
+        self._send(404)
+
+    def do_DELETE(self) -> None:
+        kind, groups, query = self._route()
+
+        if kind == 's3' and 'uploadId' in query:
+            shutil.rmtree(self.storage.upload_dir(query['uploadId'][0]), ignore_errors=True)
+            return self._send(204)
+
+        if kind in ('object', 's3'):
+            self.storage.object_path(*groups).unlink(missing_ok=True)
+            return self._json(200, {'message': 'Successfully deleted'})
+
+        self._send(404)
+
+
+def serve_fake_storage(
+    root: Path,
+    host: str = '127.0.0.1',
+    port: int = 0,
+    fail_every: int = 0
+) -> ThreadingHTTPServer:
+    """
+    Start the fake storage server in a background thread
+
+    Returns:
+        The server; its address is server.server_address
+    """
+    handler = type(
+        'Handler',
+        (FakeStorageHandler,),
+        {'storage': FakeStorage(root, fail_every)}
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local fake Supabase storage")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--root', default='/tmp/clipforge/fake-storage')
+    parser.add_argument('--fail-every', type=int, default=0)
+    args = parser.parse_args()
+
+    server = serve_fake_storage(Path(args.root), args.host, args.port, args.fail_every)
+    print(f"Fake storage on http://{args.host}:{server.server_address[1]} ({args.root})")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Silence detection, chunk planning and stitching"""
+
+import numpy as np
+import pytest
+from services.audio_chunks import (
+    PCM_SAMPLE_RATE,
+    AudioChunk,
+    ChunkStitcher,
+    detect_silences,
+    plan_chunks,
+    split_chunk,
+    stitch_chunks,
+)
+
+
+def _keep_ranges(chunks):
+    return [(chunk.keep_start, chunk.keep_end) for chunk in chunks]
+
+
+def test_short_audio_is_one_chunk():
+    chunks = plan_chunks(100, [], chunk_seconds=180, search_seconds=30)
+
+    assert _keep_ranges(chunks) == [(0.0, 100)]
+    assert (chunks[0].start, chunks[0].end) == (0.0, 100)
+
+
+def test_without_silences_chunks_are_cut_at_the_target():
+    chunks = plan_chunks(100, [], chunk_seconds=30, search_seconds=5, overlap=1)
+
+    assert _keep_ranges(chunks) == [(0.0, 30), (30, 60), (60, 90), (90, 100)]
+    assert [chunk.index for chunk in chunks] == [0, 1, 2, 3]
+    # Neighbours share the overlap; the ends of the audio are not padded
+    assert [(chunk.start, chunk.end) for chunk in chunks] == [
+        (0.0, 31), (29, 61), (59, 91), (89, 100)
+    ]
+
+
+def test_cut_lands_in_longest_nearby_silence():
+    silences = [(27.0, 27.5), (31.0, 33.0), (50.0, 55.0)]
+
+    chunks = plan_chunks(70, silences, chunk_seconds=30, search_seconds=5)
+
+    # (50, 55) is longer but too far from the second target (62)
+    assert _keep_ranges(chunks) == [(0.0, 32.0), (32.0, 62.0), (62.0, 70)]
+
+
+def test_split_chunk_halves_keep_range():
+    chunk = AudioChunk(3, 59.0, 121.0, 60.0, 120.0)
+
+    first, second = split_chunk(chunk, overlap=1)
+
+    assert (first.keep_start, first.keep_end) == (60.0, 90.0)
+    assert (second.keep_start, second.keep_end) == (90.0, 120.0)
+    assert (first.start, first.end) == (59.0, 91.0)
+    assert (second.start, second.end) == (89.0, 121.0)
+
+
+def test_detect_silences(tmp_path):
+    tone = (np.sin(np.arange(PCM_SAMPLE_RATE) * 2 * np.pi * 440 / PCM_SAMPLE_RATE) * 10000)
+    silence = np.zeros(PCM_SAMPLE_RATE)
+    path = tmp_path / 'audio.pcm'
+    path.write_bytes(
+        np.concatenate([tone, silence, tone, silence[:4000]]).astype(np.int16).tobytes()
+    )
+
+    silences = detect_silences(str(path), min_seconds=0.4)
+
+    # The 0.25s of trailing silence is too short
+    assert len(silences) == 1
+    assert silences[0] == pytest.approx((1.0, 2.0))
+
+
+def _chunks():
+    return [
+        AudioChunk(0, 0.0, 11.0, 0.0, 10.0),
+        AudioChunk(1, 9.0, 20.0, 10.0, 20.0),
+    ]
+
+
+def _result(*words):
+    """Chunk-relative words, one segment per word"""
+    return {
+        'language': 'en',
+        'segments': [{'start': start, 'end': end, 'text': text} for text, start, end in words],
+        'words': [{'word': text, 'start': start, 'end': end} for text, start, end in words],
+    }
+
+
+def test_stitcher_waits_for_earlier_chunks():
+    first, second = _chunks()
+    stitcher = ChunkStitcher(20)
+
+    assert stitcher.add(second, _result((' later', 5.0, 6.0))) is None
+    assert stitcher.stitched_until == 0.0
+
+    part = stitcher.add(first, _result((' first', 1.0, 2.0)))
+
+    assert (part['start'], part['end']) == (0.0, 20.0)
+    assert [word['word'] for word in part['words']] == [' first', ' later']
+    # Times are moved from chunk-relative to absolute
+    assert part['words'][1]['start'] == 14.0
+    assert [segment['id'] for segment in part['segments']] == [0, 1]
+
+
+def test_stitcher_returns_each_part_once():
+    first, second = _chunks()
+    stitcher = ChunkStitcher(20)
+
+    part = stitcher.add(first, _result((' a', 1.0, 2.0)))
+    assert (part['start'], part['end']) == (0.0, 10.0)
+    assert [word['word'] for word in part['words']] == [' a']
+
+    part = stitcher.add(second, _result((' b', 5.0, 6.0)))
+    assert (part['start'], part['end']) == (10.0, 20.0)
+    assert [word['word'] for word in part['words']] == [' b']
+
+
+def test_stitcher_drops_words_outside_keep_range():
+    first, second = _chunks()
+
+    result = stitch_chunks(
+        [first, second],
+        [
+            # ' tail' is centred at 10.5: it belongs to the second chunk
+            _result((' head', 1.0, 2.0), (' tail', 10.2, 10.8)),
+            _result((' lead', 0.1, 0.5), (' tail', 1.2, 1.8)),
+        ]
+    )
+
+    assert [word['word'] for word in result['words']] == [' head', ' tail']
+    assert result['text'] == 'head tail'
+    assert result['language'] == 'en'
+
+
+def test_stitcher_takes_word_heard_by_both_chunks_once():
+    first, second = _chunks()
+
+    result = stitch_chunks(
+        [first, second],
+        [
+            _result((' split', 9.6, 10.2)),
+            # The same word, timed slightly later by the second chunk
+            _result((' Split', 0.9, 1.4)),
+        ]
+    )
+
+    assert [(word['word'], word['start']) for word in result['words']] == [(' split', 9.6)]
@@ -0,0 +1,174 @@
+"""Clip suggestions generated window by window from a live transcript"""
+
+import asyncio
+import pytest
+from services import clip_service
+from services.clip_service import ClipService
+from services.transcript_stream import TranscriptStream
+
+TIMEOUT = 5.0
+
+
+class _VideoService:
+    text = 's0 s5 s10'
+
+    async def get_video_info(self, video_id, user_id, columns):
+        return {'duration': 30}
+
+    async def get_transcription_text(self, video_id, user_id):
+        return self.text
+
+
+class _BatchWriter:
+    def __init__(self, events: list):
+        self.events = events
+
+    async def insert_many(self, table, rows, returning=True):
+        clips = [{'id': f"clip-{row['start_time']:g}", **row} for row in rows]
+        self.events.append(('stored', [clip['id'] for clip in clips]))
+        return clips
+
+
+@pytest.fixture
+def service(monkeypatch):
+    events = []
+    monkeypatch.setattr(clip_service, 'VideoService', _VideoService)
+    monkeypatch.setattr(clip_service, 'Groq', lambda api_key: None)
+    monkeypatch.setattr(clip_service, 'get_batch_writer', lambda: _BatchWriter(events))
+    monkeypatch.setattr(clip_service, 'CLIP_ANALYSIS_WINDOW_SECONDS', 10)
+
+    service = ClipService()
+    service.events = events
+
+    async def analyze(text, duration, count, min_duration, max_duration, window=None):
+        events.append(('analyzed', window, text, count))
+        start = window[0] if window else 0
+        return [
+            {
+                'title': f"Clip at {start + offset}",
+                'start_time': start + offset,
+                'end_time': start + offset + 2,
+                'viral_score': 80,
+                'hook_type': 'question',
+                'target_platform': 'tiktok',
+                'description': '',
+                'reasoning': '',
+            }
+            for offset in range(count)
+        ]
+
+    service._analyze_with_ai = analyze
+    return service
+
+
+async def _publish(stream: TranscriptStream, start: float, end: float) -> None:
+    await stream.publish({
+        'start': start,
+        'end': end,
+        'segments': [{'start': start, 'end': end, 'text': f" s{start:g}"}],
+        'words': [],
+    })
+    await asyncio.sleep(0.01)
+
+
+def _generate(service: ClipService, stream: TranscriptStream, on_clip=None) -> asyncio.Task:
+    return asyncio.create_task(service.generate_clips(
+        'v1',
+        'u1',
+        clip_count=3,
+        min_duration=2,
+        max_duration=4,
+        on_clip=on_clip,
+        stream=stream
+    ))
+
+
+def test_each_window_is_analysed_once_it_is_transcribed(service):
+    async def on_clip(clip):
+        service.events.append(('exported', clip['id']))
+
+    async def run():
+        stream = TranscriptStream()
+        generation = _generate(service, stream, on_clip)
+
+        # A window is analysed once the transcript is past it by more
+        # than min_duration, so a short remainder could still join it
+        for start in (0, 5, 10):
+            await _publish(stream, start, start + 5)
+        assert ('exported', 'clip-0') in service.events
+        assert not any(event[0] == 'analyzed' and event[1][0] == 10 for event in service.events)
+
+        for start in (15, 20, 25):
+            await _publish(stream, start, start + 5)
+        await stream.finish()
+
+        return await asyncio.wait_for(generation, TIMEOUT)
+
+    result = asyncio.run(run())
+
+    assert result['count'] == 3
+    assert [clip['id'] for clip in result['clips']] == ['clip-0', 'clip-10', 'clip-20']
+    # Clips shared out by window length; each window's clips are stored
+    # and handed on before the next window is analysed
+    assert service.events == [
+        ('analyzed', (0.0, 10.0), 's0 s5', 1),
+        ('stored', ['clip-0']),
+        ('exported', 'clip-0'),
+        ('analyzed', (10.0, 20.0), 's10 s15', 1),
+        ('stored', ['clip-10']),
+        ('exported', 'clip-10'),
+        ('analyzed', (20.0, 30.0), 's20 s25', 1),
+        ('stored', ['clip-20']),
+        ('exported', 'clip-20'),
+    ]
+
+
+def test_transcription_failure_stops_generation(service):
+    async def run():
+        stream = TranscriptStream()
+        generation = _generate(service, stream)
+
+        for start in (0, 5, 10):
+            await _publish(stream, start, start + 5)
+        await stream.finish(RuntimeError('engine failed'))
+
+        with pytest.raises(RuntimeError, match='Transcription failed: engine failed'):
+            await asyncio.wait_for(generation, TIMEOUT)
+
+    asyncio.run(run())
+
+    # Only the window transcribed before the failure was analysed
+    assert service.events == [
+        ('analyzed', (0.0, 10.0), 's0 s5', 1),
+        ('stored', ['clip-0']),
+    ]
+
+
+def test_transcript_without_speech_fails(service):
+    async def run():
+        stream = TranscriptStream()
+        generation = _generate(service, stream)
+        await stream.publish({'start': 0, 'end': 30, 'segments': [], 'words': []})
+        await stream.finish()
+        await asyncio.wait_for(generation, TIMEOUT)
+
+    with pytest.raises(ValueError, match='no transcribed speech'):
+        asyncio.run(run())
+
+    assert service.events == []
+
+
+def test_finished_transcript_is_analysed_as_a_whole(service):
+    result = asyncio.run(service.generate_clips('v1', 'u1', clip_count=2, min_duration=2, max_duration=4))
+
+    assert result['count'] == 2
+    assert service.events[0] == ('analyzed', None, 's0 s5 s10', 2)
+
+
+def test_untranscribed_video_is_refused(service):
+    service.video_service.text = None
+
+    with pytest.raises(ValueError, match='must be transcribed first'):
+        asyncio.run(service.generate_clips('v1', 'u1'))
+
+    assert service.events == []
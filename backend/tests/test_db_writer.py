@@ -0,0 +1,141 @@
+"""BatchWriter coalescing and batching"""
+
+import asyncio
+from types import SimpleNamespace
+import pytest
+from services import db_writer
+from services.db_writer import BatchWriter
+
+
+class _Query:
+    def __init__(self, client, table: str):
+        self.client = client
+        self.request = {'table': table}
+
+    def update(self, values):
+        self.request.update(method='update', values=values)
+        return self
+
+    def insert(self, rows, returning='representation'):
+        self.request.update(method='insert', rows=rows, returning=returning)
+        return self
+
+    def eq(self, column, value):
+        self.request['filter'] = (column, 'eq', value)
+        return self
+
+    def in_(self, column, values):
+        self.request['filter'] = (column, 'in', sorted(values))
+        return self
+
+    async def execute(self):
+        self.client.requests.append(self.request)
+        if self.client.error:
+            raise self.client.error
+        if self.request['method'] == 'insert' and self.request['returning'] != 'minimal':
+            return SimpleNamespace(data=self.request['rows'])
+        return SimpleNamespace(data=[])
+
+
+class _Client:
+    """Records the requests the writer makes"""
+
+    def __init__(self):
+        self.requests = []
+        self.error = None
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = _Client()
+    monkeypatch.setattr(db_writer, 'get_supabase_client', lambda: client)
+    return client
+
+
+def test_updates_to_one_row_are_merged(client):
+    async def run():
+        writer = BatchWriter(window=0.01)
+        await asyncio.gather(
+            writer.update('videos', 'v1', {'status': 'processing', 'progress': 10}),
+            writer.update('videos', 'v1', {'progress': 50}),
+        )
+
+    asyncio.run(run())
+
+    assert client.requests == [{
+        'table': 'videos',
+        'method': 'update',
+        'values': {'status': 'processing', 'progress': 50},
+        'filter': ('id', 'eq', 'v1'),
+    }]
+
+
+def test_rows_with_same_values_share_one_request(client):
+    async def run():
+        writer = BatchWriter(window=0.01)
+        await asyncio.gather(
+            writer.update('clips', 'c1', {'status': 'processing'}),
+            writer.update('clips', 'c2', {'status': 'processing'}),
+            writer.update('clips', 'c3', {'status': 'ready'}),
+            writer.update('videos', 'c1', {'status': 'processing'}),
+        )
+
+    asyncio.run(run())
+
+    assert len(client.requests) == 3
+    for request in (
+        ('clips', {'status': 'processing'}, ('id', 'in', ['c1', 'c2'])),
+        ('clips', {'status': 'ready'}, ('id', 'eq', 'c3')),
+        ('videos', {'status': 'processing'}, ('id', 'eq', 'c1')),
+    ):
+        assert request in [
+            (sent['table'], sent['values'], sent['filter']) for sent in client.requests
+        ]
+
+
+def test_update_queued_after_a_flush_is_written(client):
+    async def run():
+        writer = BatchWriter(window=0.01)
+        await writer.update('videos', 'v1', {'progress': 10})
+        # Queued while the first flush task may still be finishing
+        await writer.update('videos', 'v1', {'progress': 20})
+        await writer.update('videos', 'v1', {'progress': 30}, wait=False)
+        await writer.close()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+
+    assert [request['values'] for request in client.requests] == [
+        {'progress': 10}, {'progress': 20}, {'progress': 30}
+    ]
+
+
+def test_write_error_reaches_waiting_callers(client):
+    client.error = RuntimeError('PostgREST down')
+
+    async def run():
+        writer = BatchWriter(window=0.01)
+        await writer.update('videos', 'v1', {'status': 'failed'})
+
+    with pytest.raises(RuntimeError, match='PostgREST down'):
+        asyncio.run(run())
+
+
+def test_insert_many_batches_rows(client):
+    rows = [{'n': n} for n in range(5)]
+
+    inserted = asyncio.run(BatchWriter(max_rows=2).insert_many('clips', rows))
+
+    assert inserted == rows
+    assert [len(request['rows']) for request in client.requests] == [2, 2, 1]
+
+
+def test_insert_many_without_returning(client):
+    inserted = asyncio.run(
+        BatchWriter().insert_many('clips', [{'n': 1}], returning=False)
+    )
+
+    assert inserted == []
+    assert client.requests[0]['returning'] == 'minimal'
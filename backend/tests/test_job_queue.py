@@ -0,0 +1,147 @@
+"""SQLite queue backend: leasing, retries and lease expiry"""
+
+import asyncio
+from services.job_queue import (
+    JOB_STATUS_COMPLETED,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_PROCESSING,
+    JOB_STATUS_QUEUED,
+    JobQueue,
+    SQLiteJobBackend,
+)
+
+
+def _backend() -> SQLiteJobBackend:
+    return SQLiteJobBackend(":memory:")
+
+
+def _make_available(backend: SQLiteJobBackend, job_id: str) -> None:
+    # Skip the retry backoff
+    backend._conn.execute(
+        "UPDATE processing_jobs SET available_at = '' WHERE id = ?",
+        (job_id,)
+    )
+
+
+def test_lease_claims_oldest_job_of_requested_type():
+    backend = _backend()
+    first = backend.enqueue('transcription', 'user', {'n': 1})
+    backend.enqueue('export', 'user', {'n': 2})
+    backend.enqueue('transcription', 'user', {'n': 3})
+
+    job = backend.lease('worker-1', ['transcription'], 60)
+
+    assert job.id == first
+    assert job.payload == {'n': 1}
+    assert job.attempts == 1
+    assert backend.get(first)['status'] == JOB_STATUS_PROCESSING
+    assert backend.get(first)['worker_id'] == 'worker-1'
+
+
+def test_leased_job_is_not_leased_again():
+    backend = _backend()
+    backend.enqueue('export', 'user', {})
+
+    assert backend.lease('worker-1', ['export'], 60) is not None
+    assert backend.lease('worker-2', ['export'], 60) is None
+
+
+def test_lease_returns_none_for_other_types():
+    backend = _backend()
+    backend.enqueue('export', 'user', {})
+
+    assert backend.lease('worker-1', ['transcription'], 60) is None
+
+
+def test_complete():
+    backend = _backend()
+    job_id = backend.enqueue('export', 'user', {})
+    backend.lease('worker-1', ['export'], 60)
+
+    assert backend.complete(job_id, 'worker-1', {'clip_id': 'c'})
+
+    row = backend.get(job_id)
+    assert row['status'] == JOB_STATUS_COMPLETED
+    assert row['progress'] == 100
+    assert row['metadata'] == {'clip_id': 'c'}
+
+
+def test_failed_job_is_retried_until_attempts_run_out():
+    backend = _backend()
+    queue = JobQueue(backend)
+    job_id = backend.enqueue('export', 'user', {}, max_attempts=2)
+
+    job = backend.lease('worker-1', ['export'], 60)
+    asyncio.run(queue.fail(job, 'worker-1', 'first'))
+
+    row = backend.get(job_id)
+    assert row['status'] == JOB_STATUS_QUEUED
+    assert row['error_message'] == 'first'
+    # Backing off
+    assert backend.lease('worker-1', ['export'], 60) is None
+
+    _make_available(backend, job_id)
+    job = backend.lease('worker-1', ['export'], 60)
+    assert job.attempts == 2
+    asyncio.run(queue.fail(job, 'worker-1', 'second'))
+
+    row = backend.get(job_id)
+    assert row['status'] == JOB_STATUS_FAILED
+    assert row['error_message'] == 'second'
+
+
+def test_expired_lease_is_taken_over():
+    backend = _backend()
+    job_id = backend.enqueue('export', 'user', {}, max_attempts=2)
+    backend.lease('worker-1', ['export'], -1)
+
+    job = backend.lease('worker-2', ['export'], 60)
+
+    assert job.id == job_id
+    assert job.attempts == 2
+    assert backend.get(job_id)['worker_id'] == 'worker-2'
+    assert not backend.heartbeat(job_id, 'worker-1', 60)
+    assert backend.heartbeat(job_id, 'worker-2', 60)
+
+
+def test_worker_that_lost_the_lease_cannot_record_an_outcome():
+    backend = _backend()
+    queue = JobQueue(backend)
+    job_id = backend.enqueue('export', 'user', {}, max_attempts=3)
+    stale = backend.lease('worker-1', ['export'], -1)
+    backend.lease('worker-2', ['export'], 60)
+
+    assert not asyncio.run(queue.complete(job_id, 'worker-1', {'clip_id': 'stale'}))
+    assert not asyncio.run(queue.fail(stale, 'worker-1', 'stale'))
+
+    row = backend.get(job_id)
+    assert row['status'] == JOB_STATUS_PROCESSING
+    assert row['worker_id'] == 'worker-2'
+    assert row['metadata'] == {}
+    assert row['error_message'] is None
+
+    assert asyncio.run(queue.complete(job_id, 'worker-2', {'clip_id': 'c'}))
+    assert backend.get(job_id)['status'] == JOB_STATUS_COMPLETED
+
+
+def test_expired_lease_on_last_attempt_fails_the_job():
+    backend = _backend()
+    job_id = backend.enqueue('youtube_import', 'user', {}, max_attempts=1)
+    backend.lease('worker-1', ['youtube_import'], -1)
+
+    assert backend.lease('worker-2', ['youtube_import'], 60) is None
+
+    row = backend.get(job_id)
+    assert row['status'] == JOB_STATUS_FAILED
+    assert row['error_message'] == 'lease expired after 1 attempts'
+    assert row['lease_expires_at'] is None
+    assert row['completed_at'] is not None
+
+
+def test_live_lease_on_last_attempt_is_left_alone():
+    backend = _backend()
+    job_id = backend.enqueue('youtube_import', 'user', {}, max_attempts=1)
+    backend.lease('worker-1', ['youtube_import'], 60)
+
+    assert backend.lease('worker-2', ['youtube_import'], 60) is None
+    assert backend.get(job_id)['status'] == JOB_STATUS_PROCESSING
@@ -0,0 +1,69 @@
+"""JobWorker lease handling"""
+
+import asyncio
+from services.job_queue import (
+    JOB_STATUS_COMPLETED,
+    JOB_STATUS_PROCESSING,
+    JobQueue,
+    SQLiteJobBackend,
+)
+from services.job_worker import JobWorker
+
+
+def _worker(backend: SQLiteJobBackend, handler) -> JobWorker:
+    return JobWorker(
+        JobQueue(backend),
+        {'export': handler},
+        lease_seconds=0.3,
+        worker_id='worker-1'
+    )
+
+
+def test_job_is_cancelled_when_its_lease_is_lost():
+    backend = SQLiteJobBackend(":memory:")
+    job_id = backend.enqueue('export', 'user', {})
+    cancelled = []
+
+    async def handler(job, progress):
+        # Another worker re-leases the job meanwhile
+        backend._conn.execute(
+            "UPDATE processing_jobs SET worker_id = 'worker-2' WHERE id = ?",
+            (job.id,)
+        )
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(job.id)
+            raise
+        return {'clip_id': 'stale'}
+
+    worker = _worker(backend, handler)
+    job = backend.lease('worker-1', ['export'], 60)
+
+    asyncio.run(asyncio.wait_for(worker.run_job(job), 5))
+
+    assert cancelled == [job_id]
+    row = backend.get(job_id)
+    # Left to worker-2
+    assert row['status'] == JOB_STATUS_PROCESSING
+    assert row['worker_id'] == 'worker-2'
+    assert row['metadata'] == {}
+
+
+def test_job_keeps_running_while_its_lease_is_held():
+    backend = SQLiteJobBackend(":memory:")
+    job_id = backend.enqueue('export', 'user', {})
+
+    async def handler(job, progress):
+        # Several heartbeats
+        await asyncio.sleep(0.5)
+        return {'clip_id': 'c'}
+
+    worker = _worker(backend, handler)
+    job = backend.lease('worker-1', ['export'], 60)
+
+    asyncio.run(asyncio.wait_for(worker.run_job(job), 5))
+
+    row = backend.get(job_id)
+    assert row['status'] == JOB_STATUS_COMPLETED
+    assert row['metadata'] == {'clip_id': 'c'}
@@ -0,0 +1,270 @@
+"""Stage graph ordering and failure handling, and the pipeline built on it"""
+
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+from services.pipeline_service import PipelineService, StageGraph
+
+# Every run is bounded, so a stage that never finishes fails the test
+# instead of hanging it
+TIMEOUT = 5.0
+
+
+def _run(coro):
+    async def run():
+        return await asyncio.wait_for(coro, TIMEOUT)
+
+    return asyncio.run(run())
+
+
+def test_stages_run_after_their_dependencies():
+    order = []
+
+    async def stage(name, deps):
+        order.append(('start', name, sorted(deps)))
+        await asyncio.sleep(0.01)
+        order.append(('end', name))
+        return name.upper()
+
+    async def run():
+        graph = StageGraph()
+        graph.add('a', lambda deps: stage('a', deps))
+        graph.add('b', lambda deps: stage('b', deps), deps=['a'])
+        graph.add('c', lambda deps: stage('c', deps), deps=['a', 'b'])
+        outcome = await graph.wait()
+        return graph, outcome
+
+    graph, outcome = _run(run())
+
+    assert order == [
+        ('start', 'a', []),
+        ('end', 'a'),
+        ('start', 'b', ['a']),
+        ('end', 'b'),
+        ('start', 'c', ['a', 'b']),
+        ('end', 'c'),
+    ]
+    assert outcome == {name: {'status': 'completed'} for name in 'abc'}
+    assert graph.result('c') == 'C'
+
+
+def test_dependencies_receive_results():
+    async def run():
+        graph = StageGraph()
+        graph.add('a', lambda deps: _value(1))
+        graph.add('b', lambda deps: _value(deps['a'] + 1), deps=['a'])
+        await graph.wait()
+        return graph.result('b')
+
+    assert _run(run()) == 2
+
+
+def test_unknown_and_duplicate_stages_are_rejected():
+    async def run():
+        graph = StageGraph()
+        graph.add('a', lambda deps: _value(1))
+        with pytest.raises(ValueError):
+            graph.add('a', lambda deps: _value(2))
+        with pytest.raises(ValueError):
+            graph.add('b', lambda deps: _value(2), deps=['missing'])
+        await graph.wait()
+
+    _run(run())
+
+
+def test_failure_skips_dependent_stages():
+    ran = []
+
+    async def fail(deps):
+        raise RuntimeError('no source')
+
+    async def dependent(deps):
+        ran.append('dependent')
+
+    async def independent(deps):
+        ran.append('independent')
+
+    async def run():
+        graph = StageGraph()
+        graph.add('source', fail)
+        graph.add('transcribe', dependent, deps=['source'])
+        graph.add('export', dependent, deps=['transcribe'])
+        graph.add('other', independent)
+        return await graph.wait()
+
+    outcome = _run(run())
+
+    assert ran == ['independent']
+    assert outcome == {
+        'source': {'status': 'failed', 'error': 'no source'},
+        'transcribe': {'status': 'failed', 'error': 'no source'},
+        'export': {'status': 'failed', 'error': 'no source'},
+        'other': {'status': 'completed'},
+    }
+
+
+def test_stages_added_while_running_are_waited_for():
+    async def run():
+        graph = StageGraph()
+
+        async def spawn(deps):
+            await asyncio.sleep(0.01)
+            graph.add('late', lambda deps: _value('late', delay=0.05), deps=['spawn'])
+            return 'spawned'
+
+        graph.add('spawn', spawn)
+        outcome = await graph.wait()
+        return graph, outcome
+
+    graph, outcome = _run(run())
+
+    assert outcome['late'] == {'status': 'completed'}
+    assert graph.result('late') == 'late'
+
+
+async def _value(value, delay: float = 0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+class _Source:
+    def __init__(self):
+        self.path = Path('/tmp/source.mp4')
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+class _VideoService:
+    def __init__(self):
+        self.source = _Source()
+        self.source_cache = SimpleNamespace(checkout=self.checkout)
+
+    async def get_video_info(self, video_id, user_id, columns):
+        return {'file_path': f"{user_id}/videos/{video_id}.mp4"}
+
+    async def checkout(self, bucket, file_path):
+        return self.source
+
+
+class _TranscriptionService:
+    """Publishes two parts, the second only once generation has started"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.generation_started = asyncio.Event()
+
+    async def transcribe_video(self, video_id, user_id, language, source_path, progress, stream):
+        await stream.publish(_part(0, 60, 'first'))
+        # Generation follows the stream instead of waiting for this stage
+        await self.generation_started.wait()
+
+        if self.fail:
+            raise RuntimeError('engine failed')
+
+        await stream.publish(_part(60, 120, 'second'))
+        await stream.finish()
+        return {'method': 'whisper'}
+
+
+def _part(start: float, end: float, text: str):
+    return {
+        'start': start,
+        'end': end,
+        'segments': [{'start': start, 'end': end, 'text': text}],
+        'words': [],
+    }
+
+
+class _ClipService:
+    def __init__(self, transcription: _TranscriptionService, fail_export: str = None):
+        self.transcription = transcription
+        self.fail_export = fail_export
+        self.texts = []
+        self.exports = []
+
+    async def generate_clips(self, video_id, user_id, clip_count, min_duration,
+                             max_duration, on_clip, stream):
+        clips = []
+        async for start, end, text in stream.windows(60):
+            self.transcription.generation_started.set()
+            self.texts.append(text)
+            clip = {'id': f"clip-{int(start)}"}
+            clips.append(clip)
+            if on_clip:
+                await on_clip(clip)
+        return {'clips': clips}
+
+    async def export_clip(self, clip_id, user_id, output_format, resolution,
+                          source_path, progress):
+        self.exports.append((clip_id, source_path))
+        if clip_id == self.fail_export:
+            raise RuntimeError('render failed')
+        return {'clip_id': clip_id}
+
+
+def _pipeline(transcription: _TranscriptionService, clips: _ClipService = None):
+    video = _VideoService()
+    clips = clips or _ClipService(transcription)
+    service = PipelineService(
+        youtube_service=SimpleNamespace(),
+        video_service=video,
+        transcription_service=transcription,
+        clip_service=clips
+    )
+    return service, video, clips
+
+
+def test_pipeline_generates_and_exports_while_transcribing():
+    async def run():
+        transcription = _TranscriptionService()
+        service, video, clips = _pipeline(transcription)
+        result = await service.run_pipeline('u1', video_id='v1')
+        return result, video, clips
+
+    result, video, clips = _run(run())
+
+    assert result['status'] == 'completed'
+    assert result['video_id'] == 'v1'
+    assert result['clip_ids'] == ['clip-0', 'clip-60']
+    assert result['exports_failed'] == 0
+    assert set(result['stages']) == {
+        'source', 'transcribe', 'generate', 'export:clip-0', 'export:clip-60'
+    }
+    assert clips.texts == ['first', 'second']
+    # Every stage shares the one checked-out file, released at the end
+    assert clips.exports == [('clip-0', '/tmp/source.mp4'), ('clip-60', '/tmp/source.mp4')]
+    assert video.source.released
+
+
+def test_failed_transcription_fails_the_pipeline_without_hanging():
+    async def run():
+        transcription = _TranscriptionService(fail=True)
+        service, video, clips = _pipeline(transcription)
+        with pytest.raises(RuntimeError, match='transcribe failed: engine failed'):
+            await service.run_pipeline('u1', video_id='v1')
+        return video, clips
+
+    video, clips = _run(run())
+
+    # The first window was already exported; generation stopped there
+    assert clips.texts == ['first']
+    assert clips.exports == [('clip-0', '/tmp/source.mp4')]
+    assert video.source.released
+
+
+def test_failed_export_only_marks_its_clip():
+    async def run():
+        transcription = _TranscriptionService()
+        clips = _ClipService(transcription, fail_export='clip-0')
+        service, video, clips = _pipeline(transcription, clips)
+        return await service.run_pipeline('u1', video_id='v1')
+
+    result = _run(run())
+
+    assert result['status'] == 'completed'
+    assert result['exports_failed'] == 1
+    assert result['stages']['export:clip-0'] == {'status': 'failed', 'error': 'render failed'}
+    assert result['stages']['export:clip-60'] == {'status': 'completed'}
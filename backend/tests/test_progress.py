@@ -0,0 +1,59 @@
+"""Throttled job progress writes"""
+
+import asyncio
+from types import SimpleNamespace
+from services import progress
+from services.progress import JobProgressReporter
+
+
+class _Queue:
+    def __init__(self):
+        self.writes = []
+
+    async def update_progress(self, job_id, progress, details):
+        self.writes.append((job_id, progress, details))
+
+
+def _report(reporter: JobProgressReporter, *updates) -> None:
+    async def run():
+        for percent, details in updates:
+            await reporter(percent, details)
+
+    asyncio.run(run())
+
+
+def test_detail_changes_are_written(monkeypatch):
+    clock = iter([10.0, 20.0, 30.0, 40.0])
+    monkeypatch.setattr(progress, 'time', SimpleNamespace(monotonic=lambda: next(clock)))
+    queue = _Queue()
+
+    _report(
+        JobProgressReporter(queue, 'j1', interval=5.0),
+        (40.2, {'speed': '1.5x', 'eta': 30}),
+        (40.7, {'speed': '1.5x', 'eta': 30}),
+        (40.9, {'speed': '2.0x', 'eta': 20}),
+        (35.0, {'speed': '2.0x', 'eta': 18}),
+    )
+
+    assert queue.writes == [
+        ('j1', 40, {'speed': '1.5x', 'eta': 30}),
+        ('j1', 40, {'speed': '2.0x', 'eta': 20}),
+        ('j1', 40, {'speed': '2.0x', 'eta': 18}),
+    ]
+
+
+def test_writes_are_throttled(monkeypatch):
+    clock = iter([10.0, 11.0, 12.0, 15.0])
+    monkeypatch.setattr(progress, 'time', SimpleNamespace(monotonic=lambda: next(clock)))
+    queue = _Queue()
+
+    _report(
+        JobProgressReporter(queue, 'j1', interval=5.0),
+        (10, {'eta': 90}),
+        (20, {'eta': 80}),
+        (30, {'eta': 70}),
+        (100, {'eta': 0}),
+    )
+
+    # Never 100: the job's completion writes that
+    assert queue.writes == [('j1', 10, {'eta': 90}), ('j1', 99, {'eta': 0})]
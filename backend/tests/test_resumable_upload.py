@@ -0,0 +1,126 @@
+"""Resumable upload ranges and chunk writes"""
+
+import time
+import uuid
+import asyncio
+import hashlib
+import pytest
+from services.resumable_upload import (
+    ResumableUploadStore,
+    UploadNotFoundError,
+    _merge_range,
+    _missing_ranges,
+)
+
+
+def test_merge_range_keeps_ranges_disjoint():
+    assert _merge_range([], 0, 10) == [[0, 10]]
+    assert _merge_range([[0, 10]], 20, 30) == [[0, 10], [20, 30]]
+    # Touching and overlapping ranges are joined
+    assert _merge_range([[0, 10], [20, 30]], 10, 20) == [[0, 30]]
+    assert _merge_range([[0, 10], [20, 30]], 5, 25) == [[0, 30]]
+    # A range already covered changes nothing
+    assert _merge_range([[0, 30]], 5, 10) == [[0, 30]]
+    assert _merge_range([[20, 30]], 0, 5) == [[0, 5], [20, 30]]
+
+
+def test_missing_ranges():
+    assert _missing_ranges([], 100) == [[0, 100]]
+    assert _missing_ranges([[0, 100]], 100) == []
+    assert _missing_ranges([[10, 20], [50, 60]], 100) == [[0, 10], [20, 50], [60, 100]]
+    assert _missing_ranges([[0, 40]], 100) == [[40, 100]]
+
+
+async def _stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _broken_stream(data: bytes):
+    yield data
+    raise ConnectionResetError("client went away")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResumableUploadStore(tmp_path / 'uploads', ttl=3600)
+
+
+def _upload(store: ResumableUploadStore, data: bytes) -> str:
+    info = {
+        'upload_id': str(uuid.uuid4()),
+        'user_id': 'user',
+        'filename': 'clip.mp4',
+        'size': len(data),
+        'content_type': 'video/mp4',
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'created_at': int(time.time()),
+    }
+    store._create(info)
+    return info['upload_id']
+
+
+def test_chunks_out_of_order_complete_upload(store, tmp_path):
+    data = bytes(range(256)) * 40
+    upload_id = _upload(store, data)
+
+    async def run():
+        status = await store.write_chunk(upload_id, 'user', 4096, _stream(data[4096:]))
+        assert status['missing'] == [[0, 4096]]
+        assert status['offset'] == 0
+        assert not status['complete']
+
+        status = await store.write_chunk(upload_id, 'user', 0, _stream(data[:1000], data[1000:4096]))
+        assert status['complete']
+        assert status['received'] == len(data)
+
+        return await store.finalize(upload_id, 'user', tmp_path)
+
+    result = asyncio.run(run())
+
+    assert open(result['file_path'], 'rb').read() == data
+    assert result['sha256'] == hashlib.sha256(data).hexdigest()
+    assert not (store.root / upload_id).exists()
+
+
+def test_broken_chunk_keeps_what_arrived(store):
+    data = b'x' * 1000
+    upload_id = _upload(store, data)
+
+    async def run():
+        with pytest.raises(ConnectionResetError):
+            await store.write_chunk(upload_id, 'user', 0, _broken_stream(data[:600]))
+        return await store.status(upload_id, 'user')
+
+    status = asyncio.run(run())
+
+    assert status['received'] == 600
+    assert status['offset'] == 600
+    assert status['missing'] == [[600, 1000]]
+
+
+def test_chunk_past_declared_size_is_rejected(store):
+    upload_id = _upload(store, b'x' * 100)
+
+    with pytest.raises(ValueError):
+        asyncio.run(store.write_chunk(upload_id, 'user', 50, _stream(b'y' * 51)))
+
+
+def test_finalize_rejects_incomplete_upload(store, tmp_path):
+    upload_id = _upload(store, b'x' * 100)
+
+    async def run():
+        await store.write_chunk(upload_id, 'user', 0, _stream(b'x' * 99))
+        await store.finalize(upload_id, 'user', tmp_path)
+
+    with pytest.raises(ValueError, match='incomplete'):
+        asyncio.run(run())
+
+
+def test_other_users_upload_is_not_found(store):
+    upload_id = _upload(store, b'x' * 100)
+
+    with pytest.raises(UploadNotFoundError):
+        asyncio.run(store.status(upload_id, 'someone-else'))
+    with pytest.raises(UploadNotFoundError):
+        asyncio.run(store.status('../etc', 'user'))
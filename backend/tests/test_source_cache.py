@@ -0,0 +1,190 @@
+"""Source cache budget and eviction across processes sharing a directory"""
+
+import os
+import fcntl
+import asyncio
+import hashlib
+import threading
+from services import source_cache
+from services.source_cache import SourceCache
+from tests.fake_storage import serve_fake_storage
+
+
+def _cache(root, max_bytes: int = 100) -> SourceCache:
+    cache = SourceCache(root, max_bytes=max_bytes)
+
+    async def stat_object(bucket, storage_path):
+        return {'version': 'v1', 'etag': None, 'size': 0}
+
+    cache.stat_object = stat_object
+    return cache
+
+
+def _adopt(cache: SourceCache, tmp_path, name: str, size: int) -> str:
+    local = tmp_path / f"upload-{name}"
+    local.write_bytes(b'x' * size)
+    asyncio.run(cache.adopt('videos', name, local))
+    return cache._key('videos', name, 'v1')
+
+
+def _age(cache: SourceCache, key: str, seconds_ago: float) -> None:
+    path = cache.root / f"{key}.src"
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime - seconds_ago))
+
+
+def _cached(cache: SourceCache):
+    return sorted(path.stem for path in cache.root.glob('*.src'))
+
+
+def test_budget_covers_files_of_other_processes(tmp_path):
+    root = tmp_path / 'cache'
+    first, second = _cache(root), _cache(root)
+
+    old = _adopt(first, tmp_path, 'a.mp4', 60)
+    _age(first, old, 60)
+    new = _adopt(second, tmp_path, 'b.mp4', 60)
+
+    # The second process evicted the first one's file to stay in budget
+    assert _cached(first) == [new]
+    assert first.bytes_used == second.bytes_used == 60
+
+
+def test_file_in_use_by_another_process_is_kept(tmp_path):
+    root = tmp_path / 'cache'
+    first, second = _cache(root), _cache(root)
+
+    held = _adopt(first, tmp_path, 'a.mp4', 60)
+    source = asyncio.run(first._lookup(held))
+    _age(first, held, 60)
+
+    # Over budget and the older file is locked: the only idle file goes
+    _adopt(second, tmp_path, 'b.mp4', 60)
+
+    assert _cached(second) == [held]
+    assert second.stats()['bytes_used'] == 60
+
+    source.release()
+    assert _cached(first) == [held]
+
+
+def test_checkout_makes_file_most_recently_used_everywhere(tmp_path):
+    root = tmp_path / 'cache'
+    first, second = _cache(root), _cache(root)
+
+    oldest = _adopt(first, tmp_path, 'a.mp4', 40)
+    _age(first, oldest, 120)
+    middle = _adopt(first, tmp_path, 'b.mp4', 40)
+    _age(first, middle, 60)
+
+    asyncio.run(first._lookup(oldest)).release()
+    newest = _adopt(second, tmp_path, 'c.mp4', 40)
+
+    assert _cached(second) == sorted([oldest, newest])
+
+
+def test_lookup_of_evicted_file_is_a_miss(tmp_path):
+    cache = _cache(tmp_path / 'cache')
+    key = _adopt(cache, tmp_path, 'a.mp4', 10)
+
+    # Removed by another process after this one last saw it
+    (cache.root / f"{key}.src").unlink()
+
+    assert asyncio.run(cache._lookup(key)) is None
+    assert cache.stats()['in_use'] == 0
+
+
+def test_startup_removes_only_abandoned_partial_downloads(tmp_path):
+    root = tmp_path / 'cache'
+    root.mkdir()
+    abandoned = root / 'abc.1.part'
+    abandoned.write_bytes(b'x' * 10)
+    running = root / 'def.7.part'
+    running.write_bytes(b'x' * 10)
+
+    fd = os.open(running, os.O_RDWR)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        cache = _cache(root)
+        assert not abandoned.exists()
+        assert running.exists()
+        # Partial downloads count against the budget
+        assert cache.bytes_used == 10
+    finally:
+        os.close(fd)
+
+
+def test_file_in_use_by_this_process_is_never_evicted(tmp_path):
+    cache = _cache(tmp_path / 'cache')
+    key = _adopt(cache, tmp_path, 'a.mp4', 10)
+
+    source = asyncio.run(cache._lookup(key))
+    cache._evict(extra_bytes=100)
+    assert source.path.exists()
+
+    source.release()
+    cache._evict(extra_bytes=100)
+    assert not source.path.exists()
+
+
+def test_waiting_for_another_process_does_not_block_the_loop(tmp_path):
+    cache = _cache(tmp_path / 'cache')
+    key = _adopt(cache, tmp_path, 'a.mp4', 10)
+    local = tmp_path / 'upload-b.mp4'
+    local.write_bytes(b'x' * 10)
+
+    # Another process is evicting
+    fd = os.open(cache.root / source_cache._INDEX_LOCK, os.O_RDWR)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    threading.Timer(0.3, os.close, (fd,)).start()
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        source = await cache._lookup(key)
+        await cache.adopt('videos', 'b.mp4', local)
+        ticker.cancel()
+        source.release()
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+
+
+def test_checkout_downloads_once_and_hits_after(tmp_path, monkeypatch):
+    server = serve_fake_storage(tmp_path / 'storage')
+    host, port = server.server_address
+    monkeypatch.setenv('SUPABASE_URL', f"http://{host}:{port}")
+    monkeypatch.setenv('SUPABASE_SERVICE_ROLE_KEY', 'service-role')
+    data = os.urandom(5000)
+    (tmp_path / 'storage' / 'videos').mkdir(parents=True)
+    (tmp_path / 'storage' / 'videos' / 'a.mp4').write_bytes(data)
+
+    cache = _cache(tmp_path / 'cache', max_bytes=10000)
+
+    async def stat_object(bucket, storage_path):
+        return {'version': 'v1', 'etag': hashlib.md5(data).hexdigest(), 'size': len(data)}
+
+    cache.stat_object = stat_object
+
+    async def run():
+        first = await cache.checkout('videos', 'a.mp4')
+        second = await cache.checkout('videos', 'a.mp4')
+        assert first.path == second.path
+        assert first.path.read_bytes() == data
+        first.release()
+        second.release()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    assert list(cache.root.glob('*.part')) == []
+    assert cache.stats() == {'entries': 1, 'bytes_used': 5000, 'max_bytes': 10000, 'in_use': 0}
@@ -0,0 +1,187 @@
+"""StorageUploader and stream_download against the fake storage server"""
+
+import os
+import asyncio
+import hashlib
+import pytest
+from services import storage_io
+from services.storage_io import (
+    StorageIntegrityError,
+    StorageUploader,
+    stream_download,
+)
+from tests.fake_storage import serve_fake_storage
+
+PART_SIZE = 64 * 1024
+
+
+def _serve(tmp_path, monkeypatch, fail_every: int = 0):
+    server = serve_fake_storage(tmp_path / 'storage', fail_every=fail_every)
+    host, port = server.server_address
+    monkeypatch.setenv('SUPABASE_URL', f"http://{host}:{port}")
+    monkeypatch.setenv('SUPABASE_SERVICE_ROLE_KEY', 'service-role')
+    monkeypatch.setattr(storage_io, 'STORAGE_S3_ENDPOINT', None)
+    monkeypatch.setattr(storage_io, 'STORAGE_S3_ACCESS_KEY_ID', 'access-key')
+    monkeypatch.setattr(storage_io, 'STORAGE_S3_SECRET_ACCESS_KEY', 'secret')
+    return server
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    server = _serve(tmp_path, monkeypatch)
+    yield tmp_path / 'storage'
+    server.shutdown()
+
+
+@pytest.fixture
+def flaky_storage(tmp_path, monkeypatch):
+    # Every other part upload returns 503
+    server = _serve(tmp_path, monkeypatch, fail_every=2)
+    yield tmp_path / 'storage'
+    server.shutdown()
+
+
+def _uploader(**kwargs) -> StorageUploader:
+    uploader = StorageUploader(multipart_threshold=PART_SIZE, **kwargs)
+    # Below the S3 minimum, so the tests stay small
+    uploader.part_size = PART_SIZE
+    return uploader
+
+
+def _source(tmp_path, size: int):
+    data = os.urandom(size)
+    path = tmp_path / 'source.bin'
+    path.write_bytes(data)
+    return path, data
+
+
+async def _upload(uploader: StorageUploader, path) -> dict:
+    try:
+        return await uploader.upload_file(path, 'videos', 'user/video.mp4', 'video/mp4')
+    finally:
+        await uploader.close()
+
+
+def test_large_file_is_uploaded_in_parts(storage, tmp_path):
+    path, data = _source(tmp_path, PART_SIZE * 4 + 123)
+
+    result = asyncio.run(_upload(_uploader(), path))
+
+    assert result == {'size': len(data), 'parts': 5, 'method': 'multipart'}
+    assert (storage / 'videos' / 'user' / 'video.mp4').read_bytes() == data
+    # The parts are cleaned up once the upload completes
+    assert not any((storage / '.multipart').iterdir())
+
+
+def test_failed_parts_are_retried(flaky_storage, tmp_path):
+    path, data = _source(tmp_path, PART_SIZE * 3)
+
+    result = asyncio.run(_upload(_uploader(concurrency=1), path))
+
+    assert result['parts'] == 3
+    assert (flaky_storage / 'videos' / 'user' / 'video.mp4').read_bytes() == data
+
+
+def test_failed_part_aborts_upload_after_retries(flaky_storage, tmp_path):
+    path, _ = _source(tmp_path, PART_SIZE * 3)
+
+    with pytest.raises(ExceptionGroup) as error:
+        asyncio.run(_upload(_uploader(concurrency=1, max_retries=0), path))
+
+    assert error.group_contains(storage_io.StorageUploadError)
+    assert not (flaky_storage / 'videos' / 'user' / 'video.mp4').exists()
+    assert not any((flaky_storage / '.multipart').iterdir())
+
+
+def test_small_file_is_uploaded_in_one_request(storage, tmp_path):
+    path, data = _source(tmp_path, PART_SIZE - 1)
+
+    result = asyncio.run(_upload(_uploader(), path))
+
+    assert result == {'size': len(data), 'parts': 1, 'method': 'single'}
+    assert (storage / 'videos' / 'user' / 'video.mp4').read_bytes() == data
+
+
+def test_without_s3_keys_upload_is_single(storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_io, 'STORAGE_S3_ACCESS_KEY_ID', None)
+    path, data = _source(tmp_path, PART_SIZE * 3)
+
+    result = asyncio.run(_upload(_uploader(), path))
+
+    assert result['method'] == 'single'
+    assert (storage / 'videos' / 'user' / 'video.mp4').read_bytes() == data
+
+
+def test_streaming_upload(storage):
+    data = os.urandom(PART_SIZE * 2 + 500)
+
+    async def stream() -> dict:
+        uploader = _uploader()
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+
+        upload = uploader.open_stream('clips', 'user/clip.mp4', 'video/mp4')
+        try:
+            await upload.write_from(reader)
+            return await upload.commit()
+        finally:
+            await uploader.close()
+
+    result = asyncio.run(stream())
+
+    assert result == {'size': len(data), 'parts': 3, 'method': 'stream'}
+    assert (storage / 'clips' / 'user' / 'clip.mp4').read_bytes() == data
+
+
+def _stored(storage, size: int) -> bytes:
+    data = os.urandom(size)
+    path = storage / 'videos' / 'user' / 'video.mp4'
+    path.parent.mkdir(parents=True)
+    path.write_bytes(data)
+    return data
+
+
+def test_download_verifies_size_and_etag(storage, tmp_path):
+    data = _stored(storage, 300_000)
+    dest = tmp_path / 'download.mp4'
+
+    size = stream_download(
+        'videos',
+        'user/video.mp4',
+        dest,
+        expected_size=len(data),
+        etag=f'"{hashlib.md5(data).hexdigest()}"',
+        chunk_size=4096
+    )
+
+    assert size == len(data)
+    assert dest.read_bytes() == data
+
+
+def test_download_resumes_partial_file(storage, tmp_path):
+    data = _stored(storage, 300_000)
+    dest = tmp_path / 'download.mp4'
+    dest.write_bytes(data[:100_000])
+
+    size = stream_download(
+        'videos',
+        'user/video.mp4',
+        dest,
+        etag=hashlib.md5(data).hexdigest()
+    )
+
+    assert size == len(data)
+    assert dest.read_bytes() == data
+
+
+def test_download_rejects_etag_mismatch(storage, tmp_path):
+    _stored(storage, 1000)
+
+    with pytest.raises(StorageIntegrityError):
+        stream_download(
+            'videos',
+            'user/video.mp4',
+            tmp_path / 'download.mp4',
+            etag=hashlib.md5(b'other').hexdigest()
+        )
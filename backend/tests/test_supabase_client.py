@@ -0,0 +1,383 @@
+"""Call-site query shapes, retries and per-loop clients"""
+
+import json
+import asyncio
+import httpx
+import pytest
+from postgrest import APIError
+from services import supabase_client
+from services.supabase_client import SupabaseClient
+
+
+class _Server:
+    """Records requests and answers them from a list of responses"""
+
+    def __init__(self, *responses):
+        self.requests = []
+        self.responses = list(responses)
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        response = self.responses.pop(0) if self.responses else httpx.Response(200, json=[])
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    @property
+    def params(self):
+        return list(self.requests[-1].url.params.multi_items())
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(supabase_client.random, 'random', lambda: 0.0)
+    monkeypatch.setattr(supabase_client, 'SUPABASE_MAX_RETRIES', 2)
+
+
+def _run(server: _Server, call):
+    """Run call(client) on a client answered by server"""
+    async def run():
+        client = SupabaseClient(
+            'https://project.supabase.co/',
+            'service-key',
+            transport=httpx.MockTransport(server)
+        )
+        try:
+            return await call(client)
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def test_maybe_single_row_by_id_and_owner():
+    # video_service.get_video, upload_stream.get_remaining_storage
+    server = _Server(
+        httpx.Response(200, json={'id': 'v1', 'title': 'Talk'}),
+        httpx.Response(406, json={
+            'code': 'PGRST116',
+            'details': 'The result contains 0 rows',
+            'hint': None,
+            'message': 'JSON object requested, multiple (or no) rows returned',
+        }),
+    )
+
+    def query(client):
+        return client.table('videos')\
+            .select('id, title')\
+            .eq('id', 'v1')\
+            .eq('user_id', 'u1')\
+            .maybe_single()\
+            .execute()
+
+    result = _run(server, query)
+    assert result.data == {'id': 'v1', 'title': 'Talk'}
+
+    request = server.requests[0]
+    assert request.method == 'GET'
+    assert request.url.host == 'project.supabase.co'
+    assert request.url.path == '/rest/v1/videos'
+    assert request.headers['apikey'] == 'service-key'
+    assert request.headers['authorization'] == 'Bearer service-key'
+    assert server.params == [
+        ('select', 'id,title'),
+        ('id', 'eq.v1'),
+        ('user_id', 'eq.u1'),
+    ]
+
+    # No row: no response at all, which callers treat as not found
+    assert _run(server, query) is None
+
+
+def test_single_row_with_embedded_resource():
+    # clip_service.export_clip
+    server = _Server(httpx.Response(200, json={'id': 'c1', 'videos': {'file_path': 'a.mp4'}}))
+
+    result = _run(server, lambda client: client.table('clips')
+        .select('id, start_time, end_time, videos(file_path, duration)')
+        .eq('id', 'c1')
+        .eq('user_id', 'u1')
+        .single()
+        .execute())
+
+    assert result.data['videos'] == {'file_path': 'a.mp4'}
+    assert server.params == [
+        ('select', 'id,start_time,end_time,videos(file_path,duration)'),
+        ('id', 'eq.c1'),
+        ('user_id', 'eq.u1'),
+    ]
+
+
+def test_insert_returns_the_new_row():
+    # video_service, youtube_service, job_queue.enqueue
+    server = _Server(httpx.Response(201, json=[{'id': 'v1'}]))
+
+    result = _run(server, lambda client: client.table('videos')
+        .insert({'title': 'Talk', 'metadata': {'fps': 30}})
+        .execute())
+
+    assert result.data[0]['id'] == 'v1'
+    request = server.requests[0]
+    assert request.method == 'POST'
+    assert request.headers['prefer'] == 'return=representation'
+    assert json.loads(request.content) == {'title': 'Talk', 'metadata': {'fps': 30}}
+
+
+def test_bulk_insert_without_returning():
+    # db_writer.insert_many(returning=False)
+    server = _Server(httpx.Response(201))
+
+    result = _run(server, lambda client: client.table('transcript_segments')
+        .insert([{'idx': 0}, {'idx': 1, 'text': 'hi'}], returning='minimal')
+        .execute())
+
+    assert result.data == []
+    request = server.requests[0]
+    assert request.headers['prefer'] == 'return=minimal'
+    assert sorted(server.params[0][1].split(',')) == ['"idx"', '"text"']
+    assert json.loads(request.content) == [{'idx': 0}, {'idx': 1, 'text': 'hi'}]
+
+
+def test_upsert_on_conflict():
+    # transcript_store.begin
+    server = _Server(httpx.Response(201, json=[{'id': 't1'}]))
+
+    result = _run(server, lambda client: client.table('transcripts')
+        .upsert({'video_id': 'v1', 'status': 'partial'}, on_conflict='video_id')
+        .execute())
+
+    assert result.data == [{'id': 't1'}]
+    assert server.requests[0].headers['prefer'] == 'return=representation,resolution=merge-duplicates'
+    assert server.params == [('on_conflict', 'video_id')]
+
+
+def test_update_by_id_and_worker():
+    # job_queue heartbeat and outcomes
+    server = _Server(httpx.Response(200, json=[{'id': 'j1'}]))
+
+    result = _run(server, lambda client: client.table('processing_jobs')
+        .update({'lease_expires_at': None})
+        .eq('id', 'j1')
+        .eq('worker_id', 'w1')
+        .execute())
+
+    assert result.data == [{'id': 'j1'}]
+    request = server.requests[0]
+    assert request.method == 'PATCH'
+    assert json.loads(request.content) == {'lease_expires_at': None}
+    assert server.params == [('id', 'eq.j1'), ('worker_id', 'eq.w1')]
+
+
+def test_update_of_several_ids():
+    # db_writer batched updates
+    server = _Server()
+
+    _run(server, lambda client: client.table('clips')
+        .update({'status': 'processing'})
+        .in_('id', ['c1', 'c2'])
+        .execute())
+
+    assert server.params == [('id', 'in.(c1,c2)')]
+
+
+def test_select_by_cache_keys_quotes_reserved_characters():
+    # transcript_store.find_by_cache_keys
+    server = _Server()
+
+    _run(server, lambda client: client.table('transcripts')
+        .select('id, video_id, cache_key')
+        .in_('cache_key', ['abc:whisper:base:en', 'plain'])
+        .execute())
+
+    assert server.params == [
+        ('select', 'id,video_id,cache_key'),
+        ('cache_key', 'in.("abc:whisper:base:en",plain)'),
+    ]
+
+
+def test_paged_range_query():
+    # transcript_store._fetch_segments
+    server = _Server(httpx.Response(200, json=[{'idx': 0}]))
+
+    result = _run(server, lambda client: client.table('transcript_segments')
+        .select('idx, start_time, end_time, text, words, word_timings')
+        .eq('transcript_id', 't1')
+        .gt('idx', -1)
+        .gt('end_time', 12.5)
+        .lt('start_time', 60)
+        .order('idx')
+        .limit(500)
+        .execute())
+
+    assert result.data == [{'idx': 0}]
+    assert server.params == [
+        ('select', 'idx,start_time,end_time,text,words,word_timings'),
+        ('transcript_id', 'eq.t1'),
+        ('idx', 'gt.-1'),
+        ('end_time', 'gt.12.5'),
+        ('start_time', 'lt.60'),
+        ('order', 'idx.asc'),
+        ('limit', '500'),
+    ]
+
+
+def test_delete():
+    # transcript_store.delete
+    server = _Server()
+
+    _run(server, lambda client: client.table('transcripts')
+        .delete()
+        .eq('id', 't1')
+        .execute())
+
+    assert server.requests[0].method == 'DELETE'
+    assert server.params == [('id', 'eq.t1')]
+
+
+def test_rpc():
+    # job_queue.lease
+    server = _Server(httpx.Response(200, json=[{'id': 'j1'}]))
+
+    result = _run(server, lambda client: client.rpc('lease_processing_job', {
+        'p_worker_id': 'w1',
+        'p_job_types': ['transcribe'],
+    }).execute())
+
+    assert result.data == [{'id': 'j1'}]
+    request = server.requests[0]
+    assert request.method == 'POST'
+    assert request.url.path == '/rest/v1/rpc/lease_processing_job'
+    assert json.loads(request.content) == {'p_worker_id': 'w1', 'p_job_types': ['transcribe']}
+
+
+def test_storage_and_postgrest_share_the_pool_with_their_own_urls():
+    # source_cache.stat_object and signed_url, next to a table query
+    server = _Server(
+        httpx.Response(200, json=[{'name': 'a.mp4', 'metadata': {'size': 5}}]),
+        httpx.Response(200, json={'signedURL': '/object/sign/videos/u1/a.mp4?token=t'}),
+        httpx.Response(200, json=[]),
+    )
+
+    async def calls(client):
+        bucket = client.storage.from_('videos')
+        items = await bucket.list('u1', {'search': 'a.mp4'})
+        signed = await bucket.create_signed_url('u1/a.mp4', 3600)
+        await client.table('videos').select('id').execute()
+        return items, signed
+
+    items, signed = _run(server, calls)
+
+    assert items == [{'name': 'a.mp4', 'metadata': {'size': 5}}]
+    listing = server.requests[0]
+    assert listing.url.path == '/storage/v1/object/list/videos'
+    assert json.loads(listing.content)['prefix'] == 'u1'
+    assert json.loads(listing.content)['search'] == 'a.mp4'
+
+    assert server.requests[1].url.path == '/storage/v1/object/sign/videos/u1/a.mp4'
+    assert json.loads(server.requests[1].content) == {'expiresIn': '3600'}
+    assert signed['signedURL'] == (
+        'https://project.supabase.co/storage/v1/object/sign/videos/u1/a.mp4?token=t'
+    )
+
+    assert server.requests[2].url.path == '/rest/v1/videos'
+    assert server.requests[2].headers['authorization'] == 'Bearer service-key'
+
+
+def test_idempotent_calls_are_retried():
+    server = _Server(
+        httpx.Response(503),
+        httpx.ConnectError('connection refused'),
+        httpx.Response(200, json=[{'id': 'v1'}]),
+    )
+
+    result = _run(server, lambda client: client.table('videos').select('id').execute())
+
+    assert result.data == [{'id': 'v1'}]
+    assert len(server.requests) == 3
+
+
+def test_upserts_and_storage_lookups_are_retried():
+    server = _Server(
+        httpx.Response(502),
+        httpx.Response(201, json=[{'id': 't1'}]),
+        httpx.Response(429),
+        httpx.Response(200, json={'signedURL': '/object/sign/videos/a.mp4?token=t'}),
+    )
+
+    async def calls(client):
+        await client.table('transcripts').upsert({'video_id': 'v1'}, on_conflict='video_id').execute()
+        await client.storage.from_('videos').create_signed_url('a.mp4', 60)
+
+    _run(server, calls)
+
+    assert len(server.requests) == 4
+
+
+def test_retries_give_up_with_last_error():
+    server = _Server(*[httpx.Response(503, json={
+        'message': 'busy',
+        'code': '503',
+        'hint': None,
+        'details': None,
+    })] * 3)
+
+    with pytest.raises(APIError) as error:
+        _run(server, lambda client: client.table('videos')
+            .update({'status': 'ready'})
+            .eq('id', 'v1')
+            .execute())
+
+    assert error.value.message == 'busy'
+    # SUPABASE_MAX_RETRIES=2
+    assert len(server.requests) == 3
+
+
+def test_inserts_and_rpcs_are_not_retried():
+    server = _Server(httpx.Response(503), httpx.Response(503))
+
+    with pytest.raises(APIError):
+        _run(server, lambda client: client.table('clips').insert({'a': 1}).execute())
+    with pytest.raises(APIError):
+        _run(server, lambda client: client.rpc('lease_processing_job', {}).execute())
+
+    assert len(server.requests) == 2
+
+
+def test_client_errors_are_not_retried():
+    server = _Server(httpx.Response(400, json={
+        'message': 'column does not exist',
+        'code': '42703',
+        'hint': None,
+        'details': None,
+    }))
+
+    with pytest.raises(APIError) as error:
+        _run(server, lambda client: client.table('videos').select('nope').execute())
+
+    assert error.value.code == '42703'
+    assert len(server.requests) == 1
+
+
+def test_each_loop_gets_its_own_client(monkeypatch):
+    monkeypatch.setenv('SUPABASE_URL', 'https://project.supabase.co')
+    monkeypatch.setenv('SUPABASE_SERVICE_ROLE_KEY', 'service-key')
+    monkeypatch.setattr(supabase_client, '_supabase_clients', {})
+
+    async def get():
+        client = supabase_client.get_supabase_client()
+        assert supabase_client.get_supabase_client() is client
+        return client
+
+    first = asyncio.run(get())
+    # The first loop closed without close_supabase_client(): dropped
+    second = asyncio.run(get())
+
+    assert second is not first
+    assert list(supabase_client._supabase_clients.values()) == [second]
+
+    async def close():
+        supabase_client.get_supabase_client()
+        await supabase_client.close_supabase_client()
+
+    asyncio.run(close())
+    assert supabase_client._supabase_clients == {}
@@ -0,0 +1,103 @@
+"""Transcript range queries"""
+
+from services.transcript import Transcript
+
+SEGMENTS = [
+    {'id': 0, 'start': 0.0, 'end': 2.5, 'text': ' Hello there.'},
+    {'id': 1, 'start': 3.0, 'end': 5.25, 'text': ' General Kenobi.'},
+    {'id': 2, 'start': 8.0, 'end': 9.0, 'text': ' Bye.'},
+]
+
+WORDS = [
+    {'word': ' Hello', 'start': 0.0, 'end': 1.0},
+    {'word': ' there.', 'start': 1.2, 'end': 2.5},
+    {'word': ' General', 'start': 3.0, 'end': 4.0},
+    {'word': ' Kenobi.', 'start': 4.1, 'end': 5.25},
+    {'word': ' Bye.', 'start': 8.0, 'end': 9.0},
+]
+
+
+def _transcript() -> Transcript:
+    # Out of order on purpose: the transcript sorts by start
+    return Transcript(
+        words=list(reversed(WORDS)),
+        segments=SEGMENTS,
+        language='en',
+        duration=10.0
+    )
+
+
+def test_round_trips_engine_dict():
+    data = {
+        'text': 'Hello there. General Kenobi. Bye.',
+        'language': 'en',
+        'duration': 10.0,
+        'segments': SEGMENTS,
+        'words': WORDS,
+    }
+
+    assert Transcript.from_dict(data).to_dict() == data
+
+
+def test_text_defaults_to_joined_segments():
+    transcript = _transcript()
+
+    assert transcript.text == 'Hello there. General Kenobi. Bye.'
+    assert transcript.word_count == 5
+    assert transcript.segment_count == 3
+
+
+def test_range_queries_return_overlapping_items():
+    transcript = _transcript()
+
+    assert [word['word'] for word in transcript.words_between(0.5, 3.5)] == [
+        ' Hello', ' there.', ' General'
+    ]
+    # [start, end): a word starting at `end` is excluded, one ending at
+    # `start` too
+    assert [word['word'] for word in transcript.words_between(1.0, 3.0)] == [' there.']
+    assert [segment['id'] for segment in transcript.segments_between(5.0, 8.5)] == [1, 2]
+    assert transcript.segments_between(5.5, 7.5) == []
+    assert transcript.text_between(2.0, 4.0) == 'Hello there. General Kenobi.'
+    assert transcript.text_between(5.5, 7.5) == ''
+
+
+def test_open_ranges():
+    transcript = _transcript()
+
+    assert len(transcript.words_between()) == 5
+    assert [segment['id'] for segment in transcript.segments_between(start=4.0)] == [1, 2]
+    assert [segment['id'] for segment in transcript.segments_between(end=3.0)] == [0]
+
+
+def test_segment_at():
+    transcript = _transcript()
+
+    assert transcript.segment_at(0.0)['text'] == ' Hello there.'
+    assert transcript.segment_at(4.0)['id'] == 1
+    assert transcript.segment_at(2.7) is None
+    assert transcript.segment_at(9.0) is None
+    assert transcript.segment_at(-1.0) is None
+
+
+def test_words_in_segment():
+    transcript = _transcript()
+
+    assert [transcript.word(i) for i in transcript.words_in_segment(0)] == [' Hello', ' there.']
+    assert [transcript.word(i) for i in transcript.words_in_segment(1)] == [' General', ' Kenobi.']
+    assert [transcript.word(i) for i in transcript.words_in_segment(2)] == [' Bye.']
+
+
+def test_times_survive_float32_storage():
+    transcript = Transcript(words=[{'word': ' x', 'start': 1234.567, 'end': 1234.891}])
+
+    assert transcript.words_between() == [{'word': ' x', 'start': 1234.567, 'end': 1234.891}]
+
+
+def test_empty_transcript():
+    transcript = Transcript()
+
+    assert transcript.text == ''
+    assert transcript.words_between(0, 10) == []
+    assert transcript.segment_at(1.0) is None
+    assert transcript.text_between() == ''
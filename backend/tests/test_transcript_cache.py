@@ -0,0 +1,197 @@
+"""Transcripts reused for identical audio, engine, model and language"""
+
+import asyncio
+import pytest
+from services import transcript_cache, transcription_service
+from services.audio_chunks import PCM_BYTES_PER_SAMPLE, PCM_SAMPLE_RATE
+from services.transcript_cache import TranscriptCache
+from services.transcript_store import TranscriptStore
+from services.transcription_engines import EngineRegistry, FakeEngine
+from services.transcription_service import TranscriptionService
+from services.workspace import WorkspaceManager
+
+SAMPLES = bytes(range(256)) * (PCM_BYTES_PER_SAMPLE * PCM_SAMPLE_RATE * 10 // 256)
+
+
+class _Store:
+    """Keeps finished transcripts by cache key"""
+
+    summarize = staticmethod(TranscriptStore.summarize)
+
+    def __init__(self):
+        self.rows = {}
+        self.transcripts = {}
+        self.queries = []
+
+    async def begin(self, video_id, user_id, language, engine):
+        return f"t-{video_id}"
+
+    async def append(self, transcript_id, part, first_idx):
+        return len(part['segments'])
+
+    async def finish(self, transcript_id, transcription, engine=None, cache_key=None):
+        video_id = transcript_id.split('-', 1)[1]
+        row = {'id': transcript_id, 'video_id': video_id, 'cache_key': cache_key}
+        self.rows[cache_key] = row
+        self.transcripts[transcript_id] = transcription
+        return self.summarize(transcription, transcript_id)
+
+    async def save(self, video_id, user_id, transcription, engine=None, cache_key=None):
+        return await self.finish(f"t-{video_id}", transcription, engine, cache_key)
+
+    async def delete(self, transcript_id):
+        pass
+
+    async def find_by_cache_keys(self, cache_keys):
+        self.queries.append(cache_keys)
+        return [self.rows[key] for key in cache_keys if key in self.rows]
+
+    async def load(self, row):
+        return self.transcripts[row['id']]
+
+
+class _CountingEngine(FakeEngine):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    async def transcribe(self, *args, **kwargs):
+        self.calls += 1
+        return await super().transcribe(*args, **kwargs)
+
+
+class _VideoService:
+    def __init__(self):
+        self.samples = SAMPLES
+
+    async def extract_audio(self, video_path, output_path, duration=None, progress=None, codec='mp3'):
+        with open(output_path, 'wb') as audio:
+            audio.write(self.samples)
+        return output_path
+
+
+class _BatchWriter:
+    async def update(self, table, row_id, values, wait=True):
+        pass
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = _Store()
+    monkeypatch.setattr(transcript_cache, 'get_transcript_store', lambda: store)
+    monkeypatch.setattr(transcription_service, 'get_transcript_store', lambda: store)
+    return store
+
+
+def _service(monkeypatch, tmp_path, *engines) -> TranscriptionService:
+    registry = EngineRegistry()
+    for engine in engines:
+        registry.register(engine)
+
+    workspaces = WorkspaceManager(tmp_path / 'work', min_free_bytes=0)
+    cache = TranscriptCache(enabled=True)
+    monkeypatch.setattr(transcription_service, 'VideoService', _VideoService)
+    monkeypatch.setattr(transcription_service, 'get_engine_registry', lambda: registry)
+    monkeypatch.setattr(transcription_service, 'get_workspace_manager', lambda: workspaces)
+    monkeypatch.setattr(transcription_service, 'get_transcript_cache', lambda: cache)
+    monkeypatch.setattr(transcription_service, 'get_batch_writer', lambda: _BatchWriter())
+    return TranscriptionService()
+
+
+def _transcribe(service: TranscriptionService, video_id: str, language: str = 'en'):
+    return asyncio.run(service.transcribe_video(
+        video_id,
+        'u1',
+        language,
+        source_path='/tmp/source.mp4'
+    ))
+
+
+def test_key_covers_audio_engine_model_and_language():
+    cache = TranscriptCache()
+    key = cache.key('hash', 'whisper', 'base', 'en')
+
+    assert cache.key('hash', 'whisper', 'base', 'en') == key
+    assert len({
+        key,
+        cache.key('other', 'whisper', 'base', 'en'),
+        cache.key('hash', 'groq', 'base', 'en'),
+        cache.key('hash', 'whisper', 'small', 'en'),
+        cache.key('hash', 'whisper', 'base', 'id'),
+    }) == 5
+
+
+def test_fingerprint_is_of_the_samples(tmp_path):
+    cache = TranscriptCache()
+    first, same, changed = (tmp_path / name for name in ('a.pcm', 'b.pcm', 'c.pcm'))
+    first.write_bytes(SAMPLES)
+    same.write_bytes(SAMPLES)
+    changed.write_bytes(SAMPLES[:-1] + b'\x01')
+
+    async def run():
+        return [await cache.fingerprint(str(path)) for path in (first, same, changed)]
+
+    hashes = asyncio.run(run())
+
+    assert hashes[0] == hashes[1] != hashes[2]
+
+
+def test_lookup_takes_the_first_engine_in_routing_order(store):
+    cache = TranscriptCache()
+    store.rows = {
+        'k-groq': {'id': 't1', 'cache_key': 'k-groq'},
+        'k-whisper': {'id': 't2', 'cache_key': 'k-whisper'},
+    }
+    store.transcripts = {'t1': 'groq transcript', 't2': 'whisper transcript'}
+
+    hit = asyncio.run(cache.lookup({'whisper': 'k-whisper', 'groq': 'k-groq'}))
+    miss = asyncio.run(cache.lookup({'fake': 'k-fake'}))
+
+    assert hit == ('whisper', store.rows['k-whisper'], 'whisper transcript')
+    assert miss is None
+    assert cache.stats() == {
+        'whisper': {'hits': 1, 'misses': 0, 'hit_rate': 1.0},
+        'fake': {'hits': 0, 'misses': 1, 'hit_rate': 0.0},
+    }
+
+
+def test_disabled_cache_never_queries(store):
+    cache = TranscriptCache(enabled=False)
+
+    assert asyncio.run(cache.lookup({'whisper': 'k'})) is None
+    assert store.queries == []
+
+
+def test_hit_returns_stored_transcript_without_calling_the_engine(monkeypatch, tmp_path, store):
+    engine = _CountingEngine()
+    service = _service(monkeypatch, tmp_path, engine)
+
+    first = _transcribe(service, 'v1')
+    # Another upload of the same file
+    second = _transcribe(service, 'v2')
+
+    assert engine.calls == 1
+    assert (first['cached'], second['cached']) == (False, True)
+    assert second['method'] == 'fake'
+    assert second['transcription'] is first['transcription']
+
+
+def test_different_audio_or_language_is_a_miss(monkeypatch, tmp_path, store):
+    engine = _CountingEngine()
+    service = _service(monkeypatch, tmp_path, engine)
+
+    _transcribe(service, 'v1')
+    assert _transcribe(service, 'v2', language='id')['cached'] is False
+
+    service.video_service.samples = SAMPLES[:-1] + b'\x01'
+    assert _transcribe(service, 'v3')['cached'] is False
+
+    assert engine.calls == 3
+
+
+def test_different_engine_model_is_a_miss(monkeypatch, tmp_path, store):
+    _transcribe(_service(monkeypatch, tmp_path, _CountingEngine(model='base')), 'v1')
+
+    engine = _CountingEngine(model='small')
+    assert _transcribe(_service(monkeypatch, tmp_path, engine), 'v2')['cached'] is False
+    assert engine.calls == 1
@@ -0,0 +1,168 @@
+"""TranscriptStore write order and the summary kept on videos"""
+
+import asyncio
+from types import SimpleNamespace
+import pytest
+from services import db_writer, transcript_store
+from services.db_writer import BatchWriter
+from services.transcript_store import TranscriptStore
+
+TRANSCRIPTION = {
+    'text': 'Hello there.',
+    'language': 'en',
+    'duration': 3.0,
+    'segments': [{'start': 0.0, 'end': 2.5, 'text': ' Hello there.'}],
+    'words': [
+        {'word': ' Hello', 'start': 0.0, 'end': 1.0},
+        {'word': ' there.', 'start': 1.2, 'end': 2.5},
+    ],
+}
+
+
+class _Query:
+    def __init__(self, client, table: str):
+        self.client = client
+        self.table = table
+        self.method = None
+        self.body = None
+        self.filters = []
+
+    def _set(self, method, body=None):
+        self.method = method
+        self.body = body
+        return self
+
+    def upsert(self, row, on_conflict=None):
+        return self._set('upsert', row)
+
+    def insert(self, rows, returning='representation'):
+        return self._set('insert', rows)
+
+    def update(self, values):
+        return self._set('update', values)
+
+    def delete(self):
+        return self._set('delete')
+
+    def select(self, columns):
+        return self._set('select', columns)
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def maybe_single(self):
+        return self
+
+    async def execute(self):
+        self.client.requests.append((self.table, self.method, self.body, self.filters))
+        if (self.table, self.method) == self.client.fail_on:
+            raise RuntimeError(f"{self.method} {self.table} failed")
+        if self.method == 'upsert':
+            return SimpleNamespace(data=[{'id': 't1'}])
+        if self.method == 'select':
+            return SimpleNamespace(data=self.client.rows[self.table])
+        return SimpleNamespace(data=[])
+
+
+class _Client:
+    def __init__(self):
+        self.requests = []
+        self.fail_on = None
+        self.rows = {}
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = _Client()
+    monkeypatch.setattr(transcript_store, 'get_supabase_client', lambda: client)
+    monkeypatch.setattr(db_writer, 'get_supabase_client', lambda: client)
+    monkeypatch.setattr(db_writer, '_batch_writer', BatchWriter(window=0.0))
+    return client
+
+
+def test_save_marks_complete_after_segments(client):
+    summary = asyncio.run(
+        TranscriptStore().save('v1', 'u1', TRANSCRIPTION, engine='groq', cache_key='k')
+    )
+
+    steps = [(table, method) for table, method, _, _ in client.requests]
+    assert steps == [
+        ('transcripts', 'upsert'),
+        ('transcript_segments', 'delete'),
+        ('transcript_segments', 'insert'),
+        ('transcripts', 'update'),
+    ]
+
+    _, _, row, _ = client.requests[0]
+    assert row['status'] == 'partial'
+    assert row['cache_key'] is None
+
+    _, _, values, filters = client.requests[-1]
+    assert values['status'] == 'complete'
+    assert values['cache_key'] == 'k'
+    assert filters == [('id', 't1')]
+
+    # The text goes to the transcripts row, not to videos.transcription
+    assert values['text'] == 'Hello there.'
+    assert summary == {
+        'status': 'complete',
+        'language': 'en',
+        'duration': 3.0,
+        'segment_count': 1,
+        'word_count': 2,
+        'format_version': 1,
+        'transcript_id': 't1',
+    }
+
+
+def test_failed_save_deletes_the_transcript(client):
+    client.fail_on = ('transcript_segments', 'insert')
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(TranscriptStore().save('v1', 'u1', TRANSCRIPTION))
+
+    table, method, _, filters = client.requests[-1]
+    assert (table, method, filters) == ('transcripts', 'delete', [('id', 't1')])
+    assert not any(
+        method == 'update' and body.get('status') == 'complete'
+        for _, method, body, _ in client.requests
+    )
+
+
+def test_text_is_rebuilt_from_segment_text(client):
+    client.rows = {
+        'transcripts': {'id': 't1', 'format_version': 1, 'status': 'complete'},
+        'transcript_segments': [
+            {'idx': 0, 'text': ' Hello there.'},
+            {'idx': 1, 'text': ' General Kenobi.'},
+        ],
+    }
+
+    text = asyncio.run(TranscriptStore().get_text('v1', 'u1'))
+
+    assert text == 'Hello there. General Kenobi.'
+    # Words and timings are not read
+    _, _, columns, _ = client.requests[-1]
+    assert columns == 'idx, text'
+
+
+@pytest.mark.parametrize('transcript', [None, {'id': 't1', 'format_version': 1, 'status': 'partial'}])
+def test_no_text_without_a_complete_transcript(client, transcript):
+    client.rows = {'transcripts': transcript}
+
+    assert asyncio.run(TranscriptStore().get_text('v1', 'u1')) is None
+    assert [table for table, _, _, _ in client.requests] == ['transcripts']
@@ -0,0 +1,152 @@
+"""Transcript delivered window by window while an engine is running"""
+
+import asyncio
+import pytest
+from services.audio_chunks import PCM_BYTES_PER_SAMPLE, PCM_SAMPLE_RATE
+from services.transcript_stream import TranscriptStream
+from services.transcription_engines import EngineRegistry, FakeEngine
+
+# A stream that is never finished fails the test instead of hanging it
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def pcm(tmp_path):
+    path = tmp_path / 'audio.pcm'
+    path.write_bytes(bytes(PCM_BYTES_PER_SAMPLE * PCM_SAMPLE_RATE * 30))
+    return str(path)
+
+
+class _FailsPartWay(FakeEngine):
+    """Delivers the parts ending by `fail_at` seconds, then fails"""
+
+    def __init__(self, fail_at: float, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_at = fail_at
+
+    async def transcribe(self, pcm_path, language, progress=None, on_partial=None):
+        async def partial(part):
+            if part['end'] > self.fail_at:
+                raise RuntimeError(f"Engine {self.name} failed")
+            await on_partial(part)
+
+        return await super().transcribe(pcm_path, language, progress, partial)
+
+
+def _registry(*engines) -> EngineRegistry:
+    registry = EngineRegistry()
+    for engine in engines:
+        registry.register(engine)
+    return registry
+
+
+async def _transcribe(registry: EngineRegistry, pcm: str, stream: TranscriptStream) -> None:
+    """Publish parts as TranscriptionService does, finishing the stream"""
+    async def publish(engine, part):
+        await stream.publish(part)
+        # A chunked engine awaits its next chunk in between
+        await asyncio.sleep(0.01)
+
+    try:
+        await registry.transcribe(registry.rank(30), pcm, 'en', on_partial=publish)
+    except Exception as e:
+        await stream.finish(e)
+        raise
+    await stream.finish()
+
+
+def _follow(stream: TranscriptStream, seconds: float, seen: list) -> asyncio.Task:
+    async def follow():
+        async for start, end, text in stream.windows(seconds):
+            seen.append((start, end, text.split(), stream.transcribed_until))
+
+    return asyncio.create_task(follow())
+
+
+def _words(first: int, last: int):
+    return [f"w{index}" for index in range(first, last)]
+
+
+def test_windows_are_delivered_as_they_are_transcribed(pcm):
+    seen = []
+
+    async def run():
+        stream = TranscriptStream()
+        follower = _follow(stream, 10, seen)
+        await _transcribe(_registry(FakeEngine()), pcm, stream)
+        await asyncio.wait_for(follower, TIMEOUT)
+
+    asyncio.run(run())
+
+    assert [(start, end, words) for start, end, words, _ in seen] == [
+        (0.0, 10.0, _words(0, 20)),
+        (10.0, 20.0, _words(20, 40)),
+        (20.0, 30.0, _words(40, 60)),
+    ]
+    # The first window did not wait for the rest of the audio
+    assert seen[0][3] < 30
+
+
+def test_fallback_engine_does_not_repeat_published_segments(pcm):
+    first = _FailsPartWay(12, name='first')
+    first.speed_hint = 2000.0
+
+    async def run():
+        stream = TranscriptStream()
+        await _transcribe(_registry(first, FakeEngine(name='second')), pcm, stream)
+        return stream
+
+    stream = asyncio.run(run())
+
+    assert ''.join(segment['text'] for segment in stream.segments).split() == _words(0, 60)
+    assert [word['word'].strip() for word in stream.words] == _words(0, 60)
+    assert stream.done and stream.error is None
+
+
+def test_engine_failure_ends_the_stream_with_the_error(pcm):
+    seen = []
+
+    async def run():
+        stream = TranscriptStream()
+        follower = _follow(stream, 10, seen)
+
+        with pytest.raises(RuntimeError, match='Engine only failed'):
+            await _transcribe(_registry(_FailsPartWay(22, name='only')), pcm, stream)
+
+        with pytest.raises(RuntimeError, match='Transcription failed: Engine only failed'):
+            await asyncio.wait_for(follower, TIMEOUT)
+
+        # Later waiters fail straight away instead of waiting forever
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(stream.wait_until(30), TIMEOUT)
+
+        return stream
+
+    stream = asyncio.run(run())
+
+    # Windows completed before the failure were still delivered
+    assert [(start, end) for start, end, _, _ in seen] == [(0.0, 10.0), (10.0, 20.0)]
+    assert stream.transcribed_until == 20.0
+
+
+def test_short_remainder_joins_the_last_window():
+    async def run():
+        stream = TranscriptStream()
+        for start in range(0, 32, 4):
+            end = min(start + 4, 32)
+            await stream.publish({
+                'start': start,
+                'end': end,
+                'segments': [{'start': start, 'end': end, 'text': f" s{start}"}],
+                'words': [],
+            })
+        await stream.finish()
+        return [
+            (start, end, text)
+            async for start, end, text in stream.windows(10, min_seconds=5)
+        ]
+
+    windows = asyncio.run(run())
+
+    assert [(start, end) for start, end, _ in windows] == [(0.0, 10.0), (10.0, 20.0), (20.0, 32)]
+    assert windows[-1][2] == 's20 s24 s28'
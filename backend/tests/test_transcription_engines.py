@@ -0,0 +1,239 @@
+"""EngineRegistry routing and fallback with FakeEngine"""
+
+import asyncio
+import contextlib
+from types import SimpleNamespace
+from typing import Dict
+import pytest
+from groq import RateLimitError
+from services import transcription_engines
+from services.audio_chunks import PCM_BYTES_PER_SAMPLE, PCM_SAMPLE_RATE, AudioChunk
+from services.transcription_engines import EngineRegistry, FakeEngine, GroqEngine, WhisperEngine
+
+
+@pytest.fixture
+def pcm(tmp_path):
+    path = tmp_path / 'audio.pcm'
+    path.write_bytes(bytes(PCM_BYTES_PER_SAMPLE * PCM_SAMPLE_RATE * 30))
+    return str(path)
+
+
+def _registry(*engines) -> EngineRegistry:
+    registry = EngineRegistry()
+    for engine in engines:
+        registry.register(engine)
+    return registry
+
+
+def _fake(name: str, speed: float = 1000.0, **kwargs) -> FakeEngine:
+    engine = FakeEngine(name=name, **kwargs)
+    engine.speed_hint = speed
+    return engine
+
+
+class _Unavailable(FakeEngine):
+    def available(self) -> bool:
+        return False
+
+
+def test_rank_prefers_faster_engine():
+    registry = _registry(_fake('slow', speed=10), _fake('fast', speed=100))
+
+    assert [engine.name for engine in registry.rank(600)] == ['fast', 'slow']
+
+
+def test_rank_counts_fixed_overhead():
+    quick_start = _fake('local', speed=10)
+    slow_start = _fake('remote', speed=100)
+    slow_start.overhead_hint = 30
+
+    registry = _registry(quick_start, slow_start)
+
+    # 60s of audio: 6s locally against 30.6s remotely
+    assert [engine.name for engine in registry.rank(60)] == ['local', 'remote']
+    # 1h: 360s locally against 66s remotely
+    assert [engine.name for engine in registry.rank(3600)] == ['remote', 'local']
+
+
+def test_rank_skips_unavailable_and_too_long_audio():
+    limited = _fake('limited')
+    limited.max_audio_seconds = 60
+    registry = _registry(limited, _Unavailable(name='offline'), _fake('any', speed=1))
+
+    assert [engine.name for engine in registry.rank(30)] == ['limited', 'any']
+    assert [engine.name for engine in registry.rank(120)] == ['any']
+
+
+def test_failing_engine_falls_back_and_ranks_last(pcm):
+    registry = _registry(_fake('broken', speed=100, fail=True), _fake('backup', speed=10))
+
+    engine, transcript = asyncio.run(
+        registry.transcribe(registry.rank(30), pcm, 'en')
+    )
+
+    assert engine.name == 'backup'
+    assert transcript.duration == 30
+    assert registry.stats()['broken']['failures'] == 1
+    assert registry.stats()['backup']['jobs'] == 1
+    # Above TRANSCRIPTION_MAX_ERROR_RATE: routed last despite being faster
+    assert [engine.name for engine in registry.rank(30)] == ['backup', 'broken']
+
+
+def test_all_engines_failing_raises_last_error(pcm):
+    registry = _registry(_fake('a', fail=True), _fake('b', speed=1, fail=True))
+
+    with pytest.raises(RuntimeError, match='Engine b failed'):
+        asyncio.run(registry.transcribe(registry.rank(30), pcm, 'en'))
+
+    assert registry.stats()['a']['in_flight'] == 0
+    assert registry.stats()['b']['in_flight'] == 0
+
+
+def test_no_engines_raises(pcm):
+    with pytest.raises(RuntimeError, match='No transcription engine'):
+        asyncio.run(EngineRegistry().transcribe([], pcm, 'en'))
+
+
+def test_partials_cover_audio_in_order(pcm):
+    registry = _registry(_fake('fake'))
+    parts = []
+
+    async def on_partial(engine, part):
+        parts.append((engine.name, part))
+
+    _, transcript = asyncio.run(
+        registry.transcribe(registry.rank(30), pcm, 'en', on_partial=on_partial)
+    )
+
+    assert {name for name, _ in parts} == {'fake'}
+    assert parts[0][1]['start'] == 0
+    assert parts[-1][1]['end'] == 30
+    for (_, previous), (_, part) in zip(parts, parts[1:]):
+        assert part['start'] == previous['end']
+    assert [
+        segment['text'] for _, part in parts for segment in part['segments']
+    ] == [segment['text'] for segment in transcript.segments_between()]
+
+
+class _RateLimited(RateLimitError):
+    def __init__(self):
+        Exception.__init__(self, 'rate limited')
+        self.response = SimpleNamespace(headers={'retry-after': '0'})
+
+
+class _Bucket:
+    def __init__(self):
+        self.acquired = []
+        self.held = []
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        self.acquired.append(tokens)
+
+    def hold(self, seconds: float) -> None:
+        self.held.append(seconds)
+
+
+class _Transcriptions:
+    def __init__(self, rate_limited: int):
+        self.rate_limited = rate_limited
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.rate_limited:
+            raise _RateLimited()
+        return SimpleNamespace(text=' hi', language='en', segments=[], words=[])
+
+
+def test_groq_retry_charges_audio_once():
+    engine = GroqEngine(api_key='key')
+    engine.requests, engine.audio = _Bucket(), _Bucket()
+    transcriptions = _Transcriptions(rate_limited=2)
+    engine.client = SimpleNamespace(audio=SimpleNamespace(transcriptions=transcriptions))
+
+    result = asyncio.run(engine._request(b'audio', 30.0, 'en'))
+
+    assert result['text'] == ' hi'
+    assert transcriptions.calls == 3
+    assert engine.requests.acquired == [1.0, 1.0, 1.0]
+    assert engine.requests.held == [0.0, 0.0]
+    assert engine.audio.acquired == [30.0]
+
+
+class _Chunks:
+    """Three 10s chunks; the last fails at once, the others are slow"""
+
+    def __init__(self, monkeypatch):
+        self.started = []
+        self.cancelled = []
+        self.parts = []
+        monkeypatch.setattr(transcription_engines, 'plan_chunks', lambda duration, silences, **kwargs: [
+            AudioChunk(index, index * 10.0, index * 10.0 + 10, index * 10.0, index * 10.0 + 10)
+            for index in range(3)
+        ])
+
+    async def run(self, start: float, result: Dict):
+        self.started.append(start)
+        if start == 20.0:
+            raise RuntimeError('chunk failed')
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            self.cancelled.append(start)
+            raise
+        return result
+
+    async def on_partial(self, part: Dict) -> None:
+        self.parts.append(part)
+
+    def transcribe(self, engine, pcm: str) -> None:
+        async def run():
+            with pytest.raises(RuntimeError, match='chunk failed'):
+                await engine.transcribe(pcm, 'en', on_partial=self.on_partial)
+            # Long enough for the slow chunks to finish, had they kept running
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+
+
+def test_groq_chunk_failure_cancels_the_other_chunks(pcm, monkeypatch):
+    chunks = _Chunks(monkeypatch)
+    engine = GroqEngine(api_key='key')
+
+    async def encode_speech(pcm_path, start, duration, codec):
+        return str(start).encode()
+
+    async def request(data, seconds, language):
+        return await chunks.run(float(data), {'language': 'en', 'segments': [], 'words': []})
+
+    engine.video_service = SimpleNamespace(encode_speech=encode_speech)
+    engine._request = request
+
+    chunks.transcribe(engine, pcm)
+
+    assert sorted(chunks.started) == [0.0, 10.0, 20.0]
+    assert sorted(chunks.cancelled) == [0.0, 10.0]
+    assert chunks.parts == []
+
+
+def test_whisper_chunk_failure_cancels_the_other_chunks(pcm, monkeypatch):
+    chunks = _Chunks(monkeypatch)
+
+    async def run_transcribe(func, model, pcm_path, language, start, length):
+        result = {'text': '', 'language': 'en', 'segments': []}
+        return await chunks.run(start, {
+            'result': result, 'load_seconds': 0.0, 'inference_seconds': 0.0,
+            'pid': 1, 'registry': {'models': {}},
+        })
+
+    monkeypatch.setattr(transcription_engines, 'run_transcribe', run_transcribe)
+    # All chunks at once, whatever the pool size here
+    monkeypatch.setattr(transcription_engines, 'get_governor', lambda: SimpleNamespace(
+        slot=lambda pool: contextlib.nullcontext()
+    ))
+
+    chunks.transcribe(WhisperEngine(), pcm)
+
+    assert sorted(chunks.started) == [0.0, 10.0, 20.0]
+    assert sorted(chunks.cancelled) == [0.0, 10.0]
+    assert chunks.parts == []
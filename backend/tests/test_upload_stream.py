@@ -0,0 +1,144 @@
+"""Streaming multipart uploads and early storage-limit rejection"""
+
+import os
+import asyncio
+import hashlib
+from types import SimpleNamespace
+import pytest
+from services import upload_stream
+from services.upload_stream import UploadTooLargeError, receive_video_upload
+
+BOUNDARY = 'xYzBoundary123'
+
+
+class _Request:
+    """Starlette request stand-in serving the body in fixed-size reads"""
+
+    def __init__(self, body: bytes, read_size: int, content_length: bool = True, fail_after: int = None):
+        self.body = body
+        self.read_size = read_size
+        self.fail_after = fail_after
+        self.reads = 0
+        self.headers = {'content-type': f"multipart/form-data; boundary={BOUNDARY}"}
+        if content_length:
+            self.headers['content-length'] = str(len(body))
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.read_size):
+            if self.fail_after is not None and self.reads >= self.fail_after:
+                raise ConnectionResetError('client disconnected')
+            self.reads += 1
+            yield self.body[start:start + self.read_size]
+        yield b''
+
+
+def _body(data: bytes, fields_first=None, fields_last=None, content_type='video/mp4') -> bytes:
+    def field(name, value):
+        return (
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n"
+        ).encode()
+
+    return b''.join([
+        *(field(name, value) for name, value in (fields_first or {}).items()),
+        (
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="talk.mp4"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode(),
+        data,
+        b'\r\n',
+        *(field(name, value) for name, value in (fields_last or {}).items()),
+        f"--{BOUNDARY}--\r\n".encode(),
+    ])
+
+
+@pytest.fixture
+def remaining(monkeypatch):
+    """10000 bytes left for u1; returns the users looked up"""
+    lookups = []
+
+    async def get_remaining_storage(user_id):
+        lookups.append(user_id)
+        return 10_000
+
+    monkeypatch.setattr(upload_stream, 'get_remaining_storage', get_remaining_storage)
+    monkeypatch.setattr(
+        upload_stream,
+        'get_workspace_manager',
+        lambda: SimpleNamespace(ensure_headroom=lambda size: None)
+    )
+    monkeypatch.setattr(upload_stream, 'MULTIPART_OVERHEAD_BYTES', 1024)
+    return lookups
+
+
+def _receive(request, tmp_path, user_id=None):
+    return asyncio.run(receive_video_upload(request, tmp_path, user_id))
+
+
+@pytest.mark.parametrize('read_size', [1, 7, 64, 4096])
+def test_boundaries_split_across_reads(tmp_path, remaining, read_size):
+    # Bytes that look like a boundary, without the leading CRLF
+    data = os.urandom(3000) + f"--{BOUNDARY}".encode() + os.urandom(500)
+    request = _Request(_body(data, fields_first={'user_id': 'u1', 'title': 'Talk'}), read_size)
+
+    result = _receive(request, tmp_path)
+
+    with open(result['file_path'], 'rb') as uploaded:
+        assert uploaded.read() == data
+    assert result['user_id'] == 'u1'
+    assert result['size'] == len(data)
+    assert result['sha256'] == hashlib.sha256(data).hexdigest()
+    assert (result['filename'], result['content_type']) == ('talk.mp4', 'video/mp4')
+    assert remaining == ['u1']
+
+
+def test_content_length_over_the_limit_is_refused_before_reading(tmp_path, remaining):
+    request = _Request(_body(os.urandom(20_000)), 4096)
+
+    with pytest.raises(UploadTooLargeError):
+        _receive(request, tmp_path, user_id='u1')
+
+    assert request.reads == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_stream_is_aborted_once_it_crosses_the_limit(tmp_path, remaining):
+    # No Content-Length: only the received bytes can tell
+    request = _Request(_body(os.urandom(50_000)), 1024, content_length=False)
+
+    with pytest.raises(UploadTooLargeError):
+        _receive(request, tmp_path, user_id='u1')
+
+    assert request.reads < 20
+    # The partial file is removed
+    assert os.listdir(tmp_path) == []
+
+
+def test_user_field_after_the_file_is_checked_at_the_end(tmp_path, remaining):
+    request = _Request(_body(os.urandom(12_000), fields_last={'user_id': 'u1'}), 4096, content_length=False)
+
+    with pytest.raises(UploadTooLargeError):
+        _receive(request, tmp_path)
+
+    assert remaining == ['u1']
+    assert os.listdir(tmp_path) == []
+
+
+def test_disconnect_removes_the_partial_file(tmp_path, remaining):
+    request = _Request(_body(os.urandom(8000)), 1024, fail_after=4)
+
+    with pytest.raises(ConnectionResetError):
+        _receive(request, tmp_path, user_id='u1')
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_non_video_file_is_refused(tmp_path, remaining):
+    request = _Request(_body(b'hello', content_type='text/plain'), 4096)
+
+    with pytest.raises(ValueError, match='must be a video'):
+        _receive(request, tmp_path, user_id='u1')
+
+    assert os.listdir(tmp_path) == []
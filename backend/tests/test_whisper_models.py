@@ -0,0 +1,90 @@
+"""WhisperModelRegistry eviction"""
+
+import time
+import weakref
+import pytest
+from services import whisper_models
+from services.whisper_models import WhisperModelRegistry, _LoadedModel
+
+GIB = 1024 ** 3
+
+
+class _Model:
+    def __init__(self):
+        # Only the cycle collector frees it, like a real torch module
+        self.cycle = self
+
+    def parameters(self):
+        return []
+
+    def buffers(self):
+        return []
+
+
+class _Memory:
+    """Available memory goes up as models are actually freed"""
+
+    def __init__(self, available: int, model_bytes: int):
+        self.available = available
+        self.model_bytes = model_bytes
+        self.models = []
+
+    def track(self, model) -> None:
+        self.models.append(weakref.ref(model))
+
+    def __call__(self) -> int:
+        freed = sum(1 for model in self.models if model() is None)
+        return self.available + freed * self.model_bytes
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    memory = _Memory(available=GIB // 2, model_bytes=GIB)
+    monkeypatch.setattr(whisper_models, 'available_memory_bytes', memory)
+    return memory
+
+
+def _registry(memory: _Memory, names, warm=()) -> WhisperModelRegistry:
+    registry = WhisperModelRegistry(warm=list(warm), idle_ttl=3600, min_available_bytes=GIB)
+    for name in names:
+        model = _Model()
+        memory.track(model)
+        registry._models[name] = _LoadedModel(model, 0.0)
+    return registry
+
+
+def test_memory_pressure_drops_one_model_at_a_time(memory):
+    registry = _registry(memory, ['tiny', 'base', 'small'])
+
+    assert registry.evict() == ['tiny']
+    assert list(registry._models) == ['base', 'small']
+
+
+def test_warm_models_go_last(memory):
+    memory.model_bytes = GIB // 4
+    registry = _registry(memory, ['base', 'tiny', 'small'], warm=['base'])
+
+    assert registry.evict() == ['tiny', 'small']
+    assert list(registry._models) == ['base']
+
+    memory.available = 0
+    assert registry.evict() == ['base']
+
+
+def test_models_in_use_and_kept_model_stay(memory):
+    memory.model_bytes = 0
+    registry = _registry(memory, ['tiny', 'base', 'small'])
+    registry._models['tiny'].in_use = 1
+
+    assert registry.evict(keep='small') == ['base']
+    assert list(registry._models) == ['tiny', 'small']
+
+
+def test_idle_ttl_spares_warm_models(memory):
+    memory.available = 2 * GIB
+    registry = _registry(memory, ['base', 'tiny'], warm=['base'])
+    for loaded in registry._models.values():
+        loaded.last_used = time.monotonic() - 7200
+
+    assert registry.evict() == ['tiny']
+    assert list(registry._models) == ['base']
@@ -0,0 +1,130 @@
+"""Workspace locking and cleanup of workspaces, staging dirs and incoming files"""
+
+import os
+import fcntl
+import time
+import asyncio
+from services.workspace import WorkspaceManager
+
+
+def _manager(tmp_path) -> WorkspaceManager:
+    return WorkspaceManager(
+        tmp_path / 'work',
+        min_free_bytes=0,
+        incoming_dir=tmp_path / 'incoming',
+        incoming_ttl=3600
+    )
+
+
+def _age(path, seconds: float) -> None:
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_workspace_is_removed_after_the_block(tmp_path):
+    manager = _manager(tmp_path)
+
+    async def run():
+        async with manager.workspace('transcribe-video/1') as workspace:
+            workspace.file('audio.pcm').write_bytes(b'x' * 10)
+            assert workspace.path.name.startswith(f"{os.getpid()}-transcribe-video_1-")
+            return workspace.path
+
+    path = asyncio.run(run())
+
+    assert not path.exists()
+    assert list(manager.root.iterdir()) == []
+
+
+def test_active_workspace_survives_cleanup(tmp_path):
+    manager = _manager(tmp_path)
+
+    async def run():
+        async with manager.workspace('job') as workspace:
+            # Another manager starting up, e.g. a restarted worker
+            assert _manager(tmp_path).cleanup_orphans() == 0
+            assert workspace.path.is_dir()
+
+    asyncio.run(run())
+
+
+def test_unlocked_workspace_is_orphaned_even_if_pid_is_alive(tmp_path):
+    root = tmp_path / 'work'
+    # Left by a previous run whose pid is ours now
+    orphan = root / f"{os.getpid()}-job-deadbeef"
+    orphan.mkdir(parents=True)
+    (orphan / '.lock').touch()
+    (orphan / 'audio.pcm').write_bytes(b'x')
+    legacy = root / "1-job-cafebabe"
+    legacy.mkdir()
+
+    manager = _manager(tmp_path)
+
+    assert not orphan.exists()
+    assert not legacy.exists()
+    assert manager.cleanup_orphans() == 0
+
+
+def test_workspace_locked_by_another_holder_is_kept(tmp_path):
+    root = tmp_path / 'work'
+    held = root / "7-job-0badf00d"
+    held.mkdir(parents=True)
+    fd = os.open(held / '.lock', os.O_RDWR | os.O_CREAT)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+
+    try:
+        _manager(tmp_path)
+        assert held.is_dir()
+    finally:
+        os.close(fd)
+
+    assert _manager(tmp_path).cleanup_orphans() == 0
+    assert not held.exists()
+
+
+def test_staging_dir_left_before_the_rename_is_removed(tmp_path):
+    root = tmp_path / 'work'
+    # Process died between mkdir and rename
+    stale = root / ".7-job-deadbeef"
+    stale.mkdir(parents=True)
+    (stale / '.lock').touch()
+    _age(stale, 600)
+    # Being created right now: not locked yet, but too recent to be stale
+    fresh = root / ".8-job-cafebabe"
+    fresh.mkdir()
+
+    _manager(tmp_path)
+
+    assert not stale.exists()
+    assert fresh.is_dir()
+
+
+def test_locked_staging_dir_is_kept(tmp_path):
+    root = tmp_path / 'work'
+    staging = root / ".7-job-0badf00d"
+    staging.mkdir(parents=True)
+    fd = os.open(staging / '.lock', os.O_RDWR | os.O_CREAT)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    _age(staging, 600)
+
+    try:
+        _manager(tmp_path)
+        assert staging.is_dir()
+    finally:
+        os.close(fd)
+
+
+def test_expired_incoming_files_are_removed(tmp_path):
+    incoming = tmp_path / 'incoming'
+    incoming.mkdir()
+    expired = incoming / 'old.mp4'
+    expired.write_bytes(b'x')
+    _age(expired, 7200)
+    waiting = incoming / 'new.mp4'
+    waiting.write_bytes(b'x')
+
+    manager = _manager(tmp_path)
+
+    assert not expired.exists()
+    assert waiting.exists()
+    assert manager.cleanup_orphans() == 0
@@ -0,0 +1,142 @@
+"""
+ClipForge Worker - runs queued processing jobs
+Leases rows from processing_jobs and executes them in a pool of processes
+"""
+
+import os
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from typing import List, Optional
+
+from services.job_queue import get_job_queue
+from services.job_worker import JobWorker, build_job_handlers
+from services.executor import shutdown_executors
+from services.supabase_client import close_supabase_client
+from services.db_writer import get_batch_writer
+from services.storage_io import get_storage_uploader
+from services.workspace import get_workspace_manager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_worker_process(
+    concurrency: int,
+    job_types: Optional[List[str]],
+    poll_interval: float
+) -> None:
+    """Entry point of a single worker process"""
+    # Removes workspaces left behind by crashed processes
+    get_workspace_manager()
+
+    handlers = build_job_handlers()
+    if job_types:
+        handlers = {
+            job_type: handler
+            for job_type, handler in handlers.items()
+            if job_type in job_types
+        }
+
+    worker = JobWorker(
+        get_job_queue(),
+        handlers,
+        concurrency=concurrency,
+        poll_interval=poll_interval
+    )
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.stop)
+        get_storage_uploader().open()
+        try:
+            await worker.run()
+        finally:
+            await get_batch_writer().close()
+            await get_storage_uploader().close()
+            await close_supabase_client()
+
+    try:
+        asyncio.run(main())
+    finally:
+        shutdown_executors()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run ClipForge job workers")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=int(os.getenv("WORKER_PROCESSES", 2)),
+        help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("WORKER_CONCURRENCY", 2)),
+        help="Jobs run concurrently by each process"
+    )
+    parser.add_argument(
+        "--job-types",
+        default=os.getenv("WORKER_JOB_TYPES", ""),
+        help="Comma-separated job types to run (default: all)"
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=float(os.getenv("WORKER_POLL_INTERVAL", 1.0)),
+        help="Seconds to wait when the queue is empty"
+    )
+    args = parser.parse_args()
+
+    job_types = [t.strip() for t in args.job_types.split(",") if t.strip()]
+
+    # Let each process's resource governor take its share of the host
+    os.environ.setdefault("RESOURCE_SHARE_PROCESSES", str(args.processes))
+    ctx = multiprocessing.get_context("spawn")
+    processes: List[multiprocessing.Process] = []
+    stopping = False
+
+    def start_process() -> multiprocessing.Process:
+        process = ctx.Process(
+            target=run_worker_process,
+            args=(args.concurrency, job_types, args.poll_interval),
+            daemon=False
+        )
+        process.start()
+        logger.info(f"Started worker process {process.pid}")
+        return process
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    processes.extend(start_process() for _ in range(args.processes))
+
+    # Supervise: replace processes that exit unexpectedly
+    while not stopping:
+        time.sleep(1)
+        for idx, process in enumerate(processes):
+            if not process.is_alive() and not stopping:
+                logger.warning(
+                    f"Worker process {process.pid} exited "
+                    f"with code {process.exitcode}, restarting"
+                )
+                processes[idx] = start_process()
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
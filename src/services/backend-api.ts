@@ -217,9 +217,11 @@ export async function uploadVideo(
   const backendUrl = await ensureBackendConfigured();
 
   try {
+    // user_id goes first (and in the query) so the backend can check
+    // the storage quota before the file bytes arrive
     const formData = new FormData();
-    formData.append('file', file);
     formData.append('user_id', userId);
+    formData.append('file', file);
 
     const xhr = new XMLHttpRequest();
 
@@ -243,7 +245,10 @@ export async function uploadVideo(
         reject(new Error('Upload failed'));
       });
 
-      xhr.open('POST', `${backendUrl}/api/video/upload`);
+      xhr.open(
+        'POST',
+        `${backendUrl}/api/video/upload?user_id=${encodeURIComponent(userId)}`
+      );
       xhr.send(formData);
     });
   } catch (error) {
@@ -369,13 +374,15 @@ export async function exportClip(
  */
 export async function getVideoInfo(
   videoId: string,
-  userId: string
+  userId: string,
+  includeTranscription = false
 ): Promise<any> {
   const backendUrl = await ensureBackendConfigured();
 
   try {
     const response = await fetch(
-      `${backendUrl}/api/video/${videoId}/info?user_id=${userId}`,
+      `${backendUrl}/api/video/${videoId}/info?user_id=${userId}` +
+        (includeTranscription ? '&include_transcription=true' : ''),
       {
         mode: 'cors',
         credentials: 'omit',
@@ -0,0 +1,77 @@
+/*
+  # Durable Job Queue on processing_jobs
+
+  1. Changes
+    - Add queue columns to processing_jobs: payload, attempts, max_attempts,
+      worker_id, lease_expires_at, available_at
+    - Allow 'youtube_import' and 'video_upload' job types
+    - Add lease_processing_job() for workers to claim jobs
+
+  2. Purpose
+    - API endpoints enqueue rows with status 'queued'
+    - Separate worker processes lease and run them
+    - Jobs whose worker died are re-leased once the lease expires
+
+  3. Security
+    - lease_processing_job is SECURITY DEFINER and only granted to service_role
+*/
+
+ALTER TABLE processing_jobs
+  ADD COLUMN IF NOT EXISTS payload jsonb DEFAULT '{}'::jsonb,
+  ADD COLUMN IF NOT EXISTS attempts integer DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS max_attempts integer DEFAULT 3,
+  ADD COLUMN IF NOT EXISTS worker_id text,
+  ADD COLUMN IF NOT EXISTS lease_expires_at timestamptz,
+  ADD COLUMN IF NOT EXISTS available_at timestamptz DEFAULT now();
+
+ALTER TABLE processing_jobs DROP CONSTRAINT IF EXISTS processing_jobs_job_type_check;
+ALTER TABLE processing_jobs ADD CONSTRAINT processing_jobs_job_type_check
+  CHECK (job_type IN (
+    'transcription',
+    'clip_generation',
+    'export',
+    'youtube_import',
+    'video_upload'
+  ));
+
+CREATE INDEX IF NOT EXISTS idx_processing_jobs_queue
+  ON processing_jobs(status, available_at)
+  WHERE status IN ('queued', 'processing');
+
+-- Claim the oldest runnable job of the given types
+CREATE OR REPLACE FUNCTION lease_processing_job(
+  p_worker_id text,
+  p_job_types text[],
+  p_lease_seconds integer
+)
+RETURNS SETOF processing_jobs AS $$
+BEGIN
+  RETURN QUERY
+  UPDATE processing_jobs
+  SET
+    status = 'processing',
+    worker_id = p_worker_id,
+    attempts = processing_jobs.attempts + 1,
+    lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+    started_at = COALESCE(processing_jobs.started_at, now())
+  WHERE id = (
+    SELECT id FROM processing_jobs
+    WHERE job_type = ANY(p_job_types)
+      AND (
+        (status = 'queued' AND available_at <= now())
+        OR (
+          status = 'processing'
+          AND lease_expires_at < now()
+          AND attempts < max_attempts
+        )
+      )
+    ORDER BY created_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING *;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE ALL ON FUNCTION lease_processing_job(text, text[], integer) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION lease_processing_job(text, text[], integer) TO service_role;
@@ -0,0 +1,21 @@
+/*
+  # Add Pipeline Job Type
+
+  1. Changes
+    - Allow 'pipeline' in processing_jobs.job_type
+
+  2. Purpose
+    - POST /api/pipeline enqueues a single job that runs import,
+      transcription, clip generation and exports as one dependency graph
+*/
+
+ALTER TABLE processing_jobs DROP CONSTRAINT IF EXISTS processing_jobs_job_type_check;
+ALTER TABLE processing_jobs ADD CONSTRAINT processing_jobs_job_type_check
+  CHECK (job_type IN (
+    'transcription',
+    'clip_generation',
+    'export',
+    'youtube_import',
+    'video_upload',
+    'pipeline'
+  ));
@@ -0,0 +1,13 @@
+/*
+  # Add Live Progress Details to processing_jobs
+
+  1. Changes
+    - Add progress_details jsonb (stage, out_time, speed, fps, eta)
+
+  2. Purpose
+    - Workers write parsed ffmpeg/yt-dlp progress at a throttled rate
+    - GET /api/jobs/{job_id}/events streams it to clients over SSE
+*/
+
+ALTER TABLE processing_jobs
+  ADD COLUMN IF NOT EXISTS progress_details jsonb DEFAULT '{}'::jsonb;
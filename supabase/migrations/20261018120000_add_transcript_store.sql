@@ -0,0 +1,71 @@
+/*
+  # Transcript Store
+
+  1. New Tables
+    - `transcripts` - one row per video: language, duration, full text,
+      counts, engine and `format_version` of the segment encoding
+    - `transcript_segments` - one row per segment with its time range,
+      text, words and `word_timings`
+
+  2. Word timings (format_version 1)
+    - `word_timings` is zlib-compressed little-endian float32
+      [start, end, start, end, ...], one pair per entry in `words`
+    - Times are seconds from the start of the video
+
+  3. Purpose
+    - `videos.transcription` keeps only a summary (text, language, counts),
+      so updates to the videos row no longer rewrite every word
+    - Segments are indexed by time so a window can be fetched on its own
+
+  4. Security
+    - Users can read transcripts of their own videos; writes are made by
+      the backend with the service role
+*/
+
+CREATE TABLE IF NOT EXISTS transcripts (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  video_id uuid NOT NULL UNIQUE REFERENCES videos(id) ON DELETE CASCADE,
+  user_id uuid NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+  format_version smallint NOT NULL DEFAULT 1,
+  language text,
+  duration real,
+  text text NOT NULL DEFAULT '',
+  segment_count integer NOT NULL DEFAULT 0,
+  word_count integer NOT NULL DEFAULT 0,
+  engine text,
+  created_at timestamptz DEFAULT now(),
+  updated_at timestamptz DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS transcript_segments (
+  transcript_id uuid NOT NULL REFERENCES transcripts(id) ON DELETE CASCADE,
+  idx integer NOT NULL,
+  start_time real NOT NULL,
+  end_time real NOT NULL,
+  text text NOT NULL DEFAULT '',
+  words text[] NOT NULL DEFAULT '{}',
+  word_timings bytea,
+  PRIMARY KEY (transcript_id, idx)
+);
+
+CREATE INDEX IF NOT EXISTS idx_transcript_segments_time
+  ON transcript_segments(transcript_id, start_time, end_time);
+
+ALTER TABLE transcripts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE transcript_segments ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own transcripts"
+  ON transcripts FOR SELECT
+  TO authenticated
+  USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can view own transcript segments"
+  ON transcript_segments FOR SELECT
+  TO authenticated
+  USING (
+    EXISTS (
+      SELECT 1 FROM transcripts
+      WHERE transcripts.id = transcript_segments.transcript_id
+        AND transcripts.user_id = auth.uid()
+    )
+  );
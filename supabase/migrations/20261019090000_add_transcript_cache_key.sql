@@ -0,0 +1,18 @@
+/*
+  # Transcript Cache Key
+
+  1. Changes
+    - `transcripts.cache_key` - sha256 of the decoded 16 kHz audio together
+      with the engine, model and language that produced the transcript
+
+  2. Purpose
+    - Transcribing audio that already has a transcript with the same
+      settings (a retried job, the same file uploaded twice) copies that
+      transcript instead of calling Whisper or Groq again
+*/
+
+ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS cache_key text;
+
+CREATE INDEX IF NOT EXISTS idx_transcripts_cache_key
+  ON transcripts(cache_key)
+  WHERE cache_key IS NOT NULL;
@@ -0,0 +1,21 @@
+/*
+  # Transcript Progress
+
+  1. Changes
+    - `transcripts.status` - 'partial' while transcription is still running,
+      'complete' once every segment has been written
+    - `transcripts.transcribed_until` - seconds of audio whose segments are
+      already in `transcript_segments`
+
+  2. Purpose
+    - Segments are written as transcription chunks finish, so the start of
+      a long video can be read (and analysed for clips) before the rest
+      has been transcribed
+    - Readers can tell a partial transcript from a finished one
+*/
+
+ALTER TABLE transcripts
+  ADD COLUMN IF NOT EXISTS status text NOT NULL DEFAULT 'complete'
+    CHECK (status IN ('partial', 'complete'));
+
+ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS transcribed_until real;
@@ -0,0 +1,61 @@
+/*
+  # Fail Jobs Whose Last Lease Expired
+
+  1. Changes
+    - lease_processing_job() first marks 'processing' rows whose lease has
+      expired and that have no attempts left as 'failed', with
+      error_message "lease expired after N attempts"
+
+  2. Purpose
+    - A job whose worker died on its last attempt (e.g. every
+      youtube_import, enqueued with max_attempts = 1) was never leased
+      again and stayed 'processing' forever, so its progress stream
+      never ended
+*/
+
+CREATE OR REPLACE FUNCTION lease_processing_job(
+  p_worker_id text,
+  p_job_types text[],
+  p_lease_seconds integer
+)
+RETURNS SETOF processing_jobs AS $$
+BEGIN
+  UPDATE processing_jobs
+  SET
+    status = 'failed',
+    error_message = 'lease expired after ' || attempts || ' attempts',
+    completed_at = now(),
+    lease_expires_at = NULL
+  WHERE status = 'processing'
+    AND lease_expires_at < now()
+    AND attempts >= max_attempts;
+
+  RETURN QUERY
+  UPDATE processing_jobs
+  SET
+    status = 'processing',
+    worker_id = p_worker_id,
+    attempts = processing_jobs.attempts + 1,
+    lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+    started_at = COALESCE(processing_jobs.started_at, now())
+  WHERE id = (
+    SELECT id FROM processing_jobs
+    WHERE job_type = ANY(p_job_types)
+      AND (
+        (status = 'queued' AND available_at <= now())
+        OR (
+          status = 'processing'
+          AND lease_expires_at < now()
+          AND attempts < max_attempts
+        )
+      )
+    ORDER BY created_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING *;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+REVOKE ALL ON FUNCTION lease_processing_job(text, text[], integer) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION lease_processing_job(text, text[], integer) TO service_role;
@@ -0,0 +1,18 @@
+/*
+  # Metadata-only Transcription Summary
+
+  1. Changes
+    - `videos.transcription` of videos in the transcript store keeps only
+      status, language, duration, counts, `transcript_id` and
+      `format_version`; the copy of the full text is removed
+
+  2. Purpose
+    - The text lives in `transcript_segments`, and readers rebuild it from
+      there, so the videos row no longer carries the whole transcript
+    - Videos transcribed before the transcript store have no segments and
+      keep their original `transcription`
+*/
+
+UPDATE videos
+SET transcription = (transcription - 'text') || '{"status": "complete"}'::jsonb
+WHERE transcription ? 'transcript_id';